@@ -1,5 +1,6 @@
 import React, { useState, useEffect, useCallback } from 'react';
 import axios from 'axios';
+import { fetchAllPages } from '../pagination';
 
 const Assignments = () => {
   const [assignments, setAssignments] = useState([]);
@@ -19,8 +20,8 @@ const Assignments = () => {
 
   // ✅ Wrap fetchAssignments in useCallback to avoid re-creation
   const fetchAssignments = useCallback(() => {
-    axios.get('http://localhost:5555/assignments', { withCredentials: true })
-      .then(response => setAssignments(response.data))
+    fetchAllPages('http://localhost:5555/assignments')
+      .then(setAssignments)
       .catch(err => setError(getErrorMsg(err, 'Failed to fetch assignments.')));
   }, []);
 
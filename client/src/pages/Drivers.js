@@ -1,5 +1,6 @@
 import React, { useState, useEffect } from 'react';
 import axios from 'axios';
+import { fetchAllPages } from '../pagination';
 
 const Drivers = () => {
   const [drivers, setDrivers] = useState([]);
@@ -21,8 +22,8 @@ const Drivers = () => {
   };
 
   const fetchDrivers = () => {
-    axios.get('http://localhost:5555/drivers', { withCredentials: true })
-      .then(response => setDrivers(response.data))
+    fetchAllPages('http://localhost:5555/drivers')
+      .then(setDrivers)
       .catch(err => setError(getErrorMsg(err, 'Failed to fetch drivers.')));
   };
 
@@ -1,5 +1,6 @@
 import React, { useState, useEffect, useCallback } from 'react';
 import axios from 'axios';
+import { fetchAllPages } from '../pagination';
 
 const Trucks = () => {
   const [trucks, setTrucks] = useState([]);
@@ -14,8 +15,8 @@ const Trucks = () => {
 
   // ✅ Wrap fetchTrucks in useCallback to avoid re-creation
   const fetchTrucks = useCallback(() => {
-    axios.get('http://localhost:5555/trucks', { withCredentials: true })
-      .then(response => setTrucks(response.data))
+    fetchAllPages('http://localhost:5555/trucks')
+      .then(setTrucks)
       .catch(err => handleError(err, 'Failed to fetch trucks.'));
   }, []);
 
@@ -0,0 +1,14 @@
+import axios from 'axios';
+
+// List endpoints return one page at a time; follow X-Next-Cursor until the last page
+export const fetchAllPages = async (url, pageSize = 1000) => {
+  const items = [];
+  let after = null;
+  do {
+    const params = after ? { limit: pageSize, after } : { limit: pageSize };
+    const response = await axios.get(url, { params, withCredentials: true });
+    items.push(...response.data);
+    after = response.headers['x-next-cursor'];
+  } while (after);
+  return items;
+};
@@ -0,0 +1,320 @@
+from collections import defaultdict
+from datetime import datetime, timedelta, time
+
+from sqlalchemy import event, func, inspect, select, tuple_
+
+from database import db
+from models import Assignment, DailyUtilization, Driver, Truck, TruckStatusPeriod
+from pagination import QueryParamError, parse_int
+
+SECONDS_PER_DAY = 24 * 60 * 60
+INTERVAL_FIELDS = ('start_date', 'end_date', 'truck_id', 'driver_id')
+MAINTENANCE = 'Maintenance'
+IN_CLAUSE_CHUNK = 500
+
+
+# Rollup maintenance
+
+def daily_seconds(start, end):
+    """Splits [start, end) into {day: seconds} on midnight boundaries."""
+    days = {}
+    cursor = start
+    while cursor < end:
+        midnight = datetime.combine(cursor.date() + timedelta(days=1), time.min)
+        stop = min(end, midnight)
+        days[cursor.date()] = int((stop - cursor).total_seconds())
+        cursor = stop
+    return days
+
+
+def add_contribution(deltas, start_date, end_date, truck_id, driver_id, sign=1):
+    """Adds (or with sign=-1, removes) one closed assignment's time to a delta map."""
+    if start_date is None or end_date is None or end_date <= start_date:
+        return  # Open-ended assignments are counted live by the report
+    for day, seconds in daily_seconds(start_date, end_date).items():
+        deltas[(day, truck_id, driver_id)] += sign * seconds
+
+
+def _upsert_statement(connection):
+    if connection.dialect.name == 'postgresql':
+        from sqlalchemy.dialects.postgresql import insert
+    else:
+        from sqlalchemy.dialects.sqlite import insert
+    statement = insert(DailyUtilization.__table__)
+    return statement.on_conflict_do_update(
+        index_elements=['day', 'truck_id', 'driver_id'],
+        set_={'assigned_seconds': DailyUtilization.__table__.c.assigned_seconds + statement.excluded.assigned_seconds},
+    )
+
+
+def apply_deltas(connection, deltas):
+    """Applies {(day, truck_id, driver_id): seconds} to the rollup with one executemany upsert."""
+    rows = [
+        {"day": day, "truck_id": truck_id, "driver_id": driver_id, "assigned_seconds": seconds}
+        for (day, truck_id, driver_id), seconds in deltas.items() if seconds
+    ]
+    if not rows:
+        return
+    connection.execute(_upsert_statement(connection), rows)
+
+    shrunk = [(r["day"], r["truck_id"], r["driver_id"]) for r in rows if r["assigned_seconds"] < 0]
+    table = DailyUtilization.__table__
+    for i in range(0, len(shrunk), 500):
+        connection.execute(
+            table.delete()
+            .where(tuple_(table.c.day, table.c.truck_id, table.c.driver_id).in_(shrunk[i:i + 500]))
+            .where(table.c.assigned_seconds <= 0)
+        )
+
+
+# ORM writes (create/update/delete handlers and cascades from drivers/trucks)
+# update the rollup inside the same flush, so it commits or rolls back with them.
+
+@event.listens_for(Assignment, 'after_insert')
+def _assignment_inserted(mapper, connection, assignment):
+    deltas = defaultdict(int)
+    add_contribution(deltas, *(getattr(assignment, f) for f in INTERVAL_FIELDS))
+    apply_deltas(connection, deltas)
+
+@event.listens_for(Assignment, 'after_update')
+def _assignment_updated(mapper, connection, assignment):
+    state = inspect(assignment)
+    new = [getattr(assignment, f) for f in INTERVAL_FIELDS]
+    old = [(state.attrs[f].history.deleted or [value])[0] for f, value in zip(INTERVAL_FIELDS, new)]
+    if old == new:
+        return
+    deltas = defaultdict(int)
+    add_contribution(deltas, *old, sign=-1)
+    add_contribution(deltas, *new)
+    apply_deltas(connection, deltas)
+
+@event.listens_for(Assignment, 'after_delete')
+def _assignment_deleted(mapper, connection, assignment):
+    deltas = defaultdict(int)
+    add_contribution(deltas, *(getattr(assignment, f) for f in INTERVAL_FIELDS), sign=-1)
+    apply_deltas(connection, deltas)
+
+
+# Truck status history. Every status write goes through record_statuses: ORM writes via the
+# mapper events below, Core writes (pairing, bulk upserts) by calling it themselves.
+
+def record_statuses(connection, statuses, at=None):
+    """
+    Records {truck_id: status}: for each truck whose status differs from its current period,
+    closes that period at `at` (default now) and opens one for the new status.
+    """
+    at = at or datetime.now().replace(microsecond=0)
+    table = TruckStatusPeriod.__table__
+    ids = list(statuses)
+    current = {}
+    for i in range(0, len(ids), IN_CLAUSE_CHUNK):
+        current.update(connection.execute(
+            select(table.c.truck_id, table.c.status)
+            .where(table.c.truck_id.in_(ids[i:i + IN_CLAUSE_CHUNK]), table.c.end_date.is_(None))
+        ).all())
+    changed = [truck_id for truck_id, status in statuses.items() if current.get(truck_id) != status]
+    if not changed:
+        return
+    closing = [truck_id for truck_id in changed if truck_id in current]
+    for i in range(0, len(closing), IN_CLAUSE_CHUNK):
+        connection.execute(
+            table.update()
+            .where(table.c.truck_id.in_(closing[i:i + IN_CLAUSE_CHUNK]), table.c.end_date.is_(None))
+            .values(end_date=at)
+        )
+    connection.execute(table.insert(), [
+        {"truck_id": truck_id, "status": statuses[truck_id], "start_date": at} for truck_id in changed
+    ])
+
+@event.listens_for(Truck, 'after_insert')
+def _truck_inserted(mapper, connection, truck):
+    record_statuses(connection, {truck.id: truck.status})
+
+@event.listens_for(Truck, 'after_update')
+def _truck_updated(mapper, connection, truck):
+    if inspect(truck).attrs.status.history.has_changes():
+        record_statuses(connection, {truck.id: truck.status})
+
+@event.listens_for(Truck, 'after_delete')
+def _truck_deleted(mapper, connection, truck):
+    table = TruckStatusPeriod.__table__
+    connection.execute(table.delete().where(table.c.truck_id == truck.id))
+
+
+def status_seconds(status, start, end, truck_id=None):
+    """{truck_id: {day: seconds}} each truck spent in `status` within [start, end)."""
+    query = db.session.query(TruckStatusPeriod.truck_id, TruckStatusPeriod.start_date, TruckStatusPeriod.end_date) \
+        .filter(TruckStatusPeriod.status == status, TruckStatusPeriod.start_date < end,
+                TruckStatusPeriod.end_date.is_(None) | (TruckStatusPeriod.end_date > start))
+    if truck_id is not None:
+        query = query.filter(TruckStatusPeriod.truck_id == truck_id)
+    seconds = defaultdict(lambda: defaultdict(int))
+    for period_truck_id, period_start, period_end in query:
+        clipped_end = min(period_end, end) if period_end else end
+        for day, day_seconds in daily_seconds(max(period_start, start), clipped_end).items():
+            seconds[period_truck_id][day] += day_seconds
+    return seconds
+
+
+def rebuild_rollup(chunk_size=10000, models=(Assignment,)):
+    """
+    Recomputes the whole rollup from assignments in id-ordered chunks. `models` lists the
+    tables to read (the assignments table plus any history tables). Returns rows scanned.
+    """
+    db.session.query(DailyUtilization).delete()
+    connection = db.session.connection()
+    scanned = 0
+
+    for model in models:
+        last_id = 0
+        while True:
+            rows = (
+                db.session.query(model.id, *(getattr(model, f) for f in INTERVAL_FIELDS))
+                .filter(model.end_date.isnot(None), model.id > last_id)
+                .order_by(model.id)
+                .limit(chunk_size)
+                .all()
+            )
+            if not rows:
+                break
+            deltas = defaultdict(int)
+            for row in rows:
+                add_contribution(deltas, *row[1:])
+            apply_deltas(connection, deltas)
+            last_id = rows[-1].id
+            scanned += len(rows)
+
+    db.session.commit()
+    return scanned
+
+
+# Reporting
+
+def _parse_day(value, name):
+    try:
+        return datetime.strptime(value, '%Y-%m-%d').date()
+    except (TypeError, ValueError):
+        raise QueryParamError(f"Invalid date for '{name}': {value}. Use YYYY-MM-DD.")
+
+
+def _week_start(column, dialect):
+    """Monday of the column's week, computed in SQL."""
+    if dialect == 'postgresql':
+        return func.date(func.date_trunc('week', column))
+    return func.date(column, '-6 days', 'weekday 1')
+
+
+def _period_key(day, bucket):
+    if bucket == 'week':
+        day = day - timedelta(days=day.weekday())
+    return day.isoformat()
+
+
+def utilization_report(args):
+    """
+    Assigned hours and utilization per truck or driver over [start, end] (inclusive days).
+    Closed assignments are summed in SQL over the daily rollup; the few open-ended
+    (Active) assignments are clipped to the window and added live. Per truck, the time
+    spent in Maintenance comes from the status history, next to the assigned time.
+    """
+    if not args.get('start') or not args.get('end'):
+        raise QueryParamError("Missing required parameters: start and end")
+    start_day, end_day = _parse_day(args['start'], 'start'), _parse_day(args['end'], 'end')
+    if end_day < start_day:
+        raise QueryParamError("'end' must not be before 'start'.")
+
+    group_by = args.get('group_by', 'truck')
+    if group_by not in ('truck', 'driver'):
+        raise QueryParamError("'group_by' must be truck or driver.")
+    bucket = args.get('bucket')
+    if bucket not in (None, 'day', 'week'):
+        raise QueryParamError("'bucket' must be day or week.")
+
+    resource_model = Truck if group_by == 'truck' else Driver
+    rollup_column = getattr(DailyUtilization, f'{group_by}_id')
+    assignment_column = getattr(Assignment, f'{group_by}_id')
+    filters = {name: parse_int(args[name], name) for name in ('truck_id', 'driver_id') if args.get(name)}
+
+    # Closed assignments from the rollup
+    query = db.session.query(rollup_column).filter(DailyUtilization.day.between(start_day, end_day))
+    for name, value in filters.items():
+        query = query.filter(getattr(DailyUtilization, name) == value)
+
+    totals = defaultdict(int)
+    series = defaultdict(lambda: defaultdict(int))
+    if bucket:
+        dialect = db.session.get_bind().dialect.name
+        period = DailyUtilization.day if bucket == 'day' else _week_start(DailyUtilization.day, dialect)
+        rows = query.add_columns(period.label('period'), func.sum(DailyUtilization.assigned_seconds)) \
+            .group_by(rollup_column, 'period').all()
+        for resource_id, period_value, seconds in rows:
+            key = period_value.isoformat() if hasattr(period_value, 'isoformat') else str(period_value)
+            series[resource_id][key] += seconds
+            totals[resource_id] += seconds
+    else:
+        rows = query.add_columns(func.sum(DailyUtilization.assigned_seconds)).group_by(rollup_column).all()
+        for resource_id, seconds in rows:
+            totals[resource_id] += seconds
+
+    # Open-ended assignments, clipped to the window and to now
+    window_start = datetime.combine(start_day, time.min)
+    window_end = min(datetime.combine(end_day + timedelta(days=1), time.min), datetime.now())
+    active = db.session.query(Assignment.start_date, assignment_column) \
+        .filter(Assignment.end_date.is_(None), Assignment.start_date < window_end)
+    for name, value in filters.items():
+        active = active.filter(getattr(Assignment, name) == value)
+    for assignment_start, resource_id in active:
+        for day, seconds in daily_seconds(max(assignment_start, window_start), window_end).items():
+            totals[resource_id] += seconds
+            if bucket:
+                series[resource_id][_period_key(day, bucket)] += seconds
+
+    # Time in Maintenance, from the status history (trucks only)
+    maintenance = defaultdict(int)
+    maintenance_series = defaultdict(lambda: defaultdict(int))
+    if group_by == 'truck':
+        for truck_id, days in status_seconds(MAINTENANCE, window_start, window_end, filters.get('truck_id')).items():
+            for day, seconds in days.items():
+                maintenance[truck_id] += seconds
+                if bucket:
+                    maintenance_series[truck_id][_period_key(day, bucket)] += seconds
+        if 'driver_id' in filters:
+            maintenance = defaultdict(int, {k: v for k, v in maintenance.items() if k in totals})
+
+    window_seconds = ((end_day - start_day).days + 1) * SECONDS_PER_DAY
+    resources = []
+    for resource_id in sorted(set(totals) | set(maintenance)):
+        entry = {
+            "id": resource_id,
+            "assigned_hours": round(totals[resource_id] / 3600, 2),
+            "utilization_pct": round(100 * totals[resource_id] / window_seconds, 2),
+        }
+        if group_by == 'truck':
+            entry["maintenance_hours"] = round(maintenance[resource_id] / 3600, 2)
+        if bucket:
+            entry["series"] = []
+            for key in sorted(set(series[resource_id]) | set(maintenance_series[resource_id])):
+                point = {"period": key, "assigned_hours": round(series[resource_id][key] / 3600, 2)}
+                if group_by == 'truck':
+                    point["maintenance_hours"] = round(maintenance_series[resource_id][key] / 3600, 2)
+                entry["series"].append(point)
+        resources.append(entry)
+
+    # Idle: resources with neither assigned nor maintenance time in the window
+    id_query = db.session.query(resource_model.id)
+    own_filter = f'{group_by}_id'
+    if own_filter in filters:
+        id_query = id_query.filter(resource_model.id == filters[own_filter])
+    idle = [row.id for row in id_query.order_by(resource_model.id) if not totals.get(row.id) and not maintenance.get(row.id)]
+
+    report = {
+        "start": start_day.isoformat(),
+        "end": end_day.isoformat(),
+        "group_by": group_by,
+        "bucket": bucket,
+        "resources": resources,
+        "idle": idle,
+    }
+    if group_by == 'truck':
+        report["status_counts"] = dict(db.session.query(Truck.status, func.count(Truck.id)).group_by(Truck.status).all())
+    return report
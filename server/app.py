@@ -1,60 +1,88 @@
+import click
 from flask import Flask, request, jsonify, session
 from flask_sqlalchemy import SQLAlchemy
 from flask_migrate import Migrate
 from flask_cors import CORS
+from sqlalchemy.orm.exc import StaleDataError
 from dotenv import load_dotenv
-from functools import wraps
 from datetime import datetime
-import os
 
+from config import load_config
 from database import db
+from engine_profile import configure_engines
 from models import User, Driver, Truck, Assignment
+from auth import (
+    principal_cache, init_auth, current_role, login_required, admin_required, admin_or_manager_required
+)
+from pagination import QueryParamError, page_response
+from export import export_response
+from serialization import list_response, fetch_one, include_resources
+from archive import (
+    archive_assignments, fetch_assignment, history_entities, history_sources, include_object, load_assignment_page
+)
+from encoding import json_response
+from metrics import metrics, init_metrics, metrics_authorized
+from passwords import PasswordHasherBusy, init_passwords
+from versioning import STALE_MESSAGE, PreconditionFailed, check_if_match, version_headers
+from response_cache import cached, invalidates, init_response_cache
+from idempotency import REPLAYED_HEADER, IdempotencyError, idempotent, init_idempotency, purge_expired
+from bulk import BulkRequestError, bulk_write_by_natural_key, bulk_write_assignments, summarize
+from analytics import rebuild_rollup, utilization_report
+from search import rebuild_search_index, search_response
+from pairing import PairingConflict, assign, release
+from dispatch import DispatchRequestError, dispatch, summarize as summarize_dispatch
+from batch import BatchRequestError, parse_batch, run_batch
+from changefeed import init_change_feed, parse_resources, stream_response, changes_since
+from scheduling import (
+    AssignmentConflict, check_availability, find_all_conflicts,
+    parse_window, free_trucks_query, free_drivers_query
+)
 
 # Load environment variables
 load_dotenv()
 
 # Initialize Flask app
 app = Flask(__name__)
-app.config['SQLALCHEMY_DATABASE_URI'] = os.getenv('DATABASE_URL')
-app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
-app.config['SECRET_KEY'] = os.getenv('SECRET_KEY')
+load_config(app.config)
 
 # Initialize extensions
+configure_engines(app)
 db.init_app(app)
-migrate = Migrate(app, db)
-CORS(app, origins=["http://localhost:3000"], supports_credentials=True)
-
-# Decorators
-
-def login_required(f):
-    @wraps(f)
-    def decorated(*args, **kwargs):
-        if 'user_id' not in session:
-            return jsonify({"error": "Authentication required"}), 401
-        return f(*args, **kwargs)
-    return decorated
-
-def admin_required(f):
-    @wraps(f)
-    def decorated(*args, **kwargs):
-        user_id = session.get('user_id')
-        if not user_id:
-            return jsonify({"error": "Unauthorized. Please log in."}), 401
-
-        user = User.query.get(user_id)
-        if not user or user.role != "Admin":
-            return jsonify({"error": "Forbidden. Admin access required."}), 403
-
-        return f(*args, **kwargs)
-    return decorated
-
-def admin_or_manager_required(f):
-    @wraps(f)
-    def decorated(*args, **kwargs):
-        if 'role' not in session or session['role'] not in ['Admin', 'Fleet Manager']:
-            return jsonify({"error": "Admin or Fleet Manager access required"}), 403
-        return f(*args, **kwargs)
-    return decorated
+migrate = Migrate(app, db, include_object=include_object)
+init_auth(app)
+init_passwords(app)
+init_response_cache(app)
+init_idempotency(app)
+init_metrics(app)
+init_change_feed(app)
+CORS(app, origins=["http://localhost:3000"], supports_credentials=True,
+     expose_headers=["X-Next-Cursor", "Link", REPLAYED_HEADER])
+
+
+@app.errorhandler(QueryParamError)
+@app.errorhandler(BulkRequestError)
+@app.errorhandler(BatchRequestError)
+@app.errorhandler(DispatchRequestError)
+def handle_query_param_error(e):
+    return jsonify({"error": str(e)}), 400
+
+@app.errorhandler(PasswordHasherBusy)
+def handle_password_hasher_busy(e):
+    return jsonify({"error": str(e)}), 503, {'Retry-After': '1'}
+
+@app.errorhandler(PreconditionFailed)
+def handle_precondition_failed(e):
+    return jsonify(e.to_dict()), 412, {'ETag': f'"{e.current_version}"'}
+
+@app.errorhandler(IdempotencyError)
+def handle_idempotency_error(e):
+    return jsonify(e.to_dict()), e.status
+
+@app.errorhandler(StaleDataError)
+def handle_stale_data(e):
+    # A versioned UPDATE/DELETE matched no row: another writer committed after this request read it
+    db.session.rollback()
+    return jsonify({"error": STALE_MESSAGE}), 412
 
 
 # Authentication Routes
@@ -78,6 +106,7 @@ def register():
 
     try:
         new_user = User(username=username, email=email, role=role)
+        db.session.close()  # Don't hold a pooled connection while hashing
         new_user.set_password(password)
         db.session.add(new_user)
         db.session.commit()
@@ -98,12 +127,18 @@ def login():
         return jsonify({"error": "Username and password are required."}), 400
 
     user = User.query.filter_by(username=username).first()
+    # Hand the database connection back to the pool while the hash check waits on the hashing pool
+    db.session.close()
     if not user or not user.check_password(password):
         return jsonify({"error": "Invalid username or password."}), 401
+    db.session.add(user)
+    if user in db.session.dirty:
+        db.session.commit()  # check_password upgraded an outdated password hash
 
     session['user_id'] = user.id
     session['username'] = user.username
     session['role'] = user.role
+    principal_cache.put(user.id, user.role)
 
     return jsonify({
         "message": "Login successful.",
@@ -124,26 +159,41 @@ def logout():
     return jsonify({"message": "Logged out successfully."}), 200
 
 
+@app.route('/auth/principal-cache', methods=['GET'])
+@admin_required
+def get_principal_cache_stats():
+    return jsonify(principal_cache.stats()), 200
+
+
 # Driver Routes
 
 @app.route('/drivers', methods=['GET'])
 @admin_required
+@cached('drivers', depends=include_resources(Driver))
 def get_all_drivers():
-    drivers = Driver.query.all()
-    return jsonify([d.to_dict() for d in drivers]), 200
+    return list_response(Driver.query, Driver, request.args), 200
+
+@app.route('/drivers/search', methods=['GET'])
+@admin_required
+@cached('drivers', depends=include_resources(Driver))
+def search_drivers():
+    return search_response(Driver, request.args), 200
 
 @app.route('/drivers/<int:id>', methods=['GET'])
 @admin_required
+@cached('drivers', depends=include_resources(Driver), row=Driver)
 def get_driver_by_id(id):
-    driver = Driver.query.get(id)
+    driver = fetch_one(Driver, id, request.args)
     if not driver:
         return jsonify({"error": "Driver not found."}), 404
 
-    return jsonify(driver.to_dict()), 200
+    return json_response(driver), 200
 
 
 @app.route('/drivers', methods=['POST'])
 @admin_required
+@idempotent
+@invalidates('drivers')
 def create_driver():
     data = request.get_json()
     for field in ['name', 'license_number', 'contact_info']:
@@ -165,12 +215,22 @@ def create_driver():
 
     return jsonify(new_driver.to_dict()), 201
 
+@app.route('/drivers/bulk', methods=['POST'])
+@admin_required
+@invalidates('drivers')
+def bulk_create_drivers():
+    upsert = request.args.get('upsert', 'false').lower() == 'true'
+    results = bulk_write_by_natural_key(Driver, request.get_json(), upsert=upsert)
+    return jsonify(summarize(results)), 200
+
 @app.route('/drivers/<int:id>', methods=['PUT'])
 @admin_required
+@invalidates('drivers')
 def update_driver(id):
     driver = Driver.query.get(id)
     if not driver:
         return jsonify({"error": "Driver not found."}), 404
+    check_if_match(driver, request.headers.get('If-Match'))
 
     data = request.get_json()
     driver.name = data.get('name', driver.name)
@@ -179,14 +239,16 @@ def update_driver(id):
     driver.assigned_truck_id = data.get('assigned_truck_id', driver.assigned_truck_id)
 
     db.session.commit()
-    return jsonify(driver.to_dict()), 200
+    return jsonify(driver.to_dict()), 200, version_headers(driver)
 
 @app.route('/drivers/<int:id>', methods=['DELETE'])
 @admin_required
+@invalidates('drivers', 'assignments')
 def delete_driver(id):
     driver = Driver.query.get(id)
     if not driver:
         return jsonify({"error": "Driver not found."}), 404
+    check_if_match(driver, request.headers.get('If-Match'))
 
     db.session.delete(driver)
     db.session.commit()
@@ -198,22 +260,31 @@ def delete_driver(id):
 
 @app.route('/trucks', methods=['GET'])
 @admin_required
+@cached('trucks', depends=include_resources(Truck))
 def get_all_trucks():
-    trucks = Truck.query.all()
-    return jsonify([t.to_dict() for t in trucks]), 200
+    return list_response(Truck.query, Truck, request.args), 200
+
+@app.route('/trucks/search', methods=['GET'])
+@admin_required
+@cached('trucks', depends=include_resources(Truck))
+def search_trucks():
+    return search_response(Truck, request.args), 200
 
 @app.route('/trucks/<int:id>', methods=['GET'])
 @admin_required
+@cached('trucks', depends=include_resources(Truck), row=Truck)
 def get_truck_by_id(id):
-    truck = Truck.query.get(id)
+    truck = fetch_one(Truck, id, request.args)
     if not truck:
         return jsonify({"error": "Truck not found."}), 404
 
-    return jsonify(truck.to_dict()), 200
+    return json_response(truck), 200
 
 
 @app.route('/trucks', methods=['POST'])
 @admin_required
+@idempotent
+@invalidates('trucks')
 def create_truck():
     data = request.get_json()
     for field in ['plate_number', 'model']:
@@ -235,12 +306,22 @@ def create_truck():
 
     return jsonify(new_truck.to_dict()), 201
 
+@app.route('/trucks/bulk', methods=['POST'])
+@admin_required
+@invalidates('trucks')
+def bulk_create_trucks():
+    upsert = request.args.get('upsert', 'false').lower() == 'true'
+    results = bulk_write_by_natural_key(Truck, request.get_json(), upsert=upsert)
+    return jsonify(summarize(results)), 200
+
 @app.route('/trucks/<int:id>', methods=['PUT'])
 @admin_required
+@invalidates('trucks')
 def update_truck(id):
     truck = Truck.query.get(id)
     if not truck:
         return jsonify({"error": "Truck not found."}), 404
+    check_if_match(truck, request.headers.get('If-Match'))
 
     data = request.get_json()
     truck.model = data.get('model', truck.model)
@@ -249,14 +330,16 @@ def update_truck(id):
     truck.current_driver_id = data.get('current_driver_id', truck.current_driver_id)
 
     db.session.commit()
-    return jsonify(truck.to_dict()), 200
+    return jsonify(truck.to_dict()), 200, version_headers(truck)
 
 @app.route('/trucks/<int:id>', methods=['DELETE'])
 @admin_required
+@invalidates('trucks', 'assignments')
 def delete_truck(id):
     truck = Truck.query.get(id)
     if not truck:
         return jsonify({"error": "Truck not found."}), 404
+    check_if_match(truck, request.headers.get('If-Match'))
 
     db.session.delete(truck)
     db.session.commit()
@@ -267,28 +350,46 @@ def delete_truck(id):
 @app.route('/assignments', methods=['GET'])
 @login_required
 @admin_or_manager_required
+@cached('assignments', depends=include_resources(Assignment))
 def get_assignments():
-    assignments = Assignment.query.all()
-    return jsonify([a.to_dict() for a in assignments]), 200
+    return page_response(*load_assignment_page(request.args)), 200
+
+@app.route('/assignments/export', methods=['GET'])
+@login_required
+@admin_or_manager_required
+def export_assignments():
+    return export_response(Assignment, request.args, 'assignments', history_sources(request.args))
+
+@app.route('/assignments/conflicts', methods=['GET'])
+@login_required
+@admin_or_manager_required
+@cached('assignments')
+def get_assignment_conflicts():
+    conflicts = find_all_conflicts()
+    return jsonify({"count": len(conflicts), "conflicts": conflicts}), 200
 
 @app.route('/assignments/<int:id>', methods=['GET'])
 @admin_or_manager_required
+@cached('assignments', depends=include_resources(Assignment), row=Assignment)
 def get_assignment_by_id(id):
-    assignment = Assignment.query.get(id)
+    assignment = fetch_assignment(id, request.args)
     if not assignment:
         return jsonify({"error": "Assignment not found."}), 404
 
-    return jsonify(assignment.to_dict()), 200
+    return json_response(assignment), 200
 
 
 @app.route('/assignments', methods=['POST'])
 @login_required
 @admin_or_manager_required
+@idempotent
+@invalidates('assignments')
 def create_assignment():
     data = request.get_json()
     try:
         start_date = datetime.strptime(data['start_date'], '%Y-%m-%d %H:%M:%S')
         end_date = datetime.strptime(data['end_date'], '%Y-%m-%d %H:%M:%S') if data.get('end_date') else None
+        check_availability(data['driver_id'], data['truck_id'], start_date, end_date)
 
         new_assignment = Assignment(
             start_date=start_date,
@@ -303,16 +404,36 @@ def create_assignment():
 
         return jsonify(new_assignment.to_dict()), 201
 
+    except AssignmentConflict as e:
+        return jsonify(e.to_dict()), 409
     except Exception as e:
         return jsonify({"error": str(e)}), 400
 
+@app.route('/assignments/bulk', methods=['POST'])
+@login_required
+@admin_or_manager_required
+@invalidates('assignments')
+def bulk_write_assignments_route():
+    results = bulk_write_assignments(request.get_json())
+    return jsonify(summarize(results)), 200
+
+@app.route('/assignments/dispatch', methods=['POST'])
+@login_required
+@admin_or_manager_required
+@invalidates('assignments')
+def dispatch_assignments():
+    results, committed = dispatch(request.get_json())
+    return jsonify(summarize_dispatch(results, committed)), 200
+
 @app.route('/assignments/<int:id>', methods=['PATCH'])
 @login_required
 @admin_or_manager_required
+@invalidates('assignments')
 def update_assignment(id):
     assignment = Assignment.query.get(id)
     if not assignment:
         return jsonify({"error": "Assignment not found"}), 404
+    check_if_match(assignment, request.headers.get('If-Match'))
 
     data = request.get_json()
     try:
@@ -327,28 +448,184 @@ def update_assignment(id):
         if 'truck_id' in data:
             assignment.truck_id = data['truck_id']
 
+        with db.session.no_autoflush:
+            check_availability(assignment.driver_id, assignment.truck_id,
+                               assignment.start_date, assignment.end_date, exclude_ids={assignment.id})
+
         db.session.commit()
-        return jsonify(assignment.to_dict()), 200
+        return jsonify(assignment.to_dict()), 200, version_headers(assignment)
 
+    except AssignmentConflict as e:
+        db.session.rollback()
+        return jsonify(e.to_dict()), 409
+    except StaleDataError:
+        raise  # 412, see handle_stale_data
     except Exception as e:
+        db.session.rollback()
         return jsonify({"error": str(e)}), 400
 
 @app.route('/assignments/<int:id>', methods=['DELETE'])
 @login_required
 @admin_or_manager_required
+@invalidates('assignments')
 def delete_assignment(id):
     assignment = Assignment.query.get(id)
     if not assignment:
         return jsonify({"error": "Assignment not found"}), 404
+    check_if_match(assignment, request.headers.get('If-Match'))
 
     try:
         db.session.delete(assignment)
         db.session.commit()
         return jsonify({"message": "Assignment deleted successfully"}), 200
 
+    except StaleDataError:
+        raise  # 412, see handle_stale_data
+    except Exception as e:
+        return jsonify({"error": str(e)}), 400
+
+@app.route('/assignments/assign', methods=['POST'])
+@login_required
+@admin_or_manager_required
+@invalidates('assignments', 'drivers', 'trucks')
+def assign_driver_to_truck():
+    data = request.get_json()
+    for field in ['driver_id', 'truck_id']:
+        if field not in data:
+            return jsonify({"error": f"Missing required field: {field}"}), 400
+    try:
+        end_date = datetime.strptime(data['end_date'], '%Y-%m-%d %H:%M:%S') if data.get('end_date') else None
+        assignment = assign(data['driver_id'], data['truck_id'], end_date)
+        return jsonify(assignment.to_dict()), 201
+
+    except LookupError as e:
+        return jsonify({"error": str(e)}), 404
+    except (AssignmentConflict, PairingConflict) as e:
+        return jsonify(e.to_dict()), 409
     except Exception as e:
         return jsonify({"error": str(e)}), 400
 
+@app.route('/assignments/release', methods=['POST'])
+@login_required
+@admin_or_manager_required
+@invalidates('assignments', 'drivers', 'trucks')
+def release_driver_from_truck():
+    data = request.get_json()
+    if 'truck_id' not in data and 'driver_id' not in data:
+        return jsonify({"error": "Missing required field: truck_id or driver_id"}), 400
+    try:
+        driver_id, truck_id, completed = release(driver_id=data.get('driver_id'), truck_id=data.get('truck_id'))
+        return jsonify({
+            "driver_id": driver_id,
+            "truck_id": truck_id,
+            "completed": [assignment.to_dict() for assignment in completed],
+        }), 200
+
+    except LookupError as e:
+        return jsonify({"error": str(e)}), 404
+    except PairingConflict as e:
+        return jsonify(e.to_dict()), 409
+
+
+# Availability Routes
+
+@app.route('/availability/trucks', methods=['GET'])
+@login_required
+@admin_or_manager_required
+@cached('trucks', 'assignments', depends=include_resources(Truck))
+def get_available_trucks():
+    start, end = parse_window(request.args)
+    return list_response(free_trucks_query(start, end), Truck, request.args), 200
+
+@app.route('/availability/drivers', methods=['GET'])
+@login_required
+@admin_or_manager_required
+@cached('drivers', 'assignments', depends=include_resources(Driver))
+def get_available_drivers():
+    start, end = parse_window(request.args)
+    return list_response(free_drivers_query(start, end), Driver, request.args), 200
+
+
+# Analytics Routes
+
+@app.route('/analytics/utilization', methods=['GET'])
+@login_required
+@admin_or_manager_required
+def get_utilization():
+    return json_response(utilization_report(request.args)), 200
+
+
+# Batch Routes
+
+@app.route('/batch', methods=['POST'])
+@login_required
+def batch():
+    items, atomic = parse_batch(request.get_json(silent=True))
+    responses, committed = run_batch(items, atomic=atomic)
+    return jsonify({"atomic": atomic, "committed": committed, "responses": responses}), 200
+
+
+# Change Feed Routes
+
+@app.route('/changes/stream', methods=['GET'])
+@login_required
+@admin_or_manager_required
+def stream_changes():
+    resources = parse_resources(request.args, current_role())
+    last_event_id = request.headers.get('Last-Event-ID', request.args.get('last_event_id'))
+    return stream_response(resources, last_event_id, app.config['CHANGE_FEED_MAX_STREAM_SECONDS'])
+
+@app.route('/changes', methods=['GET'])
+@login_required
+@admin_or_manager_required
+def get_changes():
+    resources = parse_resources(request.args, current_role())
+    return jsonify(changes_since(resources, request.args.get('after'))), 200
+
+
+# Metrics Routes
+
+@app.route('/metrics', methods=['GET'])
+def get_metrics():
+    if not metrics_authorized():
+        return jsonify({"error": "Unauthorized."}), 401
+    return metrics.render(), 200, {'Content-Type': 'text/plain; version=0.0.4; charset=utf-8'}
+
+
+# CLI Commands
+
+@app.cli.command('rebuild-utilization')
+def rebuild_utilization_command():
+    """Rebuilds the daily utilization rollup from the assignments and history tables."""
+    scanned = rebuild_rollup(models=[Assignment, *history_entities()])
+    print(f"Rebuilt daily utilization from {scanned} closed assignments.")
+
+@app.cli.command('rebuild-search-index')
+def rebuild_search_index_command():
+    """Rebuilds the driver and truck search index from their tables."""
+    indexed = rebuild_search_index()
+    print(f"Rebuilt the search index from {indexed} drivers and trucks.")
+
+@app.cli.command('archive-assignments')
+@click.option('--older-than-days', type=int, help='Archive assignments that ended this many days ago or earlier.')
+@click.option('--period', type=click.Choice(['year', 'month']), help='Span of time each history table covers.')
+@click.option('--chunk-size', type=int, help='Assignments moved per transaction.')
+def archive_assignments_command(older_than_days, period, chunk_size):
+    """Moves old Completed assignments into the per-period history tables."""
+    moved = archive_assignments(
+        older_than_days if older_than_days is not None else app.config['ASSIGNMENT_ARCHIVE_AFTER_DAYS'],
+        period=period or app.config['ASSIGNMENT_ARCHIVE_PERIOD'],
+        chunk_size=chunk_size or app.config['ASSIGNMENT_ARCHIVE_CHUNK_SIZE'],
+    )
+    print(f"Archived {moved} completed assignments.")
+
+@app.cli.command('purge-idempotency-keys')
+@click.option('--chunk-size', type=int, default=5000, help='Keys deleted per transaction.')
+def purge_idempotency_keys_command(chunk_size):
+    """Deletes idempotency keys past their TTL."""
+    purged = purge_expired(chunk_size=chunk_size)
+    print(f"Purged {purged} expired idempotency keys.")
+
 
 # Run App
 
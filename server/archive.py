@@ -0,0 +1,224 @@
+import threading
+from collections import defaultdict
+from datetime import datetime, timedelta
+
+from sqlalchemy import Column, Index, MetaData, Table, delete, event, insert, select
+from sqlalchemy.orm import aliased
+
+from database import db
+from models import Assignment, AssignmentHistoryPartition, Driver, Truck
+from analytics import INTERVAL_FIELDS, add_contribution, apply_deltas
+from pagination import parse_datetime
+from response_cache import versions
+from serialization import fetch_one, load_merged_page, load_page
+
+HISTORY_PREFIX = 'assignments_history_'
+ARCHIVED_STATUS = 'Completed'
+PERIODS = ('year', 'month')
+DATE_FILTERS = ('start_from', 'start_to', 'end_from', 'end_to')
+
+# History tables live outside db.metadata, so create_all and migrations leave them alone
+history_metadata = MetaData()
+_entities = {}
+_lock = threading.Lock()
+
+
+# History tables
+
+def period_bounds(moment, period):
+    """(table name, period start, period end) of the history table for an assignment starting at `moment`."""
+    if period == 'month':
+        start = datetime(moment.year, moment.month, 1)
+        end = datetime(moment.year + moment.month // 12, moment.month % 12 + 1, 1)
+        return f'{HISTORY_PREFIX}{moment.year}_{moment.month:02d}', start, end
+    start = datetime(moment.year, 1, 1)
+    return f'{HISTORY_PREFIX}{moment.year}', start, datetime(moment.year + 1, 1, 1)
+
+
+def history_table(name):
+    """A history table: the assignments columns and lookup indexes, without foreign keys."""
+    with _lock:
+        table = history_metadata.tables.get(name)
+        if table is None:
+            table = Table(
+                name, history_metadata,
+                *(Column(c.name, c.type, primary_key=c.primary_key, nullable=c.nullable, autoincrement=False)
+                  for c in Assignment.__table__.columns),
+                Index(f'ix_{name}_truck_period', 'truck_id', 'start_date', 'end_date'),
+                Index(f'ix_{name}_driver_period', 'driver_id', 'start_date', 'end_date'),
+                Index(f'ix_{name}_start', 'start_date'),
+            )
+        return table
+
+
+def history_entity(name):
+    """Assignment mapped onto a history table, so ORM queries read it like the assignments table."""
+    with _lock:
+        entity = _entities.get(name)
+    if entity is None:
+        entity = aliased(Assignment, history_table(name), name=name, adapt_on_names=True)
+        with _lock:
+            entity = _entities.setdefault(name, entity)
+    return entity
+
+
+def partitions(session=None):
+    """The partition registry, read once per session (that is, once per request)."""
+    session = session or db.session
+    if 'history_partitions' not in session.info:
+        rows = session.query(
+            AssignmentHistoryPartition.table_name, AssignmentHistoryPartition.period_start,
+            AssignmentHistoryPartition.period_end, AssignmentHistoryPartition.max_end_date,
+        ).all()
+        session.info['history_partitions'] = sorted(rows, key=lambda row: row.period_start)
+    return session.info['history_partitions']
+
+
+def history_entities(session=None, start=None, end=None):
+    """History tables that may hold assignments overlapping [start, end); all of them by default."""
+    return [
+        history_entity(p.table_name) for p in partitions(session)
+        if (end is None or p.period_start < end)
+        and (start is None or (p.max_end_date is not None and p.max_end_date > start))
+    ]
+
+
+def include_object(object, name, type_, reflected, compare_to):
+    """Alembic autogenerate filter: history tables are created by the archive job, not by migrations."""
+    table_name = name if type_ == 'table' else getattr(getattr(object, 'table', None), 'name', None)
+    return not (table_name or '').startswith(HISTORY_PREFIX)
+
+
+# Read paths
+
+def _may_match(partition, bounds):
+    if 'start_from' in bounds and partition.period_end <= bounds['start_from']:
+        return False
+    # end_date > start_date, so end_to bounds the start as well
+    for name in ('start_to', 'end_to'):
+        if name in bounds and partition.period_start >= bounds[name]:
+            return False
+    if 'end_from' in bounds and (partition.max_end_date is None or partition.max_end_date < bounds['end_from']):
+        return False
+    return True
+
+
+def history_sources(args, session=None):
+    """
+    History tables a date-ranged assignments request has to read besides the hot table.
+    Requests without a date filter, or filtering on a status that is never archived, read
+    only the hot table.
+    """
+    if not any(args.get(name) for name in DATE_FILTERS):
+        return []
+    if args.get('status') and args['status'] != ARCHIVED_STATUS:
+        return []
+    bounds = {name: parse_datetime(args[name], name) for name in DATE_FILTERS if args.get(name)}
+    return [history_entity(p.table_name) for p in partitions(session) if _may_match(p, bounds)]
+
+
+def load_assignment_page(args, session=None):
+    """One page of assignments; date-ranged requests also read the history tables they overlap."""
+    session = session or db.session
+    sources = history_sources(args, session)
+    if not sources:
+        return load_page(session.query(Assignment), Assignment, args, session)
+    return load_merged_page([Assignment, *sources], args, session)
+
+
+def fetch_assignment(id, args, session=None):
+    """A single assignment as a dict, looked up in the history tables when it is no longer hot."""
+    item = fetch_one(Assignment, id, args, session)
+    for entity in [] if item is not None else history_entities(session):
+        item = fetch_one(entity, id, args, session)
+        if item is not None:
+            break
+    return item
+
+
+# Archiving
+
+def _move(rows, period):
+    connection = db.session.connection()
+    groups = defaultdict(list)
+    for row in rows:
+        groups[period_bounds(row['start_date'], period)].append(dict(row))
+
+    for (name, start, end), items in groups.items():
+        table = history_table(name)
+        table.create(connection, checkfirst=True)
+        connection.execute(insert(table), items)
+
+        partition = db.session.get(AssignmentHistoryPartition, name)
+        if partition is None:
+            partition = AssignmentHistoryPartition(table_name=name, period_start=start, period_end=end, row_count=0)
+            db.session.add(partition)
+        latest = max(item['end_date'] for item in items)
+        partition.row_count += len(items)
+        partition.max_end_date = max(partition.max_end_date or latest, latest)
+
+    # A Core delete skips the mapper events: the rollup keeps the archived time, and the change feed stays quiet
+    source = Assignment.__table__
+    connection.execute(delete(source).where(source.c.id.in_([row['id'] for row in rows])))
+
+
+def archive_assignments(older_than_days, period='year', chunk_size=5000, now=None):
+    """
+    Moves Completed assignments that ended more than `older_than_days` ago from the
+    assignments table into per-period history tables, committing one chunk at a time.
+    Returns the number of assignments moved.
+    """
+    if period not in PERIODS:
+        raise ValueError(f"Unknown archive period '{period}'. Use year or month.")
+    cutoff = (now or datetime.now()) - timedelta(days=older_than_days)
+    source = Assignment.__table__
+    moved = 0
+
+    while True:
+        rows = db.session.execute(
+            select(source)
+            .where(source.c.status == ARCHIVED_STATUS, source.c.start_date < cutoff, source.c.end_date < cutoff)
+            .order_by(source.c.start_date, source.c.id)
+            .limit(chunk_size)
+            .with_for_update()
+        ).mappings().all()
+        if not rows:
+            break
+        try:
+            _move(rows, period)
+            versions.bump(('assignments',))
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            raise
+        moved += len(rows)
+
+    db.session.info.pop('history_partitions', None)
+    return moved
+
+
+# Deleting a driver or truck removes its archived assignments too, as the
+# assignments cascade does for hot ones, and takes their time out of the rollup.
+
+def _delete_history(connection, column_name, resource_id):
+    registry = AssignmentHistoryPartition.__table__
+    deltas = defaultdict(int)
+    for name, in connection.execute(select(registry.c.table_name)).all():
+        table = history_table(name)
+        column = table.c[column_name]
+        for row in connection.execute(select(*(table.c[f] for f in INTERVAL_FIELDS)).where(column == resource_id)):
+            add_contribution(deltas, *row, sign=-1)
+        deleted = connection.execute(table.delete().where(column == resource_id)).rowcount
+        if deleted:
+            connection.execute(
+                registry.update().where(registry.c.table_name == name).values(row_count=registry.c.row_count - deleted)
+            )
+    apply_deltas(connection, deltas)
+
+@event.listens_for(Driver, 'after_delete')
+def _driver_deleted(mapper, connection, driver):
+    _delete_history(connection, 'driver_id', driver.id)
+
+@event.listens_for(Truck, 'after_delete')
+def _truck_deleted(mapper, connection, truck):
+    _delete_history(connection, 'truck_id', truck.id)
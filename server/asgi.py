@@ -0,0 +1,679 @@
+"""
+Async (ASGI) entry point serving the auth, drivers, trucks and assignments API
+on asyncio with an async SQLAlchemy engine. Run with any ASGI server:
+
+    hypercorn asgi:app --bind 127.0.0.1:5555
+
+Same routes, JSON shapes, messages and session cookies as app.py, and the same
+models. Query helpers shared with the Flask app (pagination, serialization,
+availability checks) run through AsyncSession.run_sync, so their I/O still
+goes through the async driver without blocking the event loop. Every other
+route is handed to the Flask app, in this process, on a thread of its own.
+"""
+import asyncio
+import io
+import sys
+import threading
+from datetime import datetime
+from functools import wraps
+
+from dotenv import load_dotenv
+from quart import Quart, Response, request, jsonify, make_response, session, g
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+from sqlalchemy.orm.exc import StaleDataError
+
+from config import load_config
+from engine_profile import DEFER_COMMIT, READ_METHODS, DeferrableSession, async_url, configure_engines, engine_options
+from models import User, Driver, Truck, Assignment
+from auth import MANAGER_ROLES, principal_cache, init_auth
+from passwords import PasswordHasherBusy, password_hasher, init_passwords
+from versioning import STALE_MESSAGE, PreconditionFailed, check_if_match, row_etag, version_headers
+from idempotency import (
+    IDEMPOTENCY_HEADER, REPLAYED_HEADER, IdempotencyError, Outcome, begin, finish, identify, init_idempotency,
+    outcome_cache, release, replay
+)
+from pagination import QueryParamError, next_page_headers
+from serialization import load_page, fetch_one
+from archive import fetch_assignment, load_assignment_page
+from scheduling import AssignmentConflict, check_availability
+from search import search
+from response_cache import invalidating, versions
+import analytics  # noqa: F401 (mapper events keep the utilization rollup current on writes)
+from app import app as flask_app
+
+try:
+    from quart_cors import cors
+except ImportError:  # Optional: only needed when the React client talks to this server directly
+    cors = None
+
+# Load environment variables
+load_dotenv()
+
+app = Quart(__name__)
+load_config(app.config)
+configure_engines(app)
+init_auth(app)
+init_passwords(app)
+init_idempotency(app)
+if cors is not None:
+    app = cors(app, allow_origin="http://localhost:3000", allow_credentials=True,
+               expose_headers=["X-Next-Cursor", "Link", REPLAYED_HEADER])
+
+
+def _engine(url):
+    return create_async_engine(async_url(url), **engine_options(url, app.config))
+
+engines = {'primary': _engine(app.config['SQLALCHEMY_DATABASE_URI'])}
+if app.config.get('DATABASE_READ_URL'):
+    engines['replica'] = _engine(app.config['DATABASE_READ_URL'])
+
+# Objects stay loaded after commit: lazy refreshes can't run outside the event loop's awaits
+Session = async_sessionmaker(class_=AsyncSession, sync_session_class=DeferrableSession, expire_on_commit=False)
+
+
+@app.before_request
+async def open_session():
+    read_only = request.method in READ_METHODS and 'replica' in engines
+    g.db = Session(bind=engines['replica' if read_only else 'primary'])
+
+@app.teardown_request
+async def close_session(exc):
+    db_session = g.pop('db', None)
+    if db_session is not None:
+        await db_session.close()
+
+@app.after_serving
+async def dispose_engines():
+    for engine in engines.values():
+        await engine.dispose()
+    password_hasher.shutdown()
+
+
+@app.errorhandler(QueryParamError)
+async def handle_query_param_error(e):
+    return jsonify({"error": str(e)}), 400
+
+@app.errorhandler(PasswordHasherBusy)
+async def handle_password_hasher_busy(e):
+    return jsonify({"error": str(e)}), 503, {'Retry-After': '1'}
+
+@app.errorhandler(PreconditionFailed)
+async def handle_precondition_failed(e):
+    return jsonify(e.to_dict()), 412, {'ETag': f'"{e.current_version}"'}
+
+@app.errorhandler(IdempotencyError)
+async def handle_idempotency_error(e):
+    return jsonify(e.to_dict()), e.status
+
+@app.errorhandler(StaleDataError)
+async def handle_stale_data(e):
+    # A versioned UPDATE/DELETE matched no row: another writer committed after this request read it
+    await g.db.rollback()
+    return jsonify({"error": STALE_MESSAGE}), 412
+
+
+# Decorators (async counterparts of auth.py's)
+
+async def current_role():
+    """Role of the logged-in user, served from the shared principal cache. None if not logged in."""
+    if 'role' not in g:
+        user_id = session.get('user_id')
+        role = None
+        if user_id:
+            hit, role = principal_cache.lookup(user_id)
+            if not hit:
+                role = await g.db.scalar(select(User.role).filter_by(id=user_id))
+                principal_cache.put(user_id, role)
+        g.role = role
+    return g.role
+
+
+def login_required(f):
+    @wraps(f)
+    async def decorated(*args, **kwargs):
+        if 'user_id' not in session:
+            return jsonify({"error": "Authentication required"}), 401
+        return await f(*args, **kwargs)
+    return decorated
+
+def roles_required(roles, message):
+    def decorator(f):
+        @wraps(f)
+        async def decorated(*args, **kwargs):
+            if not session.get('user_id'):
+                return jsonify({"error": "Unauthorized. Please log in."}), 401
+            if await current_role() not in roles:
+                return jsonify({"error": message}), 403
+            return await f(*args, **kwargs)
+        return decorated
+    return decorator
+
+admin_required = roles_required(('Admin',), "Forbidden. Admin access required.")
+admin_or_manager_required = roles_required(MANAGER_ROLES, "Admin or Fleet Manager access required")
+
+def idempotent(f):
+    """Async counterpart of idempotency.idempotent; the store's queries run through run_sync."""
+    @wraps(f)
+    async def decorated(*args, **kwargs):
+        header = request.headers.get(IDEMPOTENCY_HEADER)
+        if header is None:
+            return await f(*args, **kwargs)
+
+        key, request_hash = identify(header, session.get('user_id'), request.method, request.path,
+                                     request.query_string, await request.get_data())
+        ttl, claim_timeout = app.config['IDEMPOTENCY_KEY_TTL_SECONDS'], app.config['IDEMPOTENCY_CLAIM_TIMEOUT_SECONDS']
+        stored = outcome_cache.get(key) or await g.db.run_sync(
+            lambda s: begin(s, key, request_hash, ttl, claim_timeout)
+        )
+        if isinstance(stored, Outcome):
+            outcome_cache.put(key, stored)
+            return replay(stored, request_hash)
+        await g.db.commit()  # Retries see the key as in progress from here on
+
+        # The handler's writes commit together with the stored response, as in idempotency.idempotent
+        try:
+            g.db.info[DEFER_COMMIT] = True
+            try:
+                response = await make_response(await f(*args, **kwargs))
+            finally:
+                g.db.info.pop(DEFER_COMMIT, None)
+            body = await response.get_data()
+            outcome = await g.db.run_sync(
+                lambda s: finish(s, stored, response.status_code, response.content_type, body)
+            )
+            await g.db.commit()
+        except Exception:
+            await g.db.run_sync(lambda s: release(s, key))
+            await g.db.commit()
+            raise
+        if outcome is not None:
+            outcome_cache.put(key, outcome)
+        return response
+    return decorated
+
+
+def invalidates(*resources):
+    """Async counterpart of response_cache.invalidates: the writes bump the cache versions the WSGI app reads."""
+    def decorator(f):
+        @wraps(f)
+        async def decorated(*args, **kwargs):
+            with invalidating(g.db.sync_session, resources):
+                response = await make_response(await f(*args, **kwargs))
+            if response.status_code < 400 and g.db.info.get(DEFER_COMMIT):
+                versions.bump(resources, g.db.sync_session)
+            return response
+        return decorated
+    return decorator
+
+
+# Shared read helpers
+
+def page_response(items, next_cursor):
+    response = jsonify(items)
+    response.headers.update(next_page_headers(request.args, request.base_url, next_cursor))
+    return response
+
+async def list_response(model):
+    args = request.args
+    return page_response(*await g.db.run_sync(lambda s: load_page(s.query(model), model, args, s)))
+
+async def search_response(model):
+    args = request.args
+    return page_response(*await g.db.run_sync(lambda s: search(model, args, s)))
+
+async def detail_response(model, id, not_found, fetch=None):
+    """Single row, with the row version as its ETag (as the WSGI app's @cached(row=...) sends it)."""
+    args = request.args
+    fetch = fetch or (lambda s: fetch_one(model, id, args, s))
+    item = await g.db.run_sync(fetch)
+    if not item:
+        return jsonify({"error": not_found}), 404
+    response = await make_response(jsonify(item), 200)
+    # The body carries the version unless ?fields= leaves it out, which saves a query
+    version = item.get('version')
+    if version is None:
+        version = await g.db.scalar(select(model.version).where(model.id == id))
+    if version is not None:
+        # Included related rows can change without the row's version moving; hash the body then
+        body = await response.get_data() if args.get('include') else None
+        etag = row_etag(version, body)
+        if etag in request.if_none_match:
+            response = await make_response('', 304)
+        response.set_etag(etag)
+        response.headers['Cache-Control'] = 'private, no-cache'
+    return response
+
+
+# Authentication Routes
+
+@app.route('/register', methods=['POST'])
+async def register():
+    data = await request.get_json()
+    username = data.get('username')
+    email = data.get('email')
+    password = data.get('password')
+    role = data.get('role', 'Fleet Manager')
+
+    if not username or not email or not password:
+        return jsonify({"error": "Username, email, and password are required."}), 400
+
+    if await g.db.scalar(select(User.id).filter_by(username=username)):
+        return jsonify({"error": "Username already exists."}), 409
+
+    if await g.db.scalar(select(User.id).filter_by(email=email)):
+        return jsonify({"error": "Email already exists."}), 409
+
+    try:
+        new_user = User(username=username, email=email, role=role)
+        await g.db.close()  # Don't hold a pooled connection while hashing
+        await asyncio.to_thread(new_user.set_password, password)  # Waits on the hashing pool off the event loop
+        g.db.add(new_user)
+        await g.db.commit()
+
+        return jsonify({"message": "User registered successfully."}), 201
+
+    except Exception:
+        await g.db.rollback()
+        return jsonify({"error": "An error occurred while creating the user."}), 500
+
+@app.route('/login', methods=['POST'])
+async def login():
+    data = await request.get_json()
+    username = data.get('username')
+    password = data.get('password')
+
+    if not username or not password:
+        return jsonify({"error": "Username and password are required."}), 400
+
+    user = await g.db.scalar(select(User).filter_by(username=username))
+    # Hand the database connection back to the pool while the hash check waits on the hashing pool
+    await g.db.close()
+    if not user or not await asyncio.to_thread(user.check_password, password):
+        return jsonify({"error": "Invalid username or password."}), 401
+    g.db.add(user)
+    if user in g.db.dirty:
+        await g.db.commit()  # check_password upgraded an outdated password hash
+
+    session['user_id'] = user.id
+    session['username'] = user.username
+    session['role'] = user.role
+    principal_cache.put(user.id, user.role)
+
+    return jsonify({
+        "message": "Login successful.",
+        "user": {
+            "id": user.id,
+            "username": user.username,
+            "email": user.email,
+            "role": user.role
+        }
+    }), 200
+
+@app.route('/logout', methods=['POST'])
+async def logout():
+    if 'user_id' not in session:
+        return jsonify({"error": "Not logged in."}), 401
+
+    session.clear()
+    return jsonify({"message": "Logged out successfully."}), 200
+
+
+# Driver Routes
+
+@app.route('/drivers', methods=['GET'])
+@admin_required
+async def get_all_drivers():
+    return await list_response(Driver), 200
+
+@app.route('/drivers/search', methods=['GET'])
+@admin_required
+async def search_drivers():
+    return await search_response(Driver), 200
+
+@app.route('/drivers/<int:id>', methods=['GET'])
+@admin_required
+async def get_driver_by_id(id):
+    return await detail_response(Driver, id, "Driver not found.")
+
+@app.route('/drivers', methods=['POST'])
+@admin_required
+@idempotent
+@invalidates('drivers')
+async def create_driver():
+    data = await request.get_json()
+    for field in ['name', 'license_number', 'contact_info']:
+        if field not in data:
+            return jsonify({"error": f"Missing required field: {field}"}), 400
+
+    if await g.db.scalar(select(Driver.id).filter_by(license_number=data['license_number'])):
+        return jsonify({"error": "License number already exists."}), 409
+
+    new_driver = Driver(
+        name=data['name'],
+        license_number=data['license_number'],
+        contact_info=data['contact_info'],
+        assigned_truck_id=data.get('assigned_truck_id')
+    )
+
+    g.db.add(new_driver)
+    await g.db.commit()
+    await g.db.refresh(new_driver)  # Server-side created_at
+
+    return jsonify(new_driver.to_dict()), 201
+
+@app.route('/drivers/<int:id>', methods=['PUT'])
+@admin_required
+@invalidates('drivers')
+async def update_driver(id):
+    driver = await g.db.get(Driver, id)
+    if not driver:
+        return jsonify({"error": "Driver not found."}), 404
+    check_if_match(driver, request.headers.get('If-Match'))
+
+    data = await request.get_json()
+    driver.name = data.get('name', driver.name)
+    driver.license_number = data.get('license_number', driver.license_number)
+    driver.contact_info = data.get('contact_info', driver.contact_info)
+    driver.assigned_truck_id = data.get('assigned_truck_id', driver.assigned_truck_id)
+
+    await g.db.commit()
+    return jsonify(driver.to_dict()), 200, version_headers(driver)
+
+@app.route('/drivers/<int:id>', methods=['DELETE'])
+@admin_required
+@invalidates('drivers', 'assignments')
+async def delete_driver(id):
+    driver = await g.db.get(Driver, id)
+    if not driver:
+        return jsonify({"error": "Driver not found."}), 404
+    check_if_match(driver, request.headers.get('If-Match'))
+
+    await g.db.delete(driver)
+    await g.db.commit()
+    return jsonify({"message": "Driver deleted successfully."}), 200
+
+
+# Truck Routes
+
+@app.route('/trucks', methods=['GET'])
+@admin_required
+async def get_all_trucks():
+    return await list_response(Truck), 200
+
+@app.route('/trucks/search', methods=['GET'])
+@admin_required
+async def search_trucks():
+    return await search_response(Truck), 200
+
+@app.route('/trucks/<int:id>', methods=['GET'])
+@admin_required
+async def get_truck_by_id(id):
+    return await detail_response(Truck, id, "Truck not found.")
+
+@app.route('/trucks', methods=['POST'])
+@admin_required
+@idempotent
+@invalidates('trucks')
+async def create_truck():
+    data = await request.get_json()
+    for field in ['plate_number', 'model']:
+        if field not in data:
+            return jsonify({"error": f"Missing required field: {field}"}), 400
+
+    if await g.db.scalar(select(Truck.id).filter_by(plate_number=data['plate_number'])):
+        return jsonify({"error": "Truck with this plate number already exists."}), 409
+
+    new_truck = Truck(
+        plate_number=data['plate_number'],
+        model=data['model'],
+        status=data.get('status', 'Available'),
+        current_driver_id=data.get('current_driver_id')
+    )
+
+    g.db.add(new_truck)
+    await g.db.commit()
+    await g.db.refresh(new_truck)  # Server-side created_at
+
+    return jsonify(new_truck.to_dict()), 201
+
+@app.route('/trucks/<int:id>', methods=['PUT'])
+@admin_required
+@invalidates('trucks')
+async def update_truck(id):
+    truck = await g.db.get(Truck, id)
+    if not truck:
+        return jsonify({"error": "Truck not found."}), 404
+    check_if_match(truck, request.headers.get('If-Match'))
+
+    data = await request.get_json()
+    truck.model = data.get('model', truck.model)
+    truck.plate_number = data.get('plate_number', truck.plate_number)
+    truck.status = data.get('status', truck.status)
+    truck.current_driver_id = data.get('current_driver_id', truck.current_driver_id)
+
+    await g.db.commit()
+    return jsonify(truck.to_dict()), 200, version_headers(truck)
+
+@app.route('/trucks/<int:id>', methods=['DELETE'])
+@admin_required
+@invalidates('trucks', 'assignments')
+async def delete_truck(id):
+    truck = await g.db.get(Truck, id)
+    if not truck:
+        return jsonify({"error": "Truck not found."}), 404
+    check_if_match(truck, request.headers.get('If-Match'))
+
+    await g.db.delete(truck)
+    await g.db.commit()
+    return jsonify({"message": "Truck deleted successfully."}), 200
+
+
+# Assignment Routes
+
+@app.route('/assignments', methods=['GET'])
+@login_required
+@admin_or_manager_required
+async def get_assignments():
+    args = request.args
+    return page_response(*await g.db.run_sync(lambda s: load_assignment_page(args, s))), 200
+
+@app.route('/assignments/<int:id>', methods=['GET'])
+@admin_or_manager_required
+async def get_assignment_by_id(id):
+    args = request.args
+    return await detail_response(Assignment, id, "Assignment not found.",
+                                 lambda s: fetch_assignment(id, args, s))
+
+@app.route('/assignments', methods=['POST'])
+@login_required
+@admin_or_manager_required
+@idempotent
+@invalidates('assignments')
+async def create_assignment():
+    data = await request.get_json()
+    try:
+        start_date = datetime.strptime(data['start_date'], '%Y-%m-%d %H:%M:%S')
+        end_date = datetime.strptime(data['end_date'], '%Y-%m-%d %H:%M:%S') if data.get('end_date') else None
+        await g.db.run_sync(lambda s: check_availability(data['driver_id'], data['truck_id'], start_date, end_date,
+                                                         session=s))
+
+        new_assignment = Assignment(
+            start_date=start_date,
+            end_date=end_date,
+            status=data.get('status', 'Active'),
+            driver_id=data['driver_id'],
+            truck_id=data['truck_id']
+        )
+
+        g.db.add(new_assignment)
+        await g.db.commit()
+
+        return jsonify(new_assignment.to_dict()), 201
+
+    except AssignmentConflict as e:
+        return jsonify(e.to_dict()), 409
+    except Exception as e:
+        return jsonify({"error": str(e)}), 400
+
+@app.route('/assignments/<int:id>', methods=['PATCH'])
+@login_required
+@admin_or_manager_required
+@invalidates('assignments')
+async def update_assignment(id):
+    assignment = await g.db.get(Assignment, id)
+    if not assignment:
+        return jsonify({"error": "Assignment not found"}), 404
+    check_if_match(assignment, request.headers.get('If-Match'))
+
+    data = await request.get_json()
+    try:
+        if 'start_date' in data:
+            assignment.start_date = datetime.strptime(data['start_date'], '%Y-%m-%d %H:%M:%S')
+        if 'end_date' in data:
+            assignment.end_date = datetime.strptime(data['end_date'], '%Y-%m-%d %H:%M:%S')
+        if 'status' in data:
+            assignment.status = data['status']
+        if 'driver_id' in data:
+            assignment.driver_id = data['driver_id']
+        if 'truck_id' in data:
+            assignment.truck_id = data['truck_id']
+
+        def check(s):
+            with s.no_autoflush:
+                check_availability(assignment.driver_id, assignment.truck_id, assignment.start_date,
+                                   assignment.end_date, exclude_ids={assignment.id}, session=s)
+        await g.db.run_sync(check)
+
+        await g.db.commit()
+        return jsonify(assignment.to_dict()), 200, version_headers(assignment)
+
+    except AssignmentConflict as e:
+        await g.db.rollback()
+        return jsonify(e.to_dict()), 409
+    except StaleDataError:
+        raise  # 412, see handle_stale_data
+    except Exception as e:
+        await g.db.rollback()
+        return jsonify({"error": str(e)}), 400
+
+@app.route('/assignments/<int:id>', methods=['DELETE'])
+@login_required
+@admin_or_manager_required
+@invalidates('assignments')
+async def delete_assignment(id):
+    assignment = await g.db.get(Assignment, id)
+    if not assignment:
+        return jsonify({"error": "Assignment not found"}), 404
+    check_if_match(assignment, request.headers.get('If-Match'))
+
+    try:
+        await g.db.delete(assignment)
+        await g.db.commit()
+        return jsonify({"message": "Assignment deleted successfully"}), 200
+
+    except StaleDataError:
+        raise  # 412, see handle_stale_data
+    except Exception as e:
+        return jsonify({"error": str(e)}), 400
+
+
+# Routes served by the Flask app
+#
+# Everything not ported above (bulk writes, export, conflicts, assign/release, dispatch, availability,
+# analytics, /batch, /changes, /metrics, ...) runs in the Flask app, each request on its own thread
+# as under a threaded WSGI server. Its response is streamed back, so exports and /changes/stream
+# aren't buffered.
+
+WSGI_METHODS = ['GET', 'POST', 'PUT', 'PATCH', 'DELETE']
+WSGI_BUFFERED_CHUNKS = 8  # Response chunks the Flask thread may run ahead of a slow client
+# Set by the ASGI app's own CORS middleware; Flask-CORS would send them a second time
+CORS_HEADER_PREFIX = 'access-control-'
+
+
+def wsgi_environ(body):
+    """The WSGI environ a WSGI server would build for the current request."""
+    scope = request.scope
+    server = scope.get('server') or ('localhost', 80)
+    environ = {
+        'REQUEST_METHOD': request.method,
+        'SCRIPT_NAME': scope.get('root_path', '').encode().decode('latin-1'),
+        'PATH_INFO': scope['path'].encode().decode('latin-1'),
+        'QUERY_STRING': scope['query_string'].decode('latin-1'),
+        'SERVER_NAME': server[0],
+        'SERVER_PORT': str(server[1]),
+        'SERVER_PROTOCOL': f"HTTP/{scope.get('http_version', '1.1')}",
+        'REMOTE_ADDR': (scope.get('client') or ('',))[0],
+        'CONTENT_LENGTH': str(len(body)),
+        'wsgi.version': (1, 0),
+        'wsgi.url_scheme': scope.get('scheme', 'http'),
+        'wsgi.input': io.BytesIO(body),
+        'wsgi.errors': sys.stderr,
+        'wsgi.multithread': True,
+        'wsgi.multiprocess': True,
+        'wsgi.run_once': False,
+    }
+    for name, value in scope['headers']:
+        key = name.decode('latin-1').upper().replace('-', '_')
+        if key not in ('CONTENT_TYPE', 'CONTENT_LENGTH'):
+            key = f'HTTP_{key}'
+        value = value.decode('latin-1')
+        if key in environ and key != 'CONTENT_LENGTH':
+            value = environ[key] + ('; ' if key == 'HTTP_COOKIE' else ', ') + value
+        environ[key] = value
+    return environ
+
+
+async def call_flask(environ):
+    """Runs the Flask app for `environ` on a new thread and streams its response."""
+    loop = asyncio.get_running_loop()
+    started = loop.create_future()
+    chunks = asyncio.Queue(WSGI_BUFFERED_CHUNKS)
+    closed = threading.Event()  # Set once the client is gone
+
+    def start_response(status, headers, exc_info=None):
+        loop.call_soon_threadsafe(started.set_result, (status, headers))
+        return lambda data: put(data)
+
+    def put(chunk):
+        if not closed.is_set():
+            asyncio.run_coroutine_threadsafe(chunks.put(chunk), loop).result()
+
+    def run():
+        iterable = None
+        try:
+            iterable = flask_app(environ, start_response)
+            for chunk in iterable:
+                if closed.is_set():
+                    break
+                put(chunk)
+        except Exception as e:
+            flask_app.logger.exception("Error in a request served by the Flask app")
+            loop.call_soon_threadsafe(lambda: started.done() or started.set_exception(e))
+        finally:
+            if hasattr(iterable, 'close'):
+                iterable.close()
+            put(None)
+
+    threading.Thread(target=run, daemon=True).start()
+    status, headers = await started
+
+    async def body():
+        try:
+            while (chunk := await chunks.get()) is not None:
+                yield chunk
+        finally:
+            closed.set()
+            while not chunks.empty():  # Unblock the thread if it's waiting to hand over a chunk
+                chunks.get_nowait()
+
+    response = Response(body(), status=int(status.split(' ', 1)[0]),
+                        headers=[(k, v) for k, v in headers if not k.lower().startswith(CORS_HEADER_PREFIX)])
+    response.timeout = None  # Streams end on the Flask side (CHANGE_FEED_MAX_STREAM_SECONDS)
+    return response
+
+
+@app.route('/', defaults={'path': ''}, methods=WSGI_METHODS)
+@app.route('/<path:path>', methods=WSGI_METHODS)
+async def served_by_flask(path):
+    return await call_flask(wsgi_environ(await request.get_data()))
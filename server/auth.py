@@ -0,0 +1,158 @@
+import threading
+import time
+from collections import OrderedDict
+from functools import wraps
+
+from flask import jsonify, session, g
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import Session, object_session
+
+from database import db
+from models import User
+
+MANAGER_ROLES = ('Admin', 'Fleet Manager')
+
+
+class PrincipalCache:
+    """
+    In-process TTL + LRU cache of user_id -> role, so role checks don't query
+    the users table on every request. Missing users are cached too (role None).
+    """
+
+    def __init__(self, ttl=60, max_size=10000):
+        self.ttl = ttl
+        self.max_size = max_size
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def configure(self, ttl, max_size):
+        with self._lock:
+            self.ttl = ttl
+            self.max_size = max_size
+            self._entries.clear()
+
+    def lookup(self, user_id):
+        """(True, role) on a fresh hit, (False, None) on a miss; callers load and put() on a miss."""
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is not None and entry[1] > now:
+                self._entries.move_to_end(user_id)
+                self.hits += 1
+                return True, entry[0]
+            self.misses += 1
+            return False, None
+
+    def get_role(self, user_id):
+        hit, role = self.lookup(user_id)
+        if not hit:
+            role = db.session.query(User.role).filter_by(id=user_id).scalar()
+            self.put(user_id, role)
+        return role
+
+    def put(self, user_id, role):
+        with self._lock:
+            self._entries[user_id] = (role, time.monotonic() + self.ttl)
+            self._entries.move_to_end(user_id)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate(self, user_id):
+        with self._lock:
+            if self._entries.pop(user_id, None) is not None:
+                self.invalidations += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._entries),
+                "max_size": self.max_size,
+                "ttl": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": round(self.hits / lookups, 4) if lookups else None,
+                "evictions": self.evictions,
+                "invalidations": self.invalidations,
+            }
+
+
+principal_cache = PrincipalCache()
+
+
+def init_auth(app):
+    principal_cache.configure(
+        ttl=app.config.get('PRINCIPAL_CACHE_TTL', 60),
+        max_size=app.config.get('PRINCIPAL_CACHE_SIZE', 10000),
+    )
+
+
+# Invalidation: drop the cached role as soon as a role change or delete is flushed,
+# and again after commit so a concurrent reload of the old row can't linger until TTL.
+
+@event.listens_for(User, 'after_update')
+def _user_updated(mapper, connection, user):
+    if inspect(user).attrs.role.history.has_changes():
+        _queue_invalidation(user)
+
+@event.listens_for(User, 'after_delete')
+def _user_deleted(mapper, connection, user):
+    _queue_invalidation(user)
+
+def _queue_invalidation(user):
+    principal_cache.invalidate(user.id)
+    sess = object_session(user)
+    if sess is not None:
+        sess.info.setdefault('principal_invalidations', set()).add(user.id)
+
+@event.listens_for(Session, 'after_commit')
+def _after_commit(sess):
+    for user_id in sess.info.pop('principal_invalidations', ()):
+        principal_cache.invalidate(user_id)
+
+@event.listens_for(Session, 'after_rollback')
+def _after_rollback(sess):
+    sess.info.pop('principal_invalidations', None)
+
+
+# Decorators
+
+def current_role():
+    """Role of the logged-in user, served from the principal cache. None if not logged in."""
+    if 'role' not in g:
+        user_id = session.get('user_id')
+        g.role = principal_cache.get_role(user_id) if user_id else None
+    return g.role
+
+
+def login_required(f):
+    @wraps(f)
+    def decorated(*args, **kwargs):
+        if 'user_id' not in session:
+            return jsonify({"error": "Authentication required"}), 401
+        return f(*args, **kwargs)
+    return decorated
+
+def roles_required(roles, message):
+    def decorator(f):
+        @wraps(f)
+        def decorated(*args, **kwargs):
+            if not session.get('user_id'):
+                return jsonify({"error": "Unauthorized. Please log in."}), 401
+            if current_role() not in roles:
+                return jsonify({"error": message}), 403
+            return f(*args, **kwargs)
+        return decorated
+    return decorator
+
+admin_required = roles_required(('Admin',), "Forbidden. Admin access required.")
+admin_or_manager_required = roles_required(MANAGER_ROLES, "Admin or Fleet Manager access required")
@@ -0,0 +1,120 @@
+import json
+
+from flask import current_app, g, request
+from werkzeug.test import EnvironBuilder
+
+from database import db
+from engine_profile import DEFER_COMMIT
+
+MAX_BATCH_REQUESTS = 50
+BATCH_METHODS = ('GET', 'POST', 'PUT', 'PATCH', 'DELETE')
+# Sub-requests that can't run inside a batch: batches themselves and long-lived streams
+EXCLUDED_PATHS = ('/batch', '/changes/stream')
+# Response headers passed through to each sub-response
+FORWARDED_HEADERS = ('X-Next-Cursor', 'Link', 'ETag', 'Location')
+SUBREQUEST_ENVIRON_KEY = 'fleet.batch_subrequest'  # Set in the WSGI environ of every sub-request
+
+
+class BatchRequestError(ValueError):
+    """Raised when a batch payload is malformed as a whole (not per sub-request)."""
+
+
+def parse_batch(payload):
+    """Returns ([(method, path, body)], atomic) from {"requests": [...], "atomic": bool}."""
+    if not isinstance(payload, dict) or not isinstance(payload.get('requests'), list):
+        raise BatchRequestError('Request body must be an object with a "requests" array.')
+    items = payload['requests']
+    if len(items) > MAX_BATCH_REQUESTS:
+        raise BatchRequestError(f"Too many requests; the limit is {MAX_BATCH_REQUESTS} per batch.")
+
+    parsed = []
+    for index, item in enumerate(items):
+        if not isinstance(item, dict):
+            raise BatchRequestError(f"Request {index} must be an object.")
+        method = str(item.get('method', 'GET')).upper()
+        path = item.get('path')
+        if method not in BATCH_METHODS:
+            raise BatchRequestError(f"Request {index}: unsupported method '{method}'.")
+        if not isinstance(path, str) or not path.startswith('/'):
+            raise BatchRequestError(f"Request {index}: 'path' must be an absolute path such as /drivers/1.")
+        if path.split('?')[0].rstrip('/') in EXCLUDED_PATHS:
+            raise BatchRequestError(f"Request {index}: {path.split('?')[0]} can't be batched.")
+        parsed.append((method, path, item.get('body')))
+    return parsed, bool(payload.get('atomic', False))
+
+
+def _dispatch(method, path, body):
+    """
+    Runs one sub-request through the app's full request pipeline (auth, hooks, error handlers)
+    with the batch's cookies, so it sees the same logged-in session. Returns a sub-response dict.
+    """
+    app = current_app._get_current_object()
+    builder = EnvironBuilder(
+        path=path, method=method, base_url=request.host_url,
+        headers={'Cookie': request.headers.get('Cookie', '')},
+        json=body, environ_overrides={SUBREQUEST_ENVIRON_KEY: True},
+    )
+    # g belongs to the app context, which sub-requests share with the batch; give each its own
+    outer = dict(vars(g))
+    vars(g).clear()
+    try:
+        with app.request_context(builder.get_environ()):
+            try:
+                response = app.full_dispatch_request()
+            except Exception as e:  # Propagated when the app runs with PROPAGATE_EXCEPTIONS
+                response = app.make_response(app.handle_exception(e))
+            data = response.get_data()
+    finally:
+        builder.close()
+        vars(g).clear()
+        vars(g).update(outer)
+
+    try:
+        parsed = json.loads(data) if data else None
+    except ValueError:
+        parsed = data.decode(errors='replace')
+    return {
+        "status": response.status_code,
+        "headers": {h: response.headers[h] for h in FORWARDED_HEADERS if h in response.headers},
+        "body": parsed,
+    }
+
+
+def run_batch(items, atomic=False):
+    """
+    Runs the sub-requests in order. Without `atomic`, each commits on its own, as if sent separately.
+    With `atomic`, they share one transaction: the first failure (status >= 400) rolls everything
+    back and the remaining sub-requests are not run. Returns (responses, committed).
+    """
+    responses = []
+    if not atomic:
+        for method, path, body in items:
+            responses.append(_dispatch(method, path, body))
+            if responses[-1]["status"] >= 400:
+                db.session.rollback()  # Leave no half-done work behind for the next sub-request
+        return responses, True
+
+    db.session.rollback()  # Start from a clean transaction
+    db.session.info[DEFER_COMMIT] = True
+    failed, finished = False, False
+    try:
+        for method, path, body in items:
+            if failed:
+                responses.append({"status": 424, "headers": {},
+                                  "body": {"error": "Not run: an earlier request in the atomic batch failed."}})
+                continue
+            responses.append(_dispatch(method, path, body))
+            # A flush that failed inside a handler leaves the transaction unusable even if the handler recovered
+            failed = responses[-1]["status"] >= 400 or not db.session.is_active
+        finished = True
+    finally:
+        db.session.info.pop(DEFER_COMMIT, None)
+        try:
+            if finished and not failed:
+                db.session.commit()
+            else:
+                db.session.rollback()
+        except Exception:
+            db.session.rollback()
+            raise
+    return responses, not failed
@@ -0,0 +1,433 @@
+#!/usr/bin/env python3
+"""
+Load and latency benchmark for the API.
+
+Generates (or reuses) a large SQLite database with seed.py, serves the app in a
+separate process, and drives the real routes over HTTP from a pool of client
+threads. Reports p50/p95/p99 latency, requests per second, SQL queries per
+request and the server's peak RSS per endpoint, and saves them as JSON so runs
+from two commits can be compared.
+
+    python benchmark.py run --drivers 50000 --trucks 20000 --assignments 1000000 --concurrency 16 -o before.json
+    python benchmark.py run --database /tmp/fleet-bench.db -o after.json    # reuse an existing dataset
+    python benchmark.py compare before.json after.json
+    python benchmark.py run --database /tmp/fleet-bench.db --response-cache 512 -o cached.json
+
+The response cache is off unless --response-cache is given, so GETs measure the
+database path; a cached run is reported on its own and flagged by compare.
+"""
+import argparse
+import http.client
+import itertools
+import json
+import logging
+import os
+import platform
+import random
+import socket
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime, timedelta
+from fnmatch import fnmatch
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+QUERY_HEADER = 'X-Benchmark-Queries'
+USERNAME, PASSWORD = 'admin_john', 'securepass123'  # Seeded by seed.py
+DATETIME_FORMAT = '%Y-%m-%d %H:%M:%S'
+SEARCH_PREFIXES = ['jam', 'mar', 'eli', 'kat', 'mic', 'ann', 'rob', 'jen', 'dav', 'sar']
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    run = commands.add_parser('run', help='Run the benchmark')
+    run.add_argument('--drivers', type=int, default=20000)
+    run.add_argument('--trucks', type=int, default=10000)
+    run.add_argument('--assignments', type=int, default=500000)
+    run.add_argument('--seed', type=int, default=42)
+    run.add_argument('--database', help='SQLite file to use; generated only if it does not exist yet')
+    run.add_argument('--concurrency', type=int, default=8, help='Concurrent client connections')
+    run.add_argument('--server-processes', type=int, default=1,
+                     help='Threaded server processes sharing one listening socket')
+    run.add_argument('--requests', type=int, default=1000, help='Requests per endpoint')
+    run.add_argument('--response-cache', type=int, default=0, metavar='SIZE',
+                     help='RESPONSE_CACHE_SIZE for the server (default 0: off, so GETs measure the queries)')
+    run.add_argument('--only', action='append', help='Run only endpoints matching this glob (repeatable)')
+    run.add_argument('-o', '--output', default='benchmark.json')
+
+    compare = commands.add_parser('compare', help='Compare two result files')
+    compare.add_argument('baseline')
+    compare.add_argument('candidate')
+
+    serve = commands.add_parser('serve', help=argparse.SUPPRESS)
+    serve.add_argument('--fd', type=int, required=True, help='Inherited listening socket')
+    options = parser.parse_args()
+    return options
+
+
+# Server (runs in its own process so its RSS is measured on its own)
+
+def serve(options):
+    from flask import has_request_context, request
+    from sqlalchemy import event
+    from werkzeug.serving import make_server
+
+    sys.path.insert(0, HERE)
+    from app import app
+    from batch import SUBREQUEST_ENVIRON_KEY
+    from database import db
+
+    # Per thread rather than in g, so a /batch request's count includes its sub-requests
+    counter = threading.local()
+
+    def count_query(conn, cursor, statement, parameters, context, executemany):
+        if has_request_context():
+            counter.queries = getattr(counter, 'queries', 0) + 1
+
+    @app.before_request
+    def reset_queries():
+        if not request.environ.get(SUBREQUEST_ENVIRON_KEY):
+            counter.queries = 0
+
+    @app.after_request
+    def report_queries(response):
+        if not request.environ.get(SUBREQUEST_ENVIRON_KEY):
+            response.headers[QUERY_HEADER] = str(getattr(counter, 'queries', 0))
+        return response
+
+    with app.app_context():
+        event.listen(db.engine, 'before_cursor_execute', count_query)
+
+    logging.getLogger('werkzeug').setLevel(logging.ERROR)
+    server = make_server('127.0.0.1', 0, app, threaded=True, fd=options.fd)
+    print('ready', flush=True)
+    server.serve_forever()
+
+
+class Server:
+    """One or more threaded server processes accepting from a shared listening socket."""
+
+    def __init__(self, env, processes=1):
+        self.socket = socket.socket()
+        self.socket.bind(('127.0.0.1', 0))
+        self.socket.listen(128)
+        self.port = self.socket.getsockname()[1]
+        fd = self.socket.fileno()
+        self.processes = [
+            subprocess.Popen([sys.executable, os.path.abspath(__file__), 'serve', '--fd', str(fd)],
+                             cwd=HERE, env=env, pass_fds=(fd,), stdout=subprocess.PIPE, text=True)
+            for _ in range(processes)
+        ]
+        # Each worker prints one line once the app is imported, so startup isn't measured
+        for process in self.processes:
+            if process.stdout.readline().strip() != 'ready':
+                self.stop()
+                raise RuntimeError("Benchmark server failed to start")
+
+    def rss_bytes(self):
+        """Total resident set size of the server processes (Linux only; None elsewhere)."""
+        total = None
+        for process in self.processes:
+            try:
+                with open(f'/proc/{process.pid}/status') as f:
+                    for line in f:
+                        if line.startswith('VmRSS:'):
+                            total = (total or 0) + int(line.split()[1]) * 1024
+            except OSError:
+                continue
+        return total
+
+    def stop(self):
+        for process in self.processes:
+            process.terminate()
+        for process in self.processes:
+            process.wait()
+        self.socket.close()
+
+
+# Dataset
+
+def prepare_database(options, env):
+    if os.path.exists(options.database):
+        print(f"Reusing {options.database}")
+        return
+    print(f"Generating {options.drivers} drivers, {options.trucks} trucks, {options.assignments} assignments "
+          f"into {options.database}")
+    subprocess.run([sys.executable, '-m', 'flask', '--app', 'app', 'db', 'upgrade'], cwd=HERE, env=env, check=True,
+                   stdout=subprocess.DEVNULL)
+    subprocess.run([sys.executable, 'seed.py', '--drivers', str(options.drivers), '--trucks', str(options.trucks),
+                    '--assignments', str(options.assignments), '--seed', str(options.seed)],
+                   cwd=HERE, env=env, check=True)
+
+
+def dataset_info(path):
+    with sqlite3.connect(path) as conn:
+        info = {table: conn.execute(f'SELECT COUNT(*), COALESCE(MAX(id), 0) FROM {table}').fetchone()
+                for table in ('drivers', 'trucks', 'assignments')}
+    return {table: {"rows": rows, "max_id": max_id} for table, (rows, max_id) in info.items()}
+
+
+# Scenarios: name -> request(i, rng) returning (method, path, body). Writes run
+# create -> update -> delete so the dataset ends where it started.
+
+def build_scenarios(dataset, state, run_token):
+    def pick(table, rng):
+        return rng.randint(1, dataset[table]["max_id"])
+
+    def created(name, i):
+        ids = state[name]
+        return ids[i % len(ids)] if ids else 0
+
+    base = datetime(2200, 1, 1) + timedelta(days=random.Random(run_token).randint(0, 365 * 50))
+
+    def window(i, minutes=30):
+        start = base + timedelta(hours=i)  # One hour apart, so benchmark writes never conflict
+        return start.strftime(DATETIME_FORMAT), (start + timedelta(minutes=minutes)).strftime(DATETIME_FORMAT)
+
+    def new_assignment(i, rng):
+        # Seeded trucks and drivers may have open-ended assignments, so book the benchmark's own
+        start, end = window(i)
+        return ('POST', '/assignments', {"start_date": start, "end_date": end, "status": "Completed",
+                                         "driver_id": created('drivers', i), "truck_id": created('trucks', i)})
+
+    return [
+        ("POST /login", lambda i, rng: ('POST', '/login', {"username": USERNAME, "password": PASSWORD}), None),
+        ("GET /drivers", lambda i, rng: ('GET', '/drivers', None), None),
+        ("GET /trucks?status", lambda i, rng: ('GET', '/trucks?status=Available', None), None),
+        ("GET /assignments", lambda i, rng: ('GET', '/assignments', None), None),
+        ("GET /assignments?truck_id",
+         lambda i, rng: ('GET', f'/assignments?truck_id={pick("trucks", rng)}&sort=-start_date', None), None),
+        ("GET /drivers/search", lambda i, rng: ('GET', f'/drivers/search?q={rng.choice(SEARCH_PREFIXES)}', None), None),
+        ("GET /trucks/search",
+         lambda i, rng: ('GET', f'/trucks/search?q=ka{rng.choice("abcdefghijklmnopqrstuvwxyz")}', None), None),
+        ("GET /drivers?ids",
+         lambda i, rng: ('GET', f'/drivers?ids={",".join(str(pick("drivers", rng)) for _ in range(20))}', None), None),
+        ("POST /batch (10 GETs)", lambda i, rng: ('POST', '/batch', {"requests": [
+            {"method": "GET", "path": f'/trucks/{pick("trucks", rng)}'} for _ in range(10)
+        ]}), None),
+        ("GET /drivers/<id>", lambda i, rng: ('GET', f'/drivers/{pick("drivers", rng)}', None), None),
+        ("GET /trucks/<id>", lambda i, rng: ('GET', f'/trucks/{pick("trucks", rng)}', None), None),
+        ("GET /assignments/<id>", lambda i, rng: ('GET', f'/assignments/{pick("assignments", rng)}', None), None),
+        ("POST /drivers", lambda i, rng: ('POST', '/drivers', {
+            "name": f"Bench Driver {i}", "license_number": f"BENCH-{run_token}-{i}", "contact_info": "+254700000000",
+        }), 'drivers'),
+        ("PUT /drivers/<id>",
+         lambda i, rng: ('PUT', f'/drivers/{created("drivers", i)}', {"contact_info": f"+2547{i:08d}"}), None),
+        ("POST /trucks", lambda i, rng: ('POST', '/trucks', {
+            "plate_number": f"BENCH-{run_token}-{i}", "model": "Bench FH16",
+        }), 'trucks'),
+        ("PUT /trucks/<id>",
+         lambda i, rng: ('PUT', f'/trucks/{created("trucks", i)}', {"status": rng.choice(["Available", "Maintenance"])}),
+         None),
+        ("POST /assignments", new_assignment, 'assignments'),
+        ("PATCH /assignments/<id>",
+         lambda i, rng: ('PATCH', f'/assignments/{created("assignments", i)}', {"end_date": window(i, 45)[1]}), None),
+        ("DELETE /assignments/<id>", lambda i, rng: ('DELETE', f'/assignments/{created("assignments", i)}', None),
+         None),
+        ("DELETE /trucks/<id>", lambda i, rng: ('DELETE', f'/trucks/{created("trucks", i)}', None), None),
+        ("DELETE /drivers/<id>", lambda i, rng: ('DELETE', f'/drivers/{created("drivers", i)}', None), None),
+    ]
+
+
+# Load generation
+
+def percentile(sorted_values, pct):
+    if not sorted_values:
+        return None
+    index = min(len(sorted_values) - 1, max(0, round(pct / 100 * len(sorted_values)) - 1))
+    return sorted_values[index]
+
+
+def run_endpoint(server, cookie, name, request_for, total, concurrency, seed, collect=None):
+    """Sends `total` requests with `concurrency` keep-alive connections; returns the endpoint's stats."""
+    counter = itertools.count()
+    lock = threading.Lock()
+    latencies, queries, created = [], [], {}
+    errors = [0]
+    peak_rss = [server.rss_bytes()]
+    done = threading.Event()
+
+    def sample_rss():
+        while not done.wait(0.02):
+            rss = server.rss_bytes()
+            if rss is not None:
+                peak_rss[0] = max(peak_rss[0] or 0, rss)
+
+    def worker():
+        conn = http.client.HTTPConnection('127.0.0.1', server.port, timeout=60)
+        headers = {"Cookie": cookie, "Content-Type": "application/json"}
+        while True:
+            i = next(counter)
+            if i >= total:
+                break
+            method, path, body = request_for(i, random.Random(f"{seed}-{name}-{i}"))
+            payload = json.dumps(body) if body is not None else None
+
+            began = time.perf_counter()
+            conn.request(method, path, body=payload, headers=headers)
+            response = conn.getresponse()
+            data = response.read()
+            elapsed = time.perf_counter() - began
+
+            with lock:
+                latencies.append(elapsed)
+                queries.append(int(response.getheader(QUERY_HEADER, 0)))
+                if response.status >= 400:
+                    errors[0] += 1
+                    if errors[0] == 1:
+                        print(f"  {name}: {response.status} {data[:200].decode(errors='replace')}")
+                elif collect:
+                    created[i] = json.loads(data)["id"]
+        conn.close()
+
+    sampler = threading.Thread(target=sample_rss, daemon=True)
+    sampler.start()
+    began = time.perf_counter()
+    workers = [threading.Thread(target=worker) for _ in range(concurrency)]
+    for t in workers:
+        t.start()
+    for t in workers:
+        t.join()
+    wall = time.perf_counter() - began
+    done.set()
+    sampler.join()
+
+    latencies.sort()
+    stats = {
+        "requests": len(latencies),
+        "errors": errors[0],
+        "rps": round(len(latencies) / wall, 1) if wall else None,
+        "p50_ms": _ms(percentile(latencies, 50)),
+        "p95_ms": _ms(percentile(latencies, 95)),
+        "p99_ms": _ms(percentile(latencies, 99)),
+        "max_ms": _ms(latencies[-1] if latencies else None),
+        "queries_per_request": round(sum(queries) / len(queries), 2) if queries else None,
+        "peak_rss_mb": round(peak_rss[0] / 2 ** 20, 1) if peak_rss[0] else None,
+    }
+    return stats, [created[i] for i in sorted(created)]
+
+
+def _ms(seconds):
+    return round(seconds * 1000, 2) if seconds is not None else None
+
+
+def login(server):
+    conn = http.client.HTTPConnection('127.0.0.1', server.port, timeout=60)
+    conn.request('POST', '/login', body=json.dumps({"username": USERNAME, "password": PASSWORD}),
+                 headers={"Content-Type": "application/json"})
+    response = conn.getresponse()
+    response.read()
+    if response.status != 200:
+        raise RuntimeError(f"Login as {USERNAME} failed ({response.status}); was the database seeded by seed.py?")
+    return response.getheader('Set-Cookie').split(';', 1)[0]
+
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=HERE, capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run(options):
+    options.database = os.path.abspath(options.database or os.path.join(
+        tempfile.gettempdir(), f'fleet-bench-{options.drivers}-{options.trucks}-{options.assignments}-{options.seed}.db'
+    ))
+    env = dict(os.environ, DATABASE_URL=f'sqlite:///{options.database}')
+    env.setdefault('SECRET_KEY', 'benchmark')
+    # Set explicitly, so a RESPONSE_CACHE_SIZE in the shell can't turn GETs into cache hits unnoticed
+    env['RESPONSE_CACHE_SIZE'] = str(options.response_cache)
+    prepare_database(options, env)
+    dataset = dataset_info(options.database)
+
+    server = Server(env, options.server_processes)
+    try:
+        cookie = login(server)
+        state = {"drivers": [], "trucks": [], "assignments": []}
+        scenarios = build_scenarios(dataset, state, run_token=f"{time.time_ns():x}")
+        results = {}
+        print(f"{'endpoint':<28}{'rps':>9}{'p50':>9}{'p95':>9}{'p99':>9}{'queries':>9}{'rss MB':>9}{'errors':>8}")
+        for name, request_for, collect in scenarios:
+            if options.only and not any(fnmatch(name, pattern) for pattern in options.only):
+                continue
+            # Updates and deletes replay what the matching create produced
+            family = None if name.startswith('GET') else next((key for key in state if f'/{key}/<id>' in name), None)
+            needs = [family] if family else ['drivers', 'trucks'] if name == 'POST /assignments' else []
+            if any(not state[key] for key in needs):
+                print(f"{name:<28}skipped: needs {' and '.join('POST /' + key for key in needs)}")
+                continue
+            total = len(state[family]) if family and name.startswith('DELETE') else options.requests
+
+            stats, created = run_endpoint(server, cookie, name, request_for, total, options.concurrency,
+                                          options.seed, collect)
+            if collect:
+                state[collect] = created
+            results[name] = stats
+            print(f"{name:<28}{stats['rps']:>9}{stats['p50_ms']:>9}{stats['p95_ms']:>9}{stats['p99_ms']:>9}"
+                  f"{stats['queries_per_request']:>9}{stats['peak_rss_mb'] or '-':>9}{stats['errors']:>8}")
+    finally:
+        server.stop()
+
+    report = {
+        "meta": {
+            "commit": git_commit(),
+            "timestamp": datetime.now().strftime(DATETIME_FORMAT),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "database": options.database,
+            "dataset": dataset,
+            "concurrency": options.concurrency,
+            "server_processes": options.server_processes,
+            "response_cache_size": options.response_cache,
+            "sqlite_journal_mode": env.get('SQLITE_JOURNAL_MODE', 'WAL'),
+            "requests_per_endpoint": options.requests,
+        },
+        "endpoints": results,
+    }
+    with open(options.output, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f"\nSaved results to {options.output}")
+    return 1 if any(stats['errors'] for stats in results.values()) else 0
+
+
+def compare(options):
+    with open(options.baseline) as f:
+        baseline = json.load(f)
+    with open(options.candidate) as f:
+        candidate = json.load(f)
+    print(f"baseline {baseline['meta'].get('commit')} vs candidate {candidate['meta'].get('commit')}\n")
+    caches = [int(report['meta'].get('response_cache_size') or 0) for report in (baseline, candidate)]
+    if caches[0] != caches[1]:
+        print(f"note: response cache size differs ({caches[0]} vs {caches[1]}); GET numbers aren't comparable\n")
+    print(f"{'endpoint':<28}{'rps':>18}{'p95 ms':>18}{'p99 ms':>18}{'queries':>14}")
+
+    def change(old, new):
+        if old is None or new is None:
+            return f"{'-':>18}"
+        pct = f"{(new - old) / old * 100:+.0f}%" if old else ''
+        return f"{new:>11}{pct:>7}"
+
+    for name, new in candidate['endpoints'].items():
+        old = baseline['endpoints'].get(name)
+        if old is None:
+            continue
+        print(f"{name:<28}{change(old['rps'], new['rps'])}{change(old['p95_ms'], new['p95_ms'])}"
+              f"{change(old['p99_ms'], new['p99_ms'])}{old['queries_per_request']:>7} -> {new['queries_per_request']:<4}")
+    return 0
+
+
+def main():
+    options = parse_args()
+    if options.command == 'serve':
+        return serve(options)
+    return run(options) if options.command == 'run' else compare(options)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,144 @@
+#!/usr/bin/env python3
+"""
+Benchmark for POST /assignments/dispatch.
+
+Generates (or reuses) a SQLite dataset with seed.py, then plans and commits a
+batch of jobs over the following days: most take any truck, some ask for a
+truck model and a few for a specific driver. Reports the time of a dry run and
+of the committed dispatch, how many jobs were placed, and checks that the
+assignments table has no double bookings afterwards. It also dry-runs three
+chained windows (08-10, 09-11, 10:30-12) pinned to one free truck and driver,
+which must book the first and the third.
+
+    python benchmark_dispatch.py --trucks 10000 --drivers 20000 --jobs 1000
+    python benchmark_dispatch.py --database /tmp/fleet-dispatch.db --jobs 2000 --days 1
+"""
+import argparse
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import date, datetime, timedelta
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+USERNAME, PASSWORD = 'admin_john', 'securepass123'  # Seeded by seed.py
+DATETIME_FORMAT = '%Y-%m-%d %H:%M:%S'
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--drivers', type=int, default=20000)
+    parser.add_argument('--trucks', type=int, default=10000)
+    parser.add_argument('--assignments', type=int, default=200000)
+    parser.add_argument('--jobs', type=int, default=1000)
+    parser.add_argument('--days', type=int, default=2, help='Days the job windows are spread over')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--database', help='SQLite file to use; generated only if it does not exist yet')
+    return parser.parse_args()
+
+
+def prepare_database(options, env):
+    if os.path.exists(options.database):
+        print(f"Reusing {options.database}")
+        return
+    print(f"Generating {options.drivers} drivers, {options.trucks} trucks, {options.assignments} assignments "
+          f"into {options.database}")
+    subprocess.run([sys.executable, '-m', 'flask', '--app', 'app', 'db', 'upgrade'], cwd=HERE, env=env, check=True,
+                   stdout=subprocess.DEVNULL)
+    subprocess.run([sys.executable, 'seed.py', '--drivers', str(options.drivers), '--trucks', str(options.trucks),
+                    '--assignments', str(options.assignments), '--seed', str(options.seed)],
+                   cwd=HERE, env=env, check=True)
+
+
+def build_jobs(options, models, driver_count):
+    """Windows of 2-10 hours starting between 06:00 and 14:00 on the days after the seeded history."""
+    rng = random.Random(options.seed)
+    first_day = datetime.combine(date.today() + timedelta(days=1), datetime.min.time())
+    jobs = []
+    for _ in range(options.jobs):
+        start = first_day + timedelta(days=rng.randrange(options.days), minutes=rng.randrange(6 * 60, 14 * 60, 15))
+        job = {
+            "start_date": start.strftime(DATETIME_FORMAT),
+            "end_date": (start + timedelta(minutes=rng.randrange(2 * 60, 10 * 60, 15))).strftime(DATETIME_FORMAT),
+        }
+        draw = rng.random()
+        if draw < 0.2:
+            job["truck_model"] = rng.choice(models)
+        elif draw < 0.25:
+            job["driver_id"] = rng.randint(1, driver_count)
+        jobs.append(job)
+    return jobs
+
+
+def check_chained_windows(client):
+    """One truck and driver, windows 08-10, 09-11 and 10:30-12: the third doesn't overlap the first."""
+    day = datetime(2300, 1, 1)
+    window = f"start={day:%Y-%m-%d} 08:00:00&end={day:%Y-%m-%d} 12:00:00&limit=1"
+    truck_id = client.get(f'/availability/trucks?{window}').get_json()[0]['id']
+    driver_id = client.get(f'/availability/drivers?{window}').get_json()[0]['id']
+    jobs = [{"start_date": (day + timedelta(minutes=start)).strftime(DATETIME_FORMAT),
+             "end_date": (day + timedelta(minutes=end)).strftime(DATETIME_FORMAT),
+             "truck_id": truck_id, "driver_id": driver_id}
+            for start, end in ((8 * 60, 10 * 60), (9 * 60, 11 * 60), (10 * 60 + 30, 12 * 60))]
+    result = client.post('/assignments/dispatch', json={"jobs": jobs, "dry_run": True}).get_json()
+    statuses = [job['status'] for job in result['results']]
+    ok = statuses == ['planned', 'unassigned', 'planned']
+    print(f"  chained     {'ok' if ok else 'FAIL'}  truck {truck_id}, driver {driver_id}: {statuses}")
+    return ok
+
+
+def timed_dispatch(client, jobs, dry_run):
+    started = time.perf_counter()
+    response = client.post('/assignments/dispatch', json={"jobs": jobs, "dry_run": dry_run})
+    elapsed = time.perf_counter() - started
+    if response.status_code != 200:
+        sys.exit(f"Dispatch failed with {response.status_code}: {response.get_data(as_text=True)[:500]}")
+    return response.get_json(), elapsed
+
+
+def main():
+    options = parse_args()
+    if not options.database:
+        options.database = os.path.join(tempfile.gettempdir(),
+                                        f"fleet-dispatch-{options.drivers}-{options.trucks}-{options.assignments}.db")
+    env = dict(os.environ, DATABASE_URL=f'sqlite:///{os.path.abspath(options.database)}')
+    env.setdefault('SECRET_KEY', 'benchmark-dispatch')
+    prepare_database(options, env)
+
+    os.environ.update(DATABASE_URL=env['DATABASE_URL'], SECRET_KEY=env['SECRET_KEY'])
+    sys.path.insert(0, HERE)
+    from app import app
+    from database import db
+    from models import Driver, Truck
+    from scheduling import find_all_conflicts
+
+    with app.app_context():
+        models = [m for m, in db.session.query(Truck.model).filter(Truck.status == 'Available').distinct()]
+        driver_count = db.session.query(Driver).count()
+        available = db.session.query(Truck).filter(Truck.status == 'Available').count()
+    jobs = build_jobs(options, models, driver_count)
+
+    client = app.test_client()
+    login = client.post('/login', json={"username": USERNAME, "password": PASSWORD})
+    if login.status_code != 200:
+        sys.exit(f"Login failed: {login.get_json()}")
+
+    print(f"{len(jobs)} jobs over {options.days} day(s); {available} available trucks, {driver_count} drivers")
+    chained = check_chained_windows(client)
+    plan, plan_seconds = timed_dispatch(client, jobs, dry_run=True)
+    print(f"  dry run     {plan_seconds * 1000:8.0f} ms  planned {plan['planned']}, unassigned {plan['unassigned']}, "
+          f"errors {plan['errors']}")
+    result, commit_seconds = timed_dispatch(client, jobs, dry_run=False)
+    print(f"  committed   {commit_seconds * 1000:8.0f} ms  created {result['created']}, "
+          f"unassigned {result['unassigned']}, errors {result['errors']}")
+
+    with app.app_context():
+        conflicts = find_all_conflicts()
+    print(f"\n{len(conflicts)} double booking{'' if len(conflicts) == 1 else 's'} in the assignments table.")
+    return 1 if conflicts or not chained else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
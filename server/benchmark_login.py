@@ -0,0 +1,129 @@
+#!/usr/bin/env python3
+"""
+Benchmark for API latency during a login burst.
+
+Serves the app from a seed.py dataset (see benchmark.py), keeps a steady load
+of GET requests on other routes, and measures their latency twice: on its own,
+then while a pool of clients hammers POST /login. Run it with the default
+settings and again with --inline-hashing (the old behaviour, hashing on the
+request threads) to compare.
+
+    python benchmark_login.py --login-clients 32 --seconds 10
+    python benchmark_login.py --inline-hashing
+"""
+import argparse
+import http.client
+import json
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+
+from benchmark import PASSWORD, Server, login, percentile, prepare_database
+
+SEEDED_USERS = ['admin_john', 'admin_lisa', 'fleet_michael']  # All with seed.py's password
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--drivers', type=int, default=5000)
+    parser.add_argument('--trucks', type=int, default=2000)
+    parser.add_argument('--assignments', type=int, default=50000)
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--database', help='SQLite file to use; generated only if it does not exist yet')
+    parser.add_argument('--api-clients', type=int, default=4, help='Connections sending other API calls')
+    parser.add_argument('--login-clients', type=int, default=32, help='Connections sending logins during the burst')
+    parser.add_argument('--seconds', type=float, default=8, help='Length of each phase')
+    parser.add_argument('--inline-hashing', action='store_true', help='Hash on the request threads (no pool)')
+    return parser.parse_args()
+
+
+def api_client(port, cookie, trucks, stop, latencies, errors, seed):
+    rng = random.Random(seed)
+    conn = http.client.HTTPConnection('127.0.0.1', port, timeout=120)
+    while not stop.is_set():
+        path = rng.choice([f'/trucks/{rng.randint(1, trucks)}', '/trucks?limit=20', '/drivers?limit=20',
+                           f'/assignments?truck_id={rng.randint(1, trucks)}'])
+        began = time.perf_counter()
+        conn.request('GET', path, headers={"Cookie": cookie})
+        response = conn.getresponse()
+        response.read()
+        latencies.append(time.perf_counter() - began)
+        if response.status >= 400:
+            errors.append(response.status)
+    conn.close()
+
+
+def login_client(port, stop, outcomes, seed):
+    rng = random.Random(seed)
+    conn = http.client.HTTPConnection('127.0.0.1', port, timeout=120)
+    while not stop.is_set():
+        body = json.dumps({"username": rng.choice(SEEDED_USERS), "password": PASSWORD})
+        began = time.perf_counter()
+        conn.request('POST', '/login', body=body, headers={"Content-Type": "application/json"})
+        response = conn.getresponse()
+        response.read()
+        outcomes.append((response.status, time.perf_counter() - began))
+    conn.close()
+
+
+def run_phase(server, cookie, options, trucks, logins):
+    stop = threading.Event()
+    latencies, errors, outcomes = [], [], []
+    threads = [threading.Thread(target=api_client, args=(server.port, cookie, trucks, stop, latencies, errors, i))
+               for i in range(options.api_clients)]
+    if logins:
+        threads += [threading.Thread(target=login_client, args=(server.port, stop, outcomes, i))
+                    for i in range(options.login_clients)]
+    for thread in threads:
+        thread.start()
+    time.sleep(options.seconds)
+    stop.set()
+    for thread in threads:
+        thread.join()
+    return sorted(latencies), errors, outcomes
+
+
+def report(name, latencies, errors, seconds):
+    p = lambda pct: f"{percentile(latencies, pct) * 1000:8.1f}"
+    print(f"{name:<22}{len(latencies) / seconds:8.0f}{p(50)}{p(95)}{p(99)}{len(errors):>8}")
+
+
+def main():
+    options = parse_args()
+    options.database = os.path.abspath(options.database or os.path.join(
+        tempfile.gettempdir(), f'fleet-bench-{options.drivers}-{options.trucks}-{options.assignments}-{options.seed}.db'
+    ))
+    env = dict(os.environ, DATABASE_URL=f'sqlite:///{options.database}')
+    env.setdefault('SECRET_KEY', 'benchmark-login')
+    if options.inline_hashing:
+        env['PASSWORD_HASH_WORKERS'] = '0'
+    prepare_database(options, env)
+
+    server = Server(env)
+    try:
+        cookie = login(server)  # Also starts the hashing pool, so its startup isn't measured
+        print(f"Hashing: {'inline on request threads' if options.inline_hashing else 'process pool'}; "
+              f"{options.api_clients} API clients, {options.login_clients} login clients, "
+              f"{options.seconds:g}s per phase\n")
+        print(f"{'API calls':<22}{'req/s':>8}{'p50 ms':>8}{'p95 ms':>8}{'p99 ms':>8}{'errors':>8}")
+        quiet = run_phase(server, cookie, options, options.trucks, logins=False)
+        report('without logins', quiet[0], quiet[1], options.seconds)
+        burst = run_phase(server, cookie, options, options.trucks, logins=True)
+        report('during login burst', burst[0], burst[1], options.seconds)
+
+        outcomes = burst[2]
+        ok = sorted(seconds for status, seconds in outcomes if status == 200)
+        busy = sum(1 for status, _ in outcomes if status == 503)
+        print(f"\nLogins: {len(ok) / options.seconds:.1f}/s succeeded, {busy} answered 503, "
+              f"{len(outcomes) - len(ok) - busy} other errors; p50 {percentile(ok, 50) * 1000:.0f} ms, "
+              f"p95 {percentile(ok, 95) * 1000:.0f} ms" if ok else "\nNo login succeeded.")
+    finally:
+        server.stop()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,342 @@
+from collections import defaultdict
+from datetime import datetime
+
+from sqlalchemy import DateTime, Integer, String, bindparam, insert
+
+from database import db
+from models import Driver, Truck, Assignment
+from analytics import INTERVAL_FIELDS, add_contribution, apply_deltas, record_statuses
+from scheduling import AssignmentConflict, check_availability, find_batch_conflicts, lock_resources
+from changefeed import RESOURCES, queue_changes
+from search import index_rows
+
+MAX_BULK_ITEMS = 5000
+IN_CLAUSE_CHUNK = 500  # Stay well under SQLite's bound-parameter limit
+
+NATURAL_KEYS = {
+    Driver: 'license_number',
+    Truck: 'plate_number',
+}
+
+REQUIRED_FIELDS = {
+    Driver: ['name', 'license_number', 'contact_info'],
+    Truck: ['plate_number', 'model'],
+    Assignment: ['start_date', 'driver_id', 'truck_id'],
+}
+
+WRITABLE_FIELDS = {
+    Driver: ['name', 'license_number', 'contact_info', 'assigned_truck_id'],
+    Truck: ['plate_number', 'model', 'status', 'current_driver_id'],
+    Assignment: ['start_date', 'end_date', 'status', 'driver_id', 'truck_id'],
+}
+
+DEFAULTS = {
+    Driver: {'assigned_truck_id': None},
+    Truck: {'status': 'Available', 'current_driver_id': None},
+    Assignment: {'end_date': None, 'status': 'Active'},
+}
+
+
+class BulkRequestError(ValueError):
+    """Raised when a bulk payload is malformed as a whole (not per item)."""
+
+
+def _chunks(values, size=IN_CLAUSE_CHUNK):
+    values = list(values)
+    for i in range(0, len(values), size):
+        yield values[i:i + size]
+
+
+def fetch_ids_by(column, values):
+    """Set-based lookup: returns {value: id} for every row whose column is in values."""
+    model = column.class_
+    found = {}
+    for chunk in _chunks(values):
+        rows = db.session.query(column, model.id).filter(column.in_(chunk)).all()
+        found.update(rows)
+    return found
+
+
+def validate_payload(records):
+    if not isinstance(records, list):
+        raise BulkRequestError("Request body must be a JSON array of records.")
+    if len(records) > MAX_BULK_ITEMS:
+        raise BulkRequestError(f"Too many records; the limit is {MAX_BULK_ITEMS} per request.")
+
+
+def _field_error(model, values):
+    """
+    Message for the first value that its column can't store (wrong JSON type, too long,
+    or null in a NOT NULL column), or None. Run before writing, so one bad record fails
+    on its own instead of failing the whole statement.
+    """
+    for field, value in values.items():
+        column = model.__table__.c[field]
+        if value is None:
+            if not column.nullable:
+                return f"{field} must not be null."
+        elif isinstance(column.type, (String, DateTime)):
+            if not isinstance(value, str):
+                return f"{field} must be a string."
+            if isinstance(column.type, String) and column.type.length and len(value) > column.type.length:
+                return f"{field} must be at most {column.type.length} characters."
+        elif isinstance(column.type, Integer) and (not isinstance(value, int) or isinstance(value, bool)):
+            return f"{field} must be an integer."
+    return None
+
+
+def _parse_assignment_dates(values):
+    # An empty end_date is an open-ended assignment, as in POST /assignments
+    if values.get('end_date') == '':
+        values['end_date'] = None
+    for field in ('start_date', 'end_date'):
+        if values.get(field) is not None:
+            values[field] = datetime.strptime(values[field], '%Y-%m-%d %H:%M:%S')
+
+
+def _insert_returning_ids(model, rows):
+    """executemany-style INSERT; ids are returned in parameter order."""
+    if not rows:
+        return []
+    statement = insert(model).returning(model.id, sort_by_parameter_order=True)
+    return [row.id for row in db.session.execute(statement, rows)]
+
+
+def _update_by_id(model, rows):
+    """executemany-style UPDATE ... SET ..., version = version + 1 WHERE id = :id, one per set of columns."""
+    table = model.__table__
+    groups = defaultdict(list)
+    for row in rows:
+        groups[tuple(sorted(row))].append(row)
+    for names, group in groups.items():
+        values = {name: bindparam(f'b_{name}') for name in names if name != 'id'}
+        statement = table.update().where(table.c.id == bindparam('b_id')).values(version=table.c.version + 1, **values)
+        db.session.execute(statement, [{f'b_{name}': value for name, value in row.items()} for row in group])
+
+
+def bulk_write_by_natural_key(model, records, upsert=False):
+    """
+    Creates (or, with upsert, updates) drivers/trucks keyed by their natural key.
+    Uniqueness is checked with one set-based query and all writes happen in one
+    transaction. Returns one result dict per input record, in order.
+    """
+    validate_payload(records)
+    key = NATURAL_KEYS[model]
+    results = [None] * len(records)
+    pending = []  # (index, values)
+    seen = set()
+
+    for index, record in enumerate(records):
+        if not isinstance(record, dict):
+            results[index] = {"index": index, "status": "error", "error": "Record must be an object."}
+            continue
+        missing = [f for f in REQUIRED_FIELDS[model] if f not in record]
+        if missing:
+            results[index] = {"index": index, "status": "error", "error": f"Missing required field: {missing[0]}"}
+            continue
+        values = {f: record[f] for f in WRITABLE_FIELDS[model] if f in record}
+        error = _field_error(model, values)
+        if error:
+            results[index] = {"index": index, "status": "error", "error": error}
+            continue
+        if values[key] in seen:
+            results[index] = {"index": index, "status": "error", "error": f"Duplicate {key} in request."}
+            continue
+        seen.add(values[key])
+        pending.append((index, values))
+
+    existing = fetch_ids_by(getattr(model, key), [values[key] for _, values in pending])
+
+    inserts, insert_indexes, updates = [], [], []
+    for index, values in pending:
+        row_id = existing.get(values[key])
+        if row_id is None:
+            inserts.append({**DEFAULTS[model], **values})
+            insert_indexes.append(index)
+        elif upsert:
+            updates.append({"id": row_id, **values})
+            results[index] = {"index": index, "status": "updated", "id": row_id}
+        else:
+            results[index] = {"index": index, "status": "error", "error": f"{key} already exists.", "id": row_id}
+
+    try:
+        _update_by_id(model, updates)
+        new_ids = _insert_returning_ids(model, inserts)
+        for index, row_id in zip(insert_indexes, new_ids):
+            results[index] = {"index": index, "status": "created", "id": row_id}
+        # Core writes skip the mapper events that keep the search index and truck status history current
+        connection = db.session.connection()
+        index_rows(connection, model, [(row['id'], row) for row in updates], replace=True)
+        index_rows(connection, model, zip(new_ids, inserts))
+        if model is Truck:
+            record_statuses(connection, {**{row['id']: row['status'] for row in updates if 'status' in row},
+                                         **{row_id: row['status'] for row_id, row in zip(new_ids, inserts)}})
+        queue_bulk_changes(model, zip(new_ids, inserts), updates)
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+
+    return results
+
+
+def bulk_write_assignments(records):
+    """
+    Creates assignments, or updates them when a record carries an `id`.
+    Driver/truck references and update targets are validated with set-based
+    queries and everything is written in one transaction.
+    """
+    validate_payload(records)
+    results = [None] * len(records)
+    creates, updates = [], []  # (index, values)
+    seen = set()
+
+    for index, record in enumerate(records):
+        if not isinstance(record, dict):
+            results[index] = {"index": index, "status": "error", "error": "Record must be an object."}
+            continue
+        values = {f: record[f] for f in WRITABLE_FIELDS[Assignment] if f in record}
+        if 'id' not in record:
+            missing = [f for f in REQUIRED_FIELDS[Assignment] if f not in record]
+            if missing:
+                results[index] = {"index": index, "status": "error", "error": f"Missing required field: {missing[0]}"}
+                continue
+        error = _field_error(Assignment, {**values, "id": record['id']} if 'id' in record else values)
+        if error:
+            results[index] = {"index": index, "status": "error", "error": error}
+            continue
+        try:
+            _parse_assignment_dates(values)
+        except (TypeError, ValueError) as e:
+            results[index] = {"index": index, "status": "error", "error": str(e)}
+            continue
+        if 'id' in record:
+            if record['id'] in seen:
+                results[index] = {"index": index, "status": "error", "error": "Duplicate id in request."}
+                continue
+            seen.add(record['id'])
+            updates.append((index, {"id": record['id'], **values}))
+        else:
+            creates.append((index, {**DEFAULTS[Assignment], **values}))
+
+    rows = [values for _, values in creates + updates]
+    known_drivers = set(fetch_ids_by(Driver.id, {r['driver_id'] for r in rows if 'driver_id' in r}))
+    known_trucks = set(fetch_ids_by(Truck.id, {r['truck_id'] for r in rows if 'truck_id' in r}))
+    known_assignments = set(fetch_ids_by(Assignment.id, {r['id'] for _, r in updates}))
+
+    def check(values):
+        if 'id' in values and values['id'] not in known_assignments:
+            return "Assignment not found."
+        if 'driver_id' in values and values['driver_id'] not in known_drivers:
+            return "Driver not found."
+        if 'truck_id' in values and values['truck_id'] not in known_trucks:
+            return "Truck not found."
+        return None
+
+    valid_creates, valid_updates = [], []
+    for group, valid in ((creates, valid_creates), (updates, valid_updates)):
+        for index, values in group:
+            error = check(values)
+            if error:
+                results[index] = {"index": index, "status": "error", "error": error}
+            else:
+                valid.append((index, values))
+
+    current = fetch_current_intervals([values['id'] for _, values in valid_updates])
+    errors = find_double_bookings(valid_creates, valid_updates, current)
+    for index, error in errors.items():
+        results[index] = {"index": index, "status": "error", "error": error}
+    valid_creates = [(index, values) for index, values in valid_creates if index not in errors]
+    valid_updates = [(index, values) for index, values in valid_updates if index not in errors]
+
+    try:
+        _update_by_id(Assignment, [values for _, values in valid_updates])
+        for index, values in valid_updates:
+            results[index] = {"index": index, "status": "updated", "id": values['id']}
+        new_ids = _insert_returning_ids(Assignment, [values for _, values in valid_creates])
+        for (index, _), row_id in zip(valid_creates, new_ids):
+            results[index] = {"index": index, "status": "created", "id": row_id}
+        update_rollup(valid_creates, valid_updates, current)
+        queue_bulk_changes(Assignment, zip(new_ids, (values for _, values in valid_creates)),
+                           [values for _, values in valid_updates])
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+
+    return results
+
+
+def fetch_current_intervals(ids):
+    """{id: row} of the current driver/truck/period of the assignments about to be updated."""
+    current = {}
+    for chunk in _chunks(ids):
+        rows = db.session.query(
+            Assignment.id, Assignment.driver_id, Assignment.truck_id,
+            Assignment.start_date, Assignment.end_date
+        ).filter(Assignment.id.in_(chunk))
+        current.update((row.id, row) for row in rows)
+    return current
+
+
+def _final(values, base, field):
+    return values[field] if field in values else getattr(base, field)
+
+
+def find_double_bookings(creates, updates, current):
+    """
+    Checks the final interval of every proposed assignment against each other
+    (in-memory sweep) and against the table (indexed overlap query).
+    Rows being updated are excluded from the table check since the batch moves them.
+    Every truck and driver involved is locked first, so the result holds until the batch commits.
+    Returns {index: error message}.
+    """
+    fields = ('driver_id', 'truck_id', 'start_date', 'end_date')
+    proposals = {}
+    for index, values in creates + updates:
+        base = current.get(values.get('id'))
+        proposals[index] = tuple(_final(values, base, f) for f in fields)
+
+    moved = set(current)
+    lock_resources([p[0] for p in proposals.values()], [p[1] for p in proposals.values()])
+    errors = find_batch_conflicts(proposals)
+    for index, (driver_id, truck_id, start, end) in proposals.items():
+        if index in errors:
+            continue
+        try:
+            check_availability(driver_id, truck_id, start, end, exclude_ids=moved, lock=False)
+        except (AssignmentConflict, ValueError) as e:
+            errors[index] = str(e)
+    return errors
+
+
+def update_rollup(creates, updates, current):
+    """Core bulk writes skip ORM events, so apply their utilization deltas explicitly."""
+    deltas = defaultdict(int)
+    for _, values in creates:
+        add_contribution(deltas, *(values.get(f) for f in INTERVAL_FIELDS))
+    for _, values in updates:
+        base = current[values['id']]
+        add_contribution(deltas, *(getattr(base, f) for f in INTERVAL_FIELDS), sign=-1)
+        add_contribution(deltas, *(_final(values, base, f) for f in INTERVAL_FIELDS))
+    apply_deltas(db.session.connection(), deltas)
+
+
+def queue_bulk_changes(model, created, updated):
+    """Core bulk writes skip mapper events too, so queue their change-feed events explicitly."""
+    resource = RESOURCES[model]
+    queue_changes(db.session, resource, 'created', [(row_id, {"id": row_id, **values}) for row_id, values in created])
+    queue_changes(db.session, resource, 'updated',
+                  [(values['id'], {k: v for k, v in values.items() if k != 'id'}) for values in updated])
+
+
+def summarize(results):
+    counts = {"created": 0, "updated": 0, "error": 0}
+    for result in results:
+        counts[result["status"]] += 1
+    return {
+        "created": counts["created"],
+        "updated": counts["updated"],
+        "errors": counts["error"],
+        "results": results,
+    }
@@ -0,0 +1,221 @@
+import json
+import threading
+import time
+import uuid
+from collections import deque
+from datetime import datetime
+
+from flask import Response
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import Session, object_session
+
+from models import Driver, Truck, Assignment
+from pagination import DATETIME_FORMAT, QueryParamError
+
+RESOURCES = {Driver: 'drivers', Truck: 'trucks', Assignment: 'assignments'}
+# Which resources' changes each role may subscribe to, mirroring the read routes it can call
+READABLE_RESOURCES = {
+    'Admin': ('drivers', 'trucks', 'assignments'),
+    'Fleet Manager': ('assignments',),
+}
+HEARTBEAT_SECONDS = 15
+RETRY_MS = 3000
+
+
+class ChangeFeed:
+    """
+    In-process ring buffer of change events with monotonically increasing sequence
+    numbers. Event ids carry a per-process token, so an id from another process
+    (or from before a restart) is recognised instead of being misread as a position.
+    """
+
+    def __init__(self, size=10000):
+        self.size = size
+        self.token = uuid.uuid4().hex[:8]
+        self._events = deque(maxlen=size)
+        self._seq = 0
+        self._changed = threading.Condition()
+
+    def configure(self, size):
+        with self._changed:
+            self.size = size
+            self._events = deque(self._events, maxlen=size)
+
+    def publish(self, changes):
+        """Appends (resource, action, id, data) changes and wakes every subscriber."""
+        if not changes:
+            return
+        with self._changed:
+            for resource, action, row_id, data in changes:
+                self._seq += 1
+                self._events.append({
+                    "seq": self._seq,
+                    "resource": resource,
+                    "action": action,
+                    "id": row_id,
+                    "data": data,
+                })
+            self._changed.notify_all()
+
+    def event_id(self, seq):
+        return f"{self.token}-{seq}"
+
+    def parse_event_id(self, value):
+        """Sequence number from a Last-Event-ID; None if it came from another process or is malformed."""
+        token, _, seq = (value or '').rpartition('-')
+        if token != self.token or not seq.isdigit():
+            return None
+        return int(seq)
+
+    def since(self, seq):
+        """(events after seq, complete). complete is False when older events were already evicted."""
+        with self._changed:
+            events = [e for e in self._events if e["seq"] > seq] if seq < self._seq else []
+            oldest = self._events[0]["seq"] if self._events else self._seq + 1
+            return events, seq >= oldest - 1
+
+    def wait(self, seq, timeout):
+        with self._changed:
+            if self._seq <= seq:
+                self._changed.wait(timeout)
+
+    @property
+    def last_seq(self):
+        with self._changed:
+            return self._seq
+
+
+change_feed = ChangeFeed()
+
+
+def init_change_feed(app):
+    change_feed.configure(app.config.get('CHANGE_FEED_SIZE', 10000))
+
+
+# Capture: ORM writes queue their changes on the session and publish after commit,
+# so rolled-back writes never reach subscribers. Core bulk writes call queue_changes().
+
+def _value(value):
+    return value.strftime(DATETIME_FORMAT) if isinstance(value, datetime) else value
+
+
+def _loaded_columns(obj, only_changed):
+    state = inspect(obj)
+    data = {}
+    for attr in state.mapper.column_attrs:
+        if attr.key not in state.dict:
+            continue  # Unloaded, e.g. a server default not fetched yet
+        if only_changed and not state.attrs[attr.key].history.has_changes():
+            continue
+        data[attr.key] = _value(state.dict[attr.key])
+    return data
+
+
+def queue_changes(session, resource, action, rows):
+    """Queues (id, data) rows for publishing once `session` commits."""
+    queued = session.info.setdefault('change_events', [])
+    for row_id, data in rows:
+        queued.append((resource, action, row_id, {k: _value(v) for k, v in data.items()} if data else None))
+
+
+def _queue(obj, action, data):
+    sess = object_session(obj)
+    if sess is not None:
+        queue_changes(sess, RESOURCES[type(obj)], action, [(obj.id, data)])
+
+
+for _model in RESOURCES:
+    @event.listens_for(_model, 'after_insert')
+    def _inserted(mapper, connection, obj):
+        _queue(obj, 'created', _loaded_columns(obj, only_changed=False))
+
+    @event.listens_for(_model, 'after_update')
+    def _updated(mapper, connection, obj):
+        data = _loaded_columns(obj, only_changed=True)
+        if data:
+            _queue(obj, 'updated', data)
+
+    @event.listens_for(_model, 'after_delete')
+    def _deleted(mapper, connection, obj):
+        _queue(obj, 'deleted', None)
+
+@event.listens_for(Session, 'after_commit')
+def _publish_after_commit(sess):
+    change_feed.publish(sess.info.pop('change_events', None))
+
+@event.listens_for(Session, 'after_rollback')
+def _discard_after_rollback(sess):
+    sess.info.pop('change_events', None)
+
+
+# Delivery
+
+def parse_resources(args, role):
+    """`?resources=trucks,assignments`, limited to what the caller's role may read."""
+    allowed = READABLE_RESOURCES.get(role, ())
+    requested = [r.strip() for r in args.get('resources', '').split(',') if r.strip()]
+    unknown = [r for r in requested if r not in RESOURCES.values()]
+    if unknown:
+        raise QueryParamError(f"Unknown resource '{unknown[0]}'. Allowed: {', '.join(RESOURCES.values())}.")
+    return {r for r in (requested or allowed) if r in allowed}
+
+
+def _start_position(last_event_id):
+    """Sequence to resume after, or None when the client has to refetch (unknown id or evicted events)."""
+    if last_event_id is None:
+        return change_feed.last_seq  # New subscribers start from now
+    seq = change_feed.parse_event_id(last_event_id)
+    if seq is None:
+        return None
+    return seq if change_feed.since(seq)[1] else None
+
+
+def _sse(event_id, name, payload):
+    return f"id: {event_id}\nevent: {name}\ndata: {json.dumps(payload, separators=(',', ':'))}\n\n"
+
+
+def stream_response(resources, last_event_id, max_seconds):
+    """
+    text/event-stream of changes to `resources`. Reconnecting clients send Last-Event-ID and
+    resume from the buffer; if it can't be served from there they get one `reset` event and
+    should refetch. The stream ends after max_seconds and EventSource reconnects on its own.
+    """
+    def generate():
+        yield f"retry: {RETRY_MS}\n\n"
+        seq = _start_position(last_event_id)
+        if seq is None:
+            seq = change_feed.last_seq
+            yield _sse(change_feed.event_id(seq), 'reset', {"seq": seq})
+
+        deadline = time.monotonic() + max_seconds
+        while time.monotonic() < deadline:
+            events, complete = change_feed.since(seq)
+            if not complete:  # This subscriber fell behind the ring buffer
+                seq = change_feed.last_seq
+                yield _sse(change_feed.event_id(seq), 'reset', {"seq": seq})
+                continue
+            for e in events:
+                seq = e["seq"]
+                if e["resource"] in resources:
+                    yield _sse(change_feed.event_id(seq), e["resource"], e)
+            if not events:
+                yield ": keep-alive\n\n"
+            change_feed.wait(seq, min(HEARTBEAT_SECONDS, max(0.0, deadline - time.monotonic())))
+
+    return Response(generate(), mimetype='text/event-stream', headers={
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no',  # Don't let a reverse proxy buffer the stream
+    })
+
+
+def changes_since(resources, last_event_id):
+    """Polling form of the feed: buffered events after last_event_id as one JSON document."""
+    seq = _start_position(last_event_id)
+    if seq is None:
+        return {"reset": True, "last_event_id": change_feed.event_id(change_feed.last_seq), "events": []}
+    events, complete = change_feed.since(seq)
+    return {
+        "reset": not complete,
+        "last_event_id": change_feed.event_id(events[-1]["seq"] if events else seq),
+        "events": [dict(e, event_id=change_feed.event_id(e["seq"])) for e in events if e["resource"] in resources],
+    }
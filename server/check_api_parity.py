@@ -0,0 +1,331 @@
+#!/usr/bin/env python3
+"""
+API parity check between the Flask app (app.py) and the ASGI app (asgi.py).
+
+Creates two empty SQLite databases, replays the same scripted session of API
+calls against each app through its test client, and compares status codes,
+bodies and pagination headers step by step. The ASGI app runs in its own
+process, since it loads the Flask app for the routes it hands over to it.
+Every route the Flask app registers must be called by at least one step.
+Exits non-zero on any difference or uncovered route.
+
+    python check_api_parity.py
+"""
+import asyncio
+import json
+import os
+import re
+import subprocess
+import sys
+import tempfile
+from datetime import datetime, timedelta
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+HEADERS = ('X-Next-Cursor',)
+# Single-row GETs carry the row version as their ETag
+DETAIL_PATH = re.compile(r'^/(drivers|trucks|assignments)/\d+(\?|$)')
+# Bodies made of per-process counters or timing: only status and headers are compared
+UNCOMPARED_BODY_PATH = re.compile(r'^/(metrics|auth/principal-cache|changes/stream)(\?|$)')
+# Change-feed event ids start with a per-process token
+EVENT_ID_KEYS = ('event_id', 'last_event_id')
+# Routes that don't belong to the API
+UNCHECKED_ENDPOINTS = ('static',)
+WINDOW = 'start=2030-03-01 09:00:00&end=2030-03-01 10:00:00'
+
+ADMIN = {"username": "parity_admin", "email": "admin@parity.test", "password": "pw-admin", "role": "Admin"}
+MANAGER = {"username": "parity_manager", "email": "manager@parity.test", "password": "pw-manager",
+           "role": "Fleet Manager"}
+
+# (method, path, json[, headers]). '{cursor}' is replaced by the previous step's X-Next-Cursor,
+# an '{etag}' header by the previous step's ETag.
+STEPS = [
+    ('POST', '/register', ADMIN),
+    ('POST', '/register', MANAGER),
+    ('POST', '/register', ADMIN),
+    ('POST', '/register', {"username": "x"}),
+    ('GET', '/drivers', None),
+    ('POST', '/login', {"username": ADMIN["username"], "password": "wrong"}),
+    ('POST', '/login', {"username": ADMIN["username"], "password": ADMIN["password"]}),
+    *[('POST', '/drivers', {"name": f"Driver {i}", "license_number": f"PAR{i:04d}", "contact_info": f"+2547000{i:05d}"})
+      for i in range(5)],
+    ('POST', '/drivers', {"name": "Dup", "license_number": "PAR0000", "contact_info": "x"}),
+    ('POST', '/drivers', {"name": "Missing"}),
+    *[('POST', '/trucks', {"plate_number": f"KPA {i:03d}A", "model": "FH16", "status": "Available"})
+      for i in range(4)],
+    ('POST', '/trucks', {"plate_number": "KPA 000A", "model": "XF"}),
+    ('POST', '/trucks', {"model": "XF"}),
+    ('GET', '/drivers?limit=2', None),
+    ('GET', '/drivers?limit=2&after={cursor}', None),
+    ('GET', '/drivers?sort=-name&fields=id,name', None),
+    ('GET', '/drivers?sort=nope', None),
+    ('GET', '/drivers?after=garbage', None),
+    ('GET', '/trucks?status=Available&limit=3', None),
+    ('GET', '/drivers/search?q=driver 3', None),
+    ('GET', '/drivers/search?q=par&limit=2', None),
+    ('GET', '/drivers/search?q=par&limit=2&after={cursor}', None),
+    ('GET', '/trucks/search?q=kpa00&fields=id,plate_number', None),
+    ('GET', '/trucks/search?q=', None),
+    ('GET', '/drivers?ids=3,1,999,3&fields=id,name', None),
+    ('GET', '/trucks?ids=1,2,3&status=Available&include=driver', None),
+    ('GET', '/drivers?ids=1,x', None),
+    ('GET', '/drivers/1', None),
+    ('GET', '/drivers/1?fields=name&include=truck', None),
+    ('GET', '/drivers/999', None),
+    ('PUT', '/drivers/1', {"contact_info": "+254711111111", "assigned_truck_id": 1}),
+    ('PUT', '/drivers/2', {"name": "Otieno Kamau"}),
+    ('GET', '/drivers/search?q=oti kam', None),
+    ('PUT', '/drivers/2', {"contact_info": "+254722222222"}, {"If-Match": '"1"'}),
+    ('PUT', '/drivers/2', {"contact_info": "+254722222222"}, {"If-Match": '"2"'}),
+    ('GET', '/drivers/2', None),
+    ('GET', '/drivers/2', None, {"If-None-Match": '{etag}'}),
+    ('PUT', '/drivers/2', {"name": "Otieno K."}, {"If-Match": '{etag}'}),
+    ('GET', '/drivers/2?include=truck', None),
+    ('PUT', '/drivers/2', {"name": "Otieno Kamau"}, {"If-Match": '{etag}'}),
+    ('PUT', '/drivers/999', {"name": "Nobody"}),
+    ('PUT', '/trucks/2', {"status": "Maintenance"}),
+    ('POST', '/assignments', {"start_date": "2030-01-01 08:00:00", "end_date": "2030-01-01 18:00:00",
+                              "driver_id": 1, "truck_id": 1}),
+    ('POST', '/assignments', {"start_date": "2030-01-01 12:00:00", "end_date": "2030-01-02 12:00:00",
+                              "driver_id": 2, "truck_id": 1}),
+    ('POST', '/assignments', {"start_date": "2030-01-01 12:00:00", "driver_id": 1, "truck_id": 3}),
+    ('POST', '/assignments', {"start_date": "2030-01-03 08:00:00", "end_date": "2030-01-02 08:00:00",
+                              "driver_id": 2, "truck_id": 2}),
+    ('POST', '/assignments', {"start_date": "2030-01-03 08:00:00", "driver_id": 2, "truck_id": 2}),
+    ('PATCH', '/assignments/1', {"end_date": "2030-01-01 20:00:00", "status": "Completed"}),
+    ('PATCH', '/assignments/1', {"truck_id": 2, "start_date": "2030-01-04 00:00:00", "end_date": "2030-01-05 00:00:00"}),
+    ('PATCH', '/assignments/1', {"status": "Active"}, {"If-Match": '"1"'}),
+    ('PATCH', '/assignments/999', {"status": "Completed"}),
+    ('GET', '/drivers/search?q=dup', None),
+    ('GET', '/assignments?truck_id=1&include=driver,truck', None),
+    ('GET', '/assignments?sort=-start_date&include=truck.driver', None),
+    ('GET', '/assignments?ids=2,1&include=driver,truck', None),
+    ('GET', '/assignments/2', None),
+    ('GET', '/assignments/999', None),
+    ('POST', '/trucks', {"plate_number": "KBX 900Z", "model": "Actros"}, {"Idempotency-Key": "parity-truck"}),
+    ('POST', '/trucks', {"plate_number": "KBX 900Z", "model": "Actros"}, {"Idempotency-Key": "parity-truck"}),
+    ('POST', '/trucks', {"plate_number": "KBX 901Z", "model": "Actros"}, {"Idempotency-Key": "parity-truck"}),
+    ('POST', '/assignments', {"start_date": "2030-02-01 08:00:00", "end_date": "2030-02-01 18:00:00",
+                              "driver_id": 3, "truck_id": 5}, {"Idempotency-Key": "parity-assignment"}),
+    ('POST', '/assignments', {"start_date": "2030-02-01 08:00:00", "end_date": "2030-02-01 18:00:00",
+                              "driver_id": 3, "truck_id": 5}, {"Idempotency-Key": "parity-assignment"}),
+    ('GET', '/trucks/1', None),
+    ('POST', '/drivers/bulk', [{"name": "Bulk", "license_number": "PARB001", "contact_info": "x"},
+                               {"name": "Dup", "license_number": "PARB001", "contact_info": "x"}, {"name": None}]),
+    ('POST', '/drivers/bulk?upsert=true', [{"name": "Bulk One", "license_number": "PARB001", "contact_info": "y"}]),
+    ('POST', '/drivers/bulk', {"name": "Not a list"}),
+    ('POST', '/trucks/bulk', [{"plate_number": "KBL 001B", "model": "XF"}, {"model": "XF"}]),
+    ('POST', '/assignments/bulk', [
+        {"start_date": "2030-03-01 08:00:00", "end_date": "2030-03-01 18:00:00", "driver_id": 4, "truck_id": 3},
+        {"start_date": "2030-03-01 12:00:00", "end_date": "", "driver_id": 4, "truck_id": 1},
+        {"start_date": "", "driver_id": 4, "truck_id": 3},
+        {"id": 1, "status": "Completed"}, {"id": 1, "status": "Active"},
+    ]),
+    ('GET', '/assignments/export', None),
+    ('GET', '/assignments/export?format=csv&truck_id=3', None),
+    ('GET', '/assignments/export?format=xml', None),
+    ('GET', '/assignments/conflicts', None),
+    ('GET', f'/availability/trucks?{WINDOW}', None),
+    ('GET', f'/availability/drivers?{WINDOW}&fields=id,name', None),
+    ('GET', '/availability/trucks', None),
+    ('GET', '/analytics/utilization?start=2030-01-01&end=2030-12-31', None),
+    ('GET', '/analytics/utilization?start=2030-01-01&end=2030-12-31&group_by=driver&bucket=week', None),
+    ('GET', '/analytics/utilization?start=2030-12-31&end=2030-01-01', None),
+    ('POST', '/assignments/dispatch', {"dry_run": True, "jobs": [
+        {"start_date": "2030-04-01 08:00:00", "end_date": "2030-04-01 12:00:00"},
+        {"start_date": "2030-04-01 09:00:00", "end_date": "2030-04-01 11:00:00", "truck_model": "FH16"},
+        {"start_date": "not a date"},
+    ]}),
+    ('POST', '/assignments/dispatch', {"jobs": [{"start_date": "2030-04-02 08:00:00", "end_date": "2030-04-02 12:00:00",
+                                                 "truck_model": "FH16"}]}),
+    ('POST', '/assignments/dispatch', {"jobs": "none"}),
+    ('POST', '/batch', {"requests": [
+        {"method": "GET", "path": "/drivers/2"},
+        {"method": "POST", "path": "/trucks", "body": {"plate_number": "KBT 001C", "model": "R500"}},
+    ]}),
+    ('POST', '/batch', {"atomic": True, "requests": [
+        {"method": "POST", "path": "/drivers", "body": {"name": "Batch", "license_number": "PARB002", "contact_info": "x"}},
+        {"method": "POST", "path": "/trucks", "body": {"plate_number": "KBT 001C", "model": "R500"}},
+    ]}),
+    ('POST', '/batch', {"requests": [{"method": "POST", "path": "/batch"}]}),
+    ('GET', '/drivers?ids=1,2,3,4,5,6,7,8', None),
+    ('POST', '/assignments/assign', {"driver_id": 5, "truck_id": 4}),
+    ('POST', '/assignments/assign', {"driver_id": 5, "truck_id": 3}),
+    ('POST', '/assignments/assign', {"driver_id": 999, "truck_id": 3}),
+    ('POST', '/assignments/release', {"driver_id": 5}),
+    ('POST', '/assignments/release', {}),
+    ('GET', '/changes?resources=drivers', None),
+    ('GET', '/changes?after=0-1', None),
+    ('GET', '/changes?resources=nope', None),
+    ('GET', '/changes/stream?resources=trucks', None),
+    ('GET', '/auth/principal-cache', None),
+    ('GET', '/metrics', None),
+    ('POST', '/logout', None),
+    ('POST', '/login', {"username": MANAGER["username"], "password": MANAGER["password"]}),
+    ('GET', '/drivers', None),
+    ('GET', '/assignments?status=Active', None),
+    ('DELETE', '/assignments/2', None),
+    ('DELETE', '/assignments/2', None),
+    ('POST', '/logout', None),
+    ('POST', '/login', {"username": ADMIN["username"], "password": ADMIN["password"]}),
+    ('DELETE', '/trucks/4', None, {"If-Match": '"9"'}),
+    ('DELETE', '/trucks/4', None),
+    ('DELETE', '/drivers/1', None),
+    ('DELETE', '/drivers/1', None),
+    ('GET', '/drivers/search?q=driver', None),
+    ('GET', '/assignments', None),
+    ('GET', '/drivers', None),
+    ('POST', '/logout', None),
+    ('POST', '/logout', None),
+]
+
+
+def _is_wall_clock(value):
+    """A timestamp from the last day: the time a row was written (created_at, an assign's start, ...)."""
+    try:
+        moment = datetime.strptime(value, '%Y-%m-%d %H:%M:%S')
+    except (TypeError, ValueError):
+        return False
+    return abs(datetime.now() - moment) < timedelta(days=1)
+
+
+def normalize(value):
+    """Blanks out wall-clock timestamps and event-id tokens, which legitimately differ between the two runs."""
+    if isinstance(value, dict):
+        return {k: re.sub(r'^[0-9a-f]+-', '<token>-', v) if k in EVENT_ID_KEYS and v else normalize(v)
+                for k, v in value.items()}
+    if isinstance(value, list):
+        return [normalize(v) for v in value]
+    if isinstance(value, str):
+        if _is_wall_clock(value):
+            return '<timestamp>'
+        return re.sub(r'\d{4}-\d{2}-\d{2} \d{2}:\d{2}:\d{2}',
+                      lambda m: '<timestamp>' if _is_wall_clock(m.group(0)) else m.group(0), value)
+    return value
+
+
+def compared_body(path, status, is_json, payload, text):
+    if UNCOMPARED_BODY_PATH.match(path) and status == 200:
+        return None
+    return normalize(payload if is_json else text)
+
+
+def compared_headers(method, path, headers):
+    """
+    Pagination headers, plus the row-version ETag of writes and single-row GETs and
+    the replay marker of writes (a list GET's ETag is a cache validator).
+    """
+    if method != 'GET':
+        names = HEADERS + ('ETag', 'Idempotent-Replayed')
+    else:
+        names = HEADERS + ('ETag',) if DETAIL_PATH.match(path) else HEADERS
+    compared = {h: headers.get(h) for h in names}
+    if compared.get('ETag'):
+        # The body hash of an include=... ETag covers created_at, which differs between the runs
+        compared['ETag'] = re.sub(r'-[0-9a-f]+"$', '-<hash>"', compared['ETag'])
+    return compared
+
+
+def step_headers(headers, etag):
+    return {k: etag if v == '{etag}' else v for k, v in headers[0].items()} if headers else None
+
+
+def run_flask(app):
+    client = app.test_client()
+    results, cursor, etag = [], '', ''
+    for method, path, body, *headers in STEPS:
+        response = client.open(path.replace('{cursor}', cursor), method=method, json=body,
+                               headers=step_headers(headers, etag))
+        cursor = response.headers.get('X-Next-Cursor', cursor)
+        etag = response.headers.get('ETag', etag)
+        payload = response.get_json(silent=True)
+        results.append((response.status_code,
+                        compared_body(path, response.status_code, payload is not None, payload, response.get_data(as_text=True)),
+                        compared_headers(method, path, response.headers)))
+    return results
+
+
+async def run_asgi(app):
+    client = app.test_client()
+    results, cursor, etag = [], '', ''
+    async with app.test_app():
+        for method, path, body, *headers in STEPS:
+            response = await client.open(path.replace('{cursor}', cursor), method=method, json=body,
+                                         headers=step_headers(headers, etag))
+            cursor = response.headers.get('X-Next-Cursor', cursor)
+            etag = response.headers.get('ETag', etag)
+            text = await response.get_data(as_text=True)
+            try:
+                payload, is_json = json.loads(text), True
+            except ValueError:
+                payload, is_json = None, False
+            results.append((response.status_code, compared_body(path, response.status_code, is_json, payload, text),
+                            compared_headers(method, path, response.headers)))
+    return results
+
+
+def uncovered_routes(app):
+    """(method, rule) of every Flask route no step calls."""
+    adapter = app.url_map.bind('localhost')
+    called = set()
+    for method, path, *_ in STEPS:
+        rule, _ = adapter.match(path.split('?')[0], method=method, return_rule=True)
+        called.add((method, rule.rule))
+    return [(method, rule.rule) for rule in app.url_map.iter_rules() if rule.endpoint not in UNCHECKED_ENDPOINTS
+            for method in sorted(rule.methods - {'HEAD', 'OPTIONS'}) if (method, rule.rule) not in called]
+
+
+def main():
+    if sys.argv[1:] == ['--asgi']:
+        # Child process: the ASGI app, on the database named by DATABASE_URL
+        sys.path.insert(0, HERE)
+        from asgi import app as asgi_app
+        print(json.dumps(asyncio.run(run_asgi(asgi_app))))
+        return 0
+
+    directory = tempfile.mkdtemp(prefix='api-parity-')
+    os.environ.setdefault('SECRET_KEY', 'api-parity-check')
+    os.environ['CHANGE_FEED_MAX_STREAM_SECONDS'] = '1'
+    sys.path.insert(0, HERE)
+
+    from sqlalchemy import create_engine
+    from database import db
+    import models  # noqa: F401 (registers the tables)
+
+    urls = {}
+    for mode in ('flask', 'asgi'):
+        urls[mode] = f"sqlite:///{os.path.join(directory, mode + '.db')}"
+        engine = create_engine(urls[mode])
+        db.metadata.create_all(engine)
+        engine.dispose()
+
+    os.environ['DATABASE_URL'] = urls['flask']
+    from app import app as flask_app
+
+    expected = json.loads(json.dumps(run_flask(flask_app)))
+    child = subprocess.run([sys.executable, os.path.abspath(__file__), '--asgi'], cwd=HERE, capture_output=True,
+                           text=True, env=dict(os.environ, DATABASE_URL=urls['asgi']))
+    if child.returncode != 0:
+        print(child.stderr)
+        print("The ASGI run failed.")
+        return 1
+    actual = json.loads(child.stdout.strip().splitlines()[-1])
+
+    failures = 0
+    for (method, path, *_), flask_result, asgi_result in zip(STEPS, expected, actual):
+        same = flask_result == asgi_result
+        failures += not same
+        print(f"[{'ok' if same else 'FAIL'}] {flask_result[0]} {method} {path}")
+        if not same:
+            print(f"       flask: {flask_result}")
+            print(f"       asgi:  {asgi_result}")
+
+    uncovered = uncovered_routes(flask_app)
+    for method, rule in uncovered:
+        print(f"[FAIL] no step calls {method} {rule}")
+
+    print(f"\n{failures} of {len(STEPS)} steps differ, {len(uncovered)} route{'' if len(uncovered) == 1 else 's'} uncovered.")
+    return 1 if failures or uncovered else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,97 @@
+#!/usr/bin/env python3
+"""
+Atomicity check for POST /batch with "atomic": true.
+
+Runs atomic batches that create a driver, then call an endpoint whose handler
+closes or rolls back the session on its own (login and register release their
+connection while hashing, the export rolls back between chunks), then create a
+truck. Every batch that reports committed must have kept both records, and a
+batch that fails at its last step must have kept neither. Exits non-zero
+otherwise.
+
+    python check_batch_atomicity.py
+"""
+import os
+import sys
+import tempfile
+from datetime import datetime, timedelta
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+USERNAME, PASSWORD = 'batch_admin', 'batch-password'
+
+# Sub-requests run between the two writes: (name, method, path, body for batch n)
+MIDDLE_STEPS = [
+    ('login', 'POST', '/login', lambda n: {"username": USERNAME, "password": PASSWORD}),
+    ('register', 'POST', '/register',
+     lambda n: {"username": f"batch_user{n}", "email": f"user{n}@batch.test", "password": "pw"}),
+    ('export', 'GET', '/assignments/export?chunk_size=1', lambda n: None),
+]
+
+
+def prepare(app, db):
+    from flask_migrate import upgrade
+    from models import User, Driver, Truck, Assignment
+
+    with app.app_context():
+        upgrade(directory=os.path.join(HERE, 'migrations'))
+        user = User(username=USERNAME, email='admin@batch.test', role='Admin')
+        user.set_password(PASSWORD)
+        db.session.add(user)
+        driver = Driver(name="Batch Driver", license_number="BATCH0000", contact_info="x")
+        truck = Truck(plate_number="BAT 0000", model="FH16", status="Available")
+        db.session.add_all([driver, truck])
+        db.session.flush()
+        start = datetime(2030, 1, 1)
+        db.session.add_all(Assignment(driver_id=driver.id, truck_id=truck.id, start_date=start + timedelta(days=i),
+                                      end_date=start + timedelta(days=i, hours=8), status='Completed')
+                           for i in range(3))
+        db.session.commit()
+
+
+def run(client, middle, index, fail_last):
+    plate = "BAT 0000" if fail_last else f"BAT {index:04d}"  # An existing plate makes the last step 409
+    payload = {"atomic": True, "requests": [
+        {"method": "POST", "path": "/drivers",
+         "body": {"name": "Batch", "license_number": f"BATCH{index:04d}", "contact_info": "x"}},
+        {"method": middle[1], "path": middle[2], "body": middle[3](index)},
+        {"method": "POST", "path": "/trucks", "body": {"plate_number": plate, "model": "FH16"}},
+    ]}
+    result = client.post('/batch', json=payload).get_json()
+    return result, f"BATCH{index:04d}", plate
+
+
+def main():
+    path = os.path.join(tempfile.mkdtemp(prefix='batch-atomicity-'), 'fleet.db')
+    os.environ['DATABASE_URL'] = f'sqlite:///{path}'
+    os.environ.setdefault('SECRET_KEY', 'batch-atomicity')
+    os.environ.setdefault('PASSWORD_HASH_WORKERS', '0')
+    sys.path.insert(0, HERE)
+
+    from app import app
+    from database import db
+    from models import Driver, Truck
+
+    prepare(app, db)
+    client = app.test_client()
+    client.post('/login', json={"username": USERNAME, "password": PASSWORD})
+
+    problems = 0
+    for index, middle in enumerate(MIDDLE_STEPS, start=1):
+        for fail_last in (False, True):
+            result, license_number, plate = run(client, middle, index * 2 + fail_last, fail_last)
+            with app.app_context():
+                driver = Driver.query.filter_by(license_number=license_number).first() is not None
+                truck = fail_last or Truck.query.filter_by(plate_number=plate).first() is not None
+            statuses = [r["status"] for r in result["responses"]]
+            expected = not fail_last
+            ok = result["committed"] == expected and driver == expected and truck
+            problems += not ok
+            print(f"[{'ok' if ok else 'FAIL'}] write, {middle[0]}, {'failing ' if fail_last else ''}write: "
+                  f"statuses {statuses}, committed {result['committed']}, driver kept {driver}")
+
+    print(f"\n{problems} problem{'' if problems == 1 else 's'}.")
+    return 1 if problems else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,123 @@
+#!/usr/bin/env python3
+"""
+Per-item validation check for POST /assignments/bulk.
+
+Sends bulk payloads with an empty end_date (must be stored as open-ended), an
+empty or unparsable start_date, a wrong-typed reference and an id repeated in
+one request (each must come back as its own error entry while the other
+records are written). After the writes the utilization rollup must match a
+full rebuild, and each written assignment must have exactly one change-feed
+event. Exits non-zero otherwise.
+
+    python check_bulk.py
+"""
+import os
+import sys
+import tempfile
+from datetime import datetime
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+USERNAME, PASSWORD = 'bulk_admin', 'bulk-password'
+
+
+def prepare(app, db):
+    from flask_migrate import upgrade
+    from models import User, Driver, Truck, Assignment
+
+    with app.app_context():
+        upgrade(directory=os.path.join(HERE, 'migrations'))
+        user = User(username=USERNAME, email='admin@bulk.test', role='Admin')
+        user.set_password(PASSWORD)
+        db.session.add(user)
+        drivers = [Driver(name=f"Bulk Driver {i}", license_number=f"BULK{i:04d}", contact_info="x") for i in range(3)]
+        trucks = [Truck(plate_number=f"BLK {i:04d}", model="FH16", status="Available") for i in range(3)]
+        db.session.add_all(drivers + trucks)
+        db.session.flush()
+        existing = Assignment(driver_id=drivers[0].id, truck_id=trucks[0].id, start_date=datetime(2030, 1, 1, 8),
+                              end_date=datetime(2030, 1, 1, 16), status='Active')
+        db.session.add(existing)
+        db.session.commit()
+        return [d.id for d in drivers], [t.id for t in trucks], existing.id
+
+
+def rollup(db):
+    from models import DailyUtilization
+    return sorted(db.session.query(DailyUtilization.day, DailyUtilization.truck_id, DailyUtilization.driver_id,
+                                   DailyUtilization.assigned_seconds).all())
+
+
+def main():
+    path = os.path.join(tempfile.mkdtemp(prefix='bulk-check-'), 'fleet.db')
+    os.environ['DATABASE_URL'] = f'sqlite:///{path}'
+    os.environ.setdefault('SECRET_KEY', 'bulk-check')
+    os.environ.setdefault('PASSWORD_HASH_WORKERS', '0')
+    sys.path.insert(0, HERE)
+
+    from app import app
+    from database import db
+    from models import Assignment
+    from analytics import rebuild_rollup
+
+    drivers, trucks, existing = prepare(app, db)
+    client = app.test_client()
+    client.post('/login', json={"username": USERNAME, "password": PASSWORD})
+    after = client.get('/changes?resources=assignments').get_json()["last_event_id"]
+
+    payload = [
+        # 0: open-ended create
+        {"driver_id": drivers[1], "truck_id": trucks[1], "start_date": "2030-02-01 08:00:00", "end_date": ""},
+        # 1, 2: start_date that can't be parsed
+        {"driver_id": drivers[2], "truck_id": trucks[2], "start_date": "", "end_date": "2030-02-02 16:00:00"},
+        {"driver_id": drivers[2], "truck_id": trucks[2], "start_date": "tomorrow"},
+        # 3: wrong-typed reference
+        {"driver_id": [drivers[2]], "truck_id": trucks[2], "start_date": "2030-02-03 08:00:00"},
+        # 4, 5: the same id twice; only the first may be written
+        {"id": existing, "end_date": "2030-01-01 18:00:00"},
+        {"id": existing, "end_date": "2030-01-01 20:00:00"},
+        # 6: a valid create alongside the failures
+        {"driver_id": drivers[2], "truck_id": trucks[2], "start_date": "2030-02-04 08:00:00",
+         "end_date": "2030-02-04 12:00:00"},
+    ]
+    response = client.post('/assignments/bulk', json=payload)
+    results = response.get_json()["results"] if response.status_code == 200 else []
+    statuses = [r["status"] for r in results]
+
+    problems = 0
+
+    def report(ok, label, detail):
+        nonlocal problems
+        problems += not ok
+        print(f"[{'ok' if ok else 'FAIL'}] {label}: {detail}")
+
+    report(response.status_code == 200, "bulk request", f"status {response.status_code}")
+    report(statuses == ['created', 'error', 'error', 'error', 'updated', 'error', 'created'], "per-item statuses",
+           statuses)
+    if len(results) == len(payload):
+        duplicate = results[5].get("error")
+        report(duplicate == "Duplicate id in request.", "repeated id", duplicate)
+        with app.app_context():
+            created = db.session.get(Assignment, results[0]["id"]) if "id" in results[0] else None
+            report(created is not None and created.end_date is None, "empty end_date",
+                   f"stored end_date {created and created.end_date}")
+            updated = db.session.get(Assignment, existing)
+            report(updated.end_date == datetime(2030, 1, 1, 18), "first of the repeated ids wins",
+                   f"end_date {updated.end_date}")
+            before = rollup(db)
+            rebuild_rollup()
+            rebuilt = rollup(db)
+            report(before == rebuilt, "rollup matches a rebuild", f"{len(before)} rows, {len(rebuilt)} after rebuild")
+
+    events = client.get(f'/changes?resources=assignments&after={after}').get_json()["events"]
+    counts = {}
+    for event in events:
+        counts[event["id"]] = counts.get(event["id"], 0) + 1
+    written = [r["id"] for r in results if r["status"] in ('created', 'updated')]
+    report(sorted(counts) == sorted(written) and set(counts.values()) <= {1}, "one change event per written row",
+           counts)
+
+    print(f"\n{problems} problem{'' if problems == 1 else 's'}.")
+    return 1 if problems else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,167 @@
+#!/usr/bin/env python3
+"""
+Crash check for Idempotency-Key requests, against both the Flask app (app.py)
+and the ASGI app (asgi.py).
+
+Sends POST /drivers, POST /trucks and POST /assignments with an Idempotency-Key
+and makes the process "die" right after the handler returns, before its response
+is stored. The handler's writes must not have been kept. A retry once the claim
+timeout has passed must then run the handler exactly once and get its real
+response, and a further retry must replay that response. A request that fails
+with 4xx must be replayed with the same status and keep no writes. Exits
+non-zero otherwise.
+
+    python check_idempotency.py
+"""
+import asyncio
+import os
+import sys
+import tempfile
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+USERNAME, PASSWORD = 'idem_admin', 'idem-password'
+
+
+class Crash(BaseException):
+    """Stands in for the process dying: nothing after the raise runs, and no handler catches it."""
+
+
+def prepare(url):
+    """Creates the schema and the rows the requests refer to. Returns (driver id, truck id)."""
+    from sqlalchemy import create_engine
+    from sqlalchemy.orm import Session
+    from database import db
+    from models import User, Driver, Truck
+
+    engine = create_engine(url)
+    db.metadata.create_all(engine)
+    with Session(engine) as session:
+        user = User(username=USERNAME, email='admin@idem.test', role='Admin')
+        user.set_password(PASSWORD)
+        driver = Driver(name="Idem Driver", license_number="IDEM0000", contact_info="x")
+        truck = Truck(plate_number="IDM 0000", model="FH16", status="Available")
+        session.add_all([user, driver, truck])
+        session.commit()
+        ids = driver.id, truck.id
+    engine.dispose()
+    return ids
+
+
+def check(label, url, post, module):
+    """
+    Runs the scenario against one app. `post(path, body, headers)` returns (status, headers, body);
+    `module` is where the app looks up idempotency.finish, so the crash can be injected there.
+    """
+    from sqlalchemy import create_engine
+    from sqlalchemy.orm import Session
+    from idempotency import REPLAYED_HEADER, outcome_cache
+    from models import Assignment, Driver, Truck
+
+    outcome_cache.configure(0)
+    driver_id, truck_id = prepare(url)
+    engine = create_engine(url)
+    post('/login', {"username": USERNAME, "password": PASSWORD}, {})
+
+    # (name, path, body, model, filter for the rows the request writes)
+    creates = [
+        ('driver', '/drivers', {"name": "Idem", "license_number": "IDEM0001", "contact_info": "x"},
+         Driver, lambda: Driver.license_number == "IDEM0001"),
+        ('truck', '/trucks', {"plate_number": "IDM 0001", "model": "FH16"},
+         Truck, lambda: Truck.plate_number == "IDM 0001"),
+        ('assignment', '/assignments',
+         {"driver_id": driver_id, "truck_id": truck_id, "start_date": "2030-01-01 08:00:00",
+          "end_date": "2030-01-01 16:00:00"},
+         Assignment, lambda: Assignment.driver_id == driver_id),
+    ]
+
+    def count(model, condition):
+        with Session(engine) as session:
+            return session.query(model).filter(condition()).count()
+
+    problems = 0
+
+    def report(ok, name, detail):
+        nonlocal problems
+        problems += not ok
+        print(f"[{'ok' if ok else 'FAIL'}] {label}, {name}: {detail}")
+
+    finish = module.finish
+
+    def crash(*args, **kwargs):
+        raise Crash()
+
+    for name, path, body, model, condition in creates:
+        headers = {'Idempotency-Key': f'crash-{name}'}
+        module.finish = crash
+        try:
+            post(path, body, headers)
+            crashed = False
+        except Crash:
+            crashed = True
+        finally:
+            module.finish = finish
+        kept = count(model, condition)
+        report(crashed and kept == 0, f"{name}, crash before the response is stored", f"{kept} rows kept")
+
+        retry = post(path, body, headers)
+        again = post(path, body, headers)
+        kept = count(model, condition)
+        replayed = again[1].get(REPLAYED_HEADER) == 'true'
+        report(retry[0] == 201 and kept == 1 and replayed and again[2] == retry[2], f"{name}, retries after the crash",
+               f"statuses {retry[0]}, {again[0]}, replayed {replayed}, {kept} rows")
+
+    # Overlaps the assignment above, so the handler answers 409 after its conflict check
+    body = {"driver_id": driver_id, "truck_id": truck_id, "start_date": "2030-01-01 10:00:00",
+            "end_date": "2030-01-01 12:00:00"}
+    headers = {'Idempotency-Key': 'conflict'}
+    first = post('/assignments', body, headers)
+    again = post('/assignments', body, headers)
+    kept = count(Assignment, lambda: Assignment.driver_id == driver_id)
+    replayed = again[1].get(REPLAYED_HEADER) == 'true'
+    report(first[0] == 409 and again[0] == 409 and replayed and kept == 1, "failed request",
+           f"statuses {first[0]}, {again[0]}, replayed {replayed}, {kept} rows")
+    engine.dispose()
+    return problems
+
+
+def main():
+    directory = tempfile.mkdtemp(prefix='idempotency-check-')
+    os.environ.setdefault('SECRET_KEY', 'idempotency-check')
+    os.environ.setdefault('PASSWORD_HASH_WORKERS', '0')
+    os.environ['IDEMPOTENCY_CLAIM_TIMEOUT_SECONDS'] = '0'  # Retries may take over a claim straight away
+    sys.path.insert(0, HERE)
+    urls = {mode: f"sqlite:///{os.path.join(directory, mode + '.db')}" for mode in ('flask', 'asgi')}
+
+    # Each app reads DATABASE_URL when it is imported
+    os.environ['DATABASE_URL'] = urls['flask']
+    import idempotency
+    from app import app as flask_app
+    os.environ['DATABASE_URL'] = urls['asgi']
+    import asgi
+
+    flask_client = flask_app.test_client()
+
+    def flask_post(path, body, headers):
+        response = flask_client.post(path, json=body, headers=headers)
+        return response.status_code, response.headers, response.get_data()
+
+    loop = asyncio.new_event_loop()
+    asgi_client = asgi.app.test_client()
+
+    async def asgi_request(path, body, headers):
+        response = await asgi_client.post(path, json=body, headers=headers)
+        return response.status_code, response.headers, await response.get_data()
+
+    def asgi_post(path, body, headers):
+        return loop.run_until_complete(asgi_request(path, body, headers))
+
+    problems = check('flask', urls['flask'], flask_post, idempotency)
+    problems += check('asgi', urls['asgi'], asgi_post, asgi)
+    loop.close()
+
+    print(f"\n{problems} problem{'' if problems == 1 else 's'}.")
+    return 1 if problems else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,191 @@
+#!/usr/bin/env python3
+"""
+Query plan check for the API's hot queries.
+
+Builds a large SQLite database through the Alembic migrations, runs the app's
+hot queries through their real code paths, then EXPLAINs the captured SQL and
+exits non-zero if any plan falls back to a full table scan or a full temp B-tree sort.
+
+    python check_query_plans.py --drivers 20000 --trucks 10000 --assignments 200000
+"""
+import argparse
+import os
+import random
+import re
+import sys
+import tempfile
+from datetime import datetime, timedelta
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+CHUNK = 5000
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--drivers', type=int, default=20000)
+    parser.add_argument('--trucks', type=int, default=10000)
+    parser.add_argument('--assignments', type=int, default=200000)
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--verbose', action='store_true', help='Print every plan, not just failures')
+    return parser.parse_args()
+
+
+def seed(db, models, options):
+    """Bulk-loads drivers, trucks and per-truck sequential assignment timelines."""
+    from sqlalchemy import insert
+    Driver, Truck, Assignment = models
+    rng = random.Random(options.seed)
+    statuses = ['Available'] * 6 + ['In Use'] * 3 + ['Maintenance']
+
+    def load(model, rows):
+        for i in range(0, len(rows), CHUNK):
+            db.session.execute(insert(model), rows[i:i + CHUNK])
+
+    load(Driver, [
+        {"name": f"Driver {i}", "license_number": f"LIC{i:07d}", "contact_info": f"+2547{i:08d}",
+         "assigned_truck_id": rng.randint(1, options.trucks) if rng.random() < 0.3 else None}
+        for i in range(options.drivers)
+    ])
+    load(Truck, [
+        {"plate_number": f"KBX {i:06d}", "model": rng.choice(["FH16", "R500", "XF", "Actros"]),
+         "status": rng.choice(statuses),
+         "current_driver_id": rng.randint(1, options.drivers) if rng.random() < 0.3 else None}
+        for i in range(options.trucks)
+    ])
+
+    per_truck = max(1, options.assignments // options.trucks)
+    origin = datetime(2022, 1, 1)
+    rows = []
+    for truck_id in range(1, options.trucks + 1):
+        start = origin + timedelta(hours=rng.randint(0, 240))
+        for n in range(per_truck):
+            end = start + timedelta(hours=rng.randint(4, 96))
+            last = n == per_truck - 1
+            rows.append({
+                "truck_id": truck_id,
+                "driver_id": rng.randint(1, options.drivers),
+                "start_date": start,
+                "end_date": None if last else end,
+                "status": "Active" if last else "Completed",
+            })
+            start = end + timedelta(hours=rng.randint(1, 72))
+    load(Assignment, rows)
+    db.session.commit()
+    db.session.execute(db.text('ANALYZE'))
+    db.session.commit()
+
+
+def hot_queries(app_models, options):
+    """(name, callable, tables allowed to be scanned) for each hot query path in the app."""
+    from pagination import paginate
+    from scheduling import AssignmentConflict, check_availability, free_trucks_query, free_drivers_query, find_all_conflicts
+    from bulk import fetch_ids_by
+    from auth import principal_cache
+    from database import db
+    Driver, Truck, Assignment = app_models
+    window = (datetime(2022, 3, 1), datetime(2022, 3, 2))
+
+    def overlap_check():
+        try:
+            check_availability(1, 1, *window)
+        except AssignmentConflict:
+            pass
+
+    return [
+        ("GET /drivers?assigned_truck_id", lambda: paginate(Driver.query, Driver, {'assigned_truck_id': '5'}), ()),
+        ("GET /trucks?status", lambda: paginate(Truck.query, Truck, {'status': 'Available'}), ()),
+        ("GET /trucks?current_driver_id", lambda: paginate(Truck.query, Truck, {'current_driver_id': '5'}), ()),
+        ("GET /assignments?status&sort=-start_date",
+         lambda: paginate(Assignment.query, Assignment, {'status': 'Active', 'sort': '-start_date'}), ()),
+        ("GET /assignments?truck_id&sort=start_date",
+         lambda: paginate(Assignment.query, Assignment, {'truck_id': '7', 'sort': 'start_date'}), ()),
+        ("GET /assignments?driver_id", lambda: paginate(Assignment.query, Assignment, {'driver_id': '7'}), ()),
+        ("GET /assignments?truck_id&start_from&start_to",
+         lambda: paginate(Assignment.query, Assignment,
+                          {'truck_id': '7', 'start_from': '2022-02-01', 'start_to': '2022-06-01', 'sort': 'start_date'}), ()),
+        # The first history-aware query of a request reads the partition registry, one row per history table
+        ("overlap check (create/update assignment)", overlap_check, ('assignment_history_partitions',)),
+        ("GET /availability/trucks", lambda: paginate(free_trucks_query(*window), Truck, {}), ()),
+        # Every driver is a candidate, so drivers is walked in id order up to LIMIT
+        ("GET /availability/drivers", lambda: paginate(free_drivers_query(*window), Driver, {}), ('drivers',)),
+        ("Driver.assignments (cascade delete)", lambda: db.session.get(Driver, 3).assignments, ()),
+        ("Truck.assignments (cascade delete)", lambda: db.session.get(Truck, 3).assignments, ()),
+        ("GET /assignments/conflicts", find_all_conflicts, ()),
+        ("bulk uniqueness lookup", lambda: fetch_ids_by(Truck.plate_number, [f"KBX {i:06d}" for i in range(50)]), ()),
+        ("role lookup", lambda: (principal_cache.clear(), principal_cache.get_role(1)), ()),
+    ]
+
+
+SCAN = re.compile(r'^SCAN (?:TABLE )?(\w+)(.*)$')
+
+
+def plan_problems(plan, allowed_scans):
+    problems = []
+    for detail in plan:
+        match = SCAN.match(detail)
+        if match and 'USING' not in match.group(2) and match.group(1) not in allowed_scans:
+            problems.append(f"full table scan of {match.group(1)}")
+        # "FOR RIGHT PART OF ORDER BY" sorts small groups of equal index prefix and
+        # still streams under LIMIT; a plain temp B-tree sorts every matching row.
+        if 'USE TEMP B-TREE' in detail and 'RIGHT PART' not in detail:
+            problems.append(detail.lower())
+    return problems
+
+
+def main():
+    options = parse_args()
+    path = os.path.join(tempfile.mkdtemp(prefix='query-plans-'), 'fleet.db')
+    os.environ['DATABASE_URL'] = f'sqlite:///{path}'
+    os.environ.setdefault('SECRET_KEY', 'query-plan-check')
+    sys.path.insert(0, HERE)
+
+    from flask_migrate import upgrade
+    from sqlalchemy import event
+    from app import app
+    from database import db
+    from models import Driver, Truck, Assignment
+
+    failures = 0
+    with app.app_context():
+        upgrade(directory=os.path.join(HERE, 'migrations'))
+        print(f"Seeding {options.drivers} drivers, {options.trucks} trucks, ~{options.assignments} assignments into {path}")
+        seed(db, (Driver, Truck, Assignment), options)
+
+        captured = []
+
+        def capture(conn, cursor, statement, parameters, context, executemany):
+            if statement.lstrip().upper().startswith('SELECT'):
+                captured.append((statement, parameters))
+
+        for name, run, allowed in hot_queries((Driver, Truck, Assignment), options):
+            db.session.expunge_all()
+            captured.clear()
+            event.listen(db.engine, 'before_cursor_execute', capture)
+            try:
+                run()
+            finally:
+                event.remove(db.engine, 'before_cursor_execute', capture)
+
+            problems = []
+            plans = []
+            for statement, parameters in captured:
+                rows = db.session.connection().exec_driver_sql('EXPLAIN QUERY PLAN ' + statement, parameters)
+                plan = [row[-1] for row in rows]
+                plans.append(plan)
+                problems.extend(plan_problems(plan, allowed))
+
+            failures += bool(problems)
+            print(f"[{'FAIL' if problems else 'ok'}] {name}")
+            if problems or options.verbose:
+                for problem in problems:
+                    print(f"       - {problem}")
+                for plan in plans:
+                    for detail in plan:
+                        print(f"         {detail}")
+
+    print(f"\n{failures} hot quer{'y' if failures == 1 else 'ies'} with full scans or temp sorts.")
+    return 1 if failures else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,160 @@
+#!/usr/bin/env python3
+"""
+Cross-process check for the response cache and list ETags.
+
+Starts two server processes on one SQLite database, each with its own response
+cache, and alternates requests between them. A list ETag issued by one process
+must get 304 from the other while nothing changed, and a write served by either
+process must show up in both processes' next GET and stop the old ETag from
+matching. An atomic /batch that reads its own uncommitted write and then rolls
+back must leave no trace in either cache. Exits non-zero otherwise.
+
+    python check_response_cache.py
+"""
+import argparse
+import json
+import logging
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+from http.cookiejar import CookieJar
+from urllib.error import HTTPError
+from urllib.request import HTTPCookieProcessor, Request, build_opener
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+USERNAME, PASSWORD = 'cache_admin', 'cache-password'
+
+
+def serve(fd):
+    from werkzeug.serving import make_server
+
+    sys.path.insert(0, HERE)
+    from app import app
+
+    logging.getLogger('werkzeug').setLevel(logging.ERROR)
+    server = make_server('127.0.0.1', 0, app, threaded=True, fd=fd)
+    print('ready', flush=True)
+    server.serve_forever()
+
+
+class Worker:
+    """One server process with its own listening socket, so requests can pick the process."""
+
+    def __init__(self, env):
+        self.socket = socket.socket()
+        self.socket.bind(('127.0.0.1', 0))
+        self.socket.listen(16)
+        self.url = f'http://127.0.0.1:{self.socket.getsockname()[1]}'
+        fd = self.socket.fileno()
+        self.process = subprocess.Popen([sys.executable, os.path.abspath(__file__), '--serve', str(fd)],
+                                        cwd=HERE, env=env, pass_fds=(fd,), stdout=subprocess.PIPE, text=True)
+        if self.process.stdout.readline().strip() != 'ready':
+            self.stop()
+            raise RuntimeError("Server process failed to start")
+
+    def stop(self):
+        self.process.terminate()
+        self.process.wait()
+        self.socket.close()
+
+
+def prepare(path):
+    os.environ['DATABASE_URL'] = f'sqlite:///{path}'
+    sys.path.insert(0, HERE)
+    from flask_migrate import upgrade
+    from app import app
+    from database import db
+    from models import User, Truck
+
+    with app.app_context():
+        upgrade(directory=os.path.join(HERE, 'migrations'))
+        user = User(username=USERNAME, email='admin@cache.test', role='Admin')
+        user.set_password(PASSWORD)
+        db.session.add_all([user, Truck(plate_number="CCH 0000", model="FH16", status="Available")])
+        db.session.commit()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--serve', type=int, help=argparse.SUPPRESS)
+    options = parser.parse_args()
+    if options.serve is not None:
+        return serve(options.serve)
+
+    path = os.path.join(tempfile.mkdtemp(prefix='response-cache-check-'), 'fleet.db')
+    os.environ.setdefault('SECRET_KEY', 'response-cache-check')
+    os.environ['PASSWORD_HASH_WORKERS'] = '0'
+    os.environ['RESPONSE_CACHE_SIZE'] = '512'
+    prepare(path)
+
+    workers = []
+    try:
+        workers = [Worker(dict(os.environ)) for _ in range(2)]
+        return run(*workers)
+    finally:
+        for worker in workers:
+            worker.stop()
+
+
+def run(a, b):
+    opener = build_opener(HTTPCookieProcessor(CookieJar()))  # Both processes accept the same session cookie
+
+    def call(worker, method, path, body=None, headers=None):
+        data = json.dumps(body).encode() if body is not None else None
+        request = Request(worker.url + path, data=data, method=method,
+                          headers={'Content-Type': 'application/json', **(headers or {})})
+        try:
+            with opener.open(request) as response:
+                raw = response.read()
+                return response.status, response.headers.get('ETag'), json.loads(raw) if raw else None
+        except HTTPError as e:
+            raw = e.read()
+            return e.code, e.headers.get('ETag'), json.loads(raw) if raw else None
+
+    def licenses(worker):
+        status, etag, body = call(worker, 'GET', '/drivers')
+        return etag, {d['license_number'] for d in body}
+
+    problems = 0
+
+    def report(ok, label, detail):
+        nonlocal problems
+        problems += not ok
+        print(f"[{'ok' if ok else 'FAIL'}] {label}: {detail}")
+
+    call(a, 'POST', '/login', {"username": USERNAME, "password": PASSWORD})
+
+    first, _ = licenses(a)
+    status = call(b, 'GET', '/drivers', headers={'If-None-Match': first})[0]
+    report(status == 304, "other process honours an unchanged list ETag", f"status {status}")
+
+    for n, (writer, reader) in enumerate(((b, a), (a, b)), start=1):
+        etag, _ = licenses(reader)  # Fills the reader's cache
+        status = call(writer, 'POST', '/drivers', {"name": "Cache", "license_number": f"CACHE{n}", "contact_info": "x"})[0]
+        fresh, seen = licenses(reader)
+        stale = call(reader, 'GET', '/drivers', headers={'If-None-Match': etag})[0]
+        report(status == 201 and f"CACHE{n}" in seen and fresh != etag and stale == 200,
+               f"write on one process, read on the other ({n})",
+               f"write {status}, new driver listed {f'CACHE{n}' in seen}, old ETag answered {stale}")
+
+    etags = [licenses(worker)[0] for worker in (a, b)]
+    result = call(a, 'POST', '/batch', {"atomic": True, "requests": [
+        {"method": "POST", "path": "/drivers", "body": {"name": "Cache", "license_number": "GHOST", "contact_info": "x"}},
+        {"method": "GET", "path": "/drivers"},
+        {"method": "POST", "path": "/trucks", "body": {"plate_number": "CCH 0000", "model": "FH16"}},  # 409
+    ]})[2]
+    listed = [("GHOST" in licenses(worker)[1]) for worker in (a, b)]
+    unchanged = [call(worker, 'GET', '/drivers', headers={'If-None-Match': etag})[0]
+                 for worker, etag in zip((a, b), etags)]
+    report(result["committed"] is False and not any(listed) and unchanged == [304, 304],
+           "rolled-back atomic batch", f"committed {result['committed']}, rolled-back driver listed {listed}, "
+           f"old ETags answered {unchanged}")
+
+    print(f"\n{problems} problem{'' if problems == 1 else 's'}.")
+    return 1 if problems else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
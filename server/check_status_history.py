@@ -0,0 +1,127 @@
+#!/usr/bin/env python3
+"""
+Truck status history check.
+
+Changes truck statuses through every write path (create, PUT, bulk upsert,
+assign/release, delete) and checks that each change closes the truck's current
+status period and opens one for the new status, that writes which keep the
+status open no period, and that a rolled-back change leaves none behind. Then
+adds Maintenance periods in a past window and checks that
+GET /analytics/utilization reports their hours per truck and per day next to
+the assigned hours. Exits non-zero otherwise.
+
+    python check_status_history.py
+"""
+import os
+import sys
+import tempfile
+from datetime import datetime
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+USERNAME, PASSWORD = 'status_admin', 'status-password'
+
+
+def prepare(app, db):
+    from flask_migrate import upgrade
+    from models import User, Driver
+
+    with app.app_context():
+        upgrade(directory=os.path.join(HERE, 'migrations'))
+        user = User(username=USERNAME, email='admin@status.test', role='Admin')
+        user.set_password(PASSWORD)
+        driver = Driver(name="Status Driver", license_number="STAT0000", contact_info="x")
+        db.session.add_all([user, driver])
+        db.session.commit()
+        return driver.id
+
+
+def main():
+    path = os.path.join(tempfile.mkdtemp(prefix='status-history-check-'), 'fleet.db')
+    os.environ['DATABASE_URL'] = f'sqlite:///{path}'
+    os.environ.setdefault('SECRET_KEY', 'status-history-check')
+    os.environ.setdefault('PASSWORD_HASH_WORKERS', '0')
+    sys.path.insert(0, HERE)
+
+    from app import app
+    from database import db
+    from models import Truck, TruckStatusPeriod
+
+    driver_id = prepare(app, db)
+    client = app.test_client()
+    client.post('/login', json={"username": USERNAME, "password": PASSWORD})
+
+    def history(truck_id):
+        """[(status, closed)] of the truck's periods, oldest first."""
+        with app.app_context():
+            rows = db.session.query(TruckStatusPeriod.status, TruckStatusPeriod.end_date) \
+                .filter(TruckStatusPeriod.truck_id == truck_id).order_by(TruckStatusPeriod.id).all()
+            return [(status, end_date is not None) for status, end_date in rows]
+
+    problems = 0
+
+    def report(ok, label, detail):
+        nonlocal problems
+        problems += not ok
+        print(f"[{'ok' if ok else 'FAIL'}] {label}: {detail}")
+
+    first = client.post('/trucks', json={"plate_number": "STS 0001", "model": "FH16"}).get_json()["id"]
+    report(history(first) == [('Available', False)], "create opens a period", history(first))
+
+    client.put(f'/trucks/{first}', json={"status": "Maintenance"})
+    client.put(f'/trucks/{first}', json={"model": "FH16 XL"})
+    client.put(f'/trucks/{first}', json={"status": "Maintenance"})
+    report(history(first) == [('Available', True), ('Maintenance', False)], "PUT records changes only", history(first))
+
+    bulk = client.post('/trucks/bulk?upsert=true', json=[
+        {"plate_number": "STS 0001", "model": "FH16", "status": "Available"},
+        {"plate_number": "STS 0002", "model": "FH16", "status": "Maintenance"},
+    ]).get_json()["results"]
+    second = bulk[1]["id"]
+    report(history(first) == [('Available', True), ('Maintenance', True), ('Available', False)]
+           and history(second) == [('Maintenance', False)], "bulk upsert and create",
+           f"{history(first)}, {history(second)}")
+
+    client.put(f'/trucks/{second}', json={"status": "Available"})
+    client.post('/assignments/assign', json={"driver_id": driver_id, "truck_id": second})
+    client.post('/assignments/release', json={"truck_id": second})
+    report([status for status, _ in history(second)] == ['Maintenance', 'Available', 'In Use', 'Available'],
+           "assign and release", history(second))
+
+    with app.app_context():
+        truck = db.session.get(Truck, second)
+        truck.status = 'Maintenance'
+        db.session.flush()
+        db.session.rollback()
+    report(history(second)[-1] == ('Available', False) and len(history(second)) == 4, "rolled-back change",
+           history(second))
+
+    # A past window, so open periods aren't cut off at now
+    third = client.post('/trucks', json={"plate_number": "STS 0003", "model": "FH16"}).get_json()["id"]
+    with app.app_context():
+        db.session.add_all([
+            TruckStatusPeriod(truck_id=first, status='Maintenance', start_date=datetime(2020, 5, 1, 6),
+                              end_date=datetime(2020, 5, 2, 18)),
+            TruckStatusPeriod(truck_id=third, status='Maintenance', start_date=datetime(2020, 5, 2, 12),
+                              end_date=None),
+        ])
+        db.session.commit()
+    client.post('/assignments', json={"driver_id": driver_id, "truck_id": first, "start_date": "2020-05-01 08:00:00",
+                                      "end_date": "2020-05-01 16:00:00"})
+
+    result = client.get('/analytics/utilization?start=2020-05-01&end=2020-05-02&bucket=day').get_json()
+    entries = {entry["id"]: entry for entry in result["resources"]}
+    hours = {truck_id: (entry["assigned_hours"], entry["maintenance_hours"]) for truck_id, entry in entries.items()}
+    report(hours == {first: (8.0, 36.0), third: (0.0, 12.0)}, "assigned and maintenance hours", hours)
+    series = [(p["period"], p["assigned_hours"], p["maintenance_hours"]) for p in entries.get(first, {}).get("series", [])]
+    report(series == [('2020-05-01', 8.0, 18.0), ('2020-05-02', 0.0, 18.0)], "per-day series", series)
+    report(third not in result["idle"] and second in result["idle"], "trucks in maintenance aren't idle", result["idle"])
+
+    client.delete(f'/trucks/{third}')
+    report(history(third) == [], "delete removes the history", history(third))
+
+    print(f"\n{problems} problem{'' if problems == 1 else 's'}.")
+    return 1 if problems else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
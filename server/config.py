@@ -0,0 +1,40 @@
+import os
+
+
+def load_config(config):
+    """Reads the app's settings from the environment into a Flask/Quart config mapping."""
+    config['SQLALCHEMY_DATABASE_URI'] = os.getenv('DATABASE_URL')
+    config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+    config['DATABASE_READ_URL'] = os.getenv('DATABASE_READ_URL')
+    config['DB_POOL_SIZE'] = int(os.getenv('DB_POOL_SIZE', 10))
+    config['DB_MAX_OVERFLOW'] = int(os.getenv('DB_MAX_OVERFLOW', 20))
+    config['DB_POOL_TIMEOUT'] = int(os.getenv('DB_POOL_TIMEOUT', 30))
+    config['DB_POOL_RECYCLE'] = int(os.getenv('DB_POOL_RECYCLE', 1800))
+    config['DB_POOL_PRE_PING'] = os.getenv('DB_POOL_PRE_PING', 'true').lower() in ('1', 'true', 'yes')
+    config['SQLITE_JOURNAL_MODE'] = os.getenv('SQLITE_JOURNAL_MODE', 'WAL')
+    config['SQLITE_SYNCHRONOUS'] = os.getenv('SQLITE_SYNCHRONOUS', 'NORMAL')
+    config['SQLITE_CACHE_SIZE'] = int(os.getenv('SQLITE_CACHE_SIZE', -65536))
+    config['SQLITE_MMAP_SIZE'] = int(os.getenv('SQLITE_MMAP_SIZE', 256 * 1024 * 1024))
+    config['SQLITE_BUSY_TIMEOUT'] = int(os.getenv('SQLITE_BUSY_TIMEOUT', 5000))
+    config['SECRET_KEY'] = os.getenv('SECRET_KEY')
+    config['PRINCIPAL_CACHE_TTL'] = int(os.getenv('PRINCIPAL_CACHE_TTL', 60))
+    config['PRINCIPAL_CACHE_SIZE'] = int(os.getenv('PRINCIPAL_CACHE_SIZE', 10000))
+    config['RESPONSE_CACHE_SIZE'] = int(os.getenv('RESPONSE_CACHE_SIZE', 512))
+    config['RESPONSE_CACHE_MAX_BYTES'] = int(os.getenv('RESPONSE_CACHE_MAX_BYTES', 64 * 1024 * 1024))
+    config['SLOW_QUERY_MS'] = float(os.getenv('SLOW_QUERY_MS', 200))
+    config['N_PLUS_ONE_THRESHOLD'] = int(os.getenv('N_PLUS_ONE_THRESHOLD', 10))
+    config['SERVER_TIMING'] = os.getenv('SERVER_TIMING', '').lower() in ('1', 'true', 'yes')
+    config['METRICS_TOKEN'] = os.getenv('METRICS_TOKEN')
+    config['CHANGE_FEED_SIZE'] = int(os.getenv('CHANGE_FEED_SIZE', 10000))
+    config['PASSWORD_HASH_METHOD'] = os.getenv('PASSWORD_HASH_METHOD', 'scrypt:32768:8:1')
+    config['PASSWORD_HASH_WORKERS'] = int(os.getenv('PASSWORD_HASH_WORKERS', max(1, (os.cpu_count() or 2) // 2)))
+    config['PASSWORD_HASH_MAX_PENDING'] = int(os.getenv('PASSWORD_HASH_MAX_PENDING', 16))
+    config['PASSWORD_HASH_WAIT_SECONDS'] = float(os.getenv('PASSWORD_HASH_WAIT_SECONDS', 10))
+    config['PASSWORD_HASH_NICE'] = int(os.getenv('PASSWORD_HASH_NICE', 10))
+    config['ASSIGNMENT_ARCHIVE_AFTER_DAYS'] = int(os.getenv('ASSIGNMENT_ARCHIVE_AFTER_DAYS', 365))
+    config['ASSIGNMENT_ARCHIVE_PERIOD'] = os.getenv('ASSIGNMENT_ARCHIVE_PERIOD', 'year')
+    config['ASSIGNMENT_ARCHIVE_CHUNK_SIZE'] = int(os.getenv('ASSIGNMENT_ARCHIVE_CHUNK_SIZE', 5000))
+    config['CHANGE_FEED_MAX_STREAM_SECONDS'] = int(os.getenv('CHANGE_FEED_MAX_STREAM_SECONDS', 300))
+    config['IDEMPOTENCY_KEY_TTL_SECONDS'] = int(os.getenv('IDEMPOTENCY_KEY_TTL_SECONDS', 24 * 60 * 60))
+    config['IDEMPOTENCY_CLAIM_TIMEOUT_SECONDS'] = int(os.getenv('IDEMPOTENCY_CLAIM_TIMEOUT_SECONDS', 60))
+    config['IDEMPOTENCY_CACHE_SIZE'] = int(os.getenv('IDEMPOTENCY_CACHE_SIZE', 10000))
@@ -1,2 +1,3 @@
 from flask_sqlalchemy import SQLAlchemy
-db = SQLAlchemy()
+from engine_profile import RoutingSession
+db = SQLAlchemy(session_options={"class_": RoutingSession})
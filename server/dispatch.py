@@ -0,0 +1,339 @@
+import heapq
+from collections import defaultdict
+from datetime import datetime
+
+from sqlalchemy import insert
+
+from database import db
+from models import Assignment, Driver, Truck
+from bulk import DEFAULTS, fetch_ids_by, queue_bulk_changes, update_rollup
+from pagination import DATETIME_FORMAT
+from archive import history_entities
+from scheduling import OPEN_END, lock_resources, overlaps
+
+MAX_DISPATCH_JOBS = 2000
+
+
+class DispatchRequestError(ValueError):
+    """Raised when a dispatch payload is malformed as a whole (not per job)."""
+
+
+def parse_dispatch(payload):
+    """
+    Reads {"jobs": [...], "dry_run": bool}. Returns (jobs, results, dry_run) where `results`
+    already holds an error entry for every job that could not be parsed.
+    """
+    if not isinstance(payload, dict) or not isinstance(payload.get('jobs'), list):
+        raise DispatchRequestError('Request body must be an object with a "jobs" array.')
+    if len(payload['jobs']) > MAX_DISPATCH_JOBS:
+        raise DispatchRequestError(f"Too many jobs; the limit is {MAX_DISPATCH_JOBS} per request.")
+
+    jobs, results = [], [None] * len(payload['jobs'])
+    for index, record in enumerate(payload['jobs']):
+        if not isinstance(record, dict):
+            results[index] = {"index": index, "status": "error", "error": "Job must be an object."}
+            continue
+        if not record.get('start_date'):
+            results[index] = {"index": index, "status": "error", "error": "Missing required field: start_date"}
+            continue
+        try:
+            start = datetime.strptime(record['start_date'], DATETIME_FORMAT)
+            end = datetime.strptime(record['end_date'], DATETIME_FORMAT) if record.get('end_date') else None
+            if end is not None and end <= start:
+                raise ValueError("end_date must be after start_date.")
+        except (TypeError, ValueError) as e:
+            results[index] = {"index": index, "status": "error", "error": str(e)}
+            continue
+        jobs.append({
+            "index": index, "start_date": start, "end_date": end,
+            "start": start, "end": end or OPEN_END,
+            "truck_model": record.get('truck_model'),
+            "truck_id": record.get('truck_id'),
+            "driver_id": record.get('driver_id'),
+        })
+    return jobs, results, bool(payload.get('dry_run', False))
+
+
+def _is_free(intervals, start, end):
+    return all(other_start >= end or other_end <= start for other_start, other_end in intervals)
+
+
+def load_timelines(jobs):
+    """{truck_id: [(start, end)]} and {driver_id: [(start, end)]} of assignments overlapping the jobs' span."""
+    start = min(job['start'] for job in jobs)
+    end = max(job['end'] for job in jobs)
+    end = None if end == OPEN_END else end
+    trucks, drivers = defaultdict(list), defaultdict(list)
+    for model in [Assignment, *history_entities(None, start, end)]:
+        rows = db.session.query(model.truck_id, model.driver_id, model.start_date, model.end_date) \
+            .filter(overlaps(start, end, model))
+        for truck_id, driver_id, row_start, row_end in rows:
+            trucks[truck_id].append((row_start, row_end or OPEN_END))
+            drivers[driver_id].append((row_start, row_end or OPEN_END))
+    return trucks, drivers
+
+
+def sweep(jobs, pools, pool_key, pinned_key, unfit, keys_of, rank, timelines):
+    """
+    Books one resource (truck or driver) per job, walking the jobs in order of start time.
+
+    A booked resource waits in a heap keyed by when its booking ends and goes back to its
+    pools' ready heaps once the sweep gets there, so only jobs that really overlap compete
+    for it. A job takes the ready resource with the lowest `rank(key, resource)`. When none
+    is free, it takes the resource of the booking that ends last if that booking ends after
+    the job does, and that booking's job loses it. With interchangeable resources this serves
+    as many jobs as possible.
+
+    `jobs` must be sorted by (start, end). `unfit(job, resource)` says why a pinned resource
+    can't serve the job, or None; `keys_of(resource)` lists the pools it is in. Returns
+    ({job index: resource}, {job index: reason}) with reason 'none', 'booked', 'taken' or
+    the message from `unfit`.
+    """
+    stamps = defaultdict(int)  # Bumped on every booking, so older heap entries are skipped
+    ready = {key: sorted((rank(key, resource), resource, 0) for resource in pool) for key, pool in pools.items()}
+    waiting = defaultdict(list)  # key: [(end, resource, stamp)] of booked resources
+    busy = defaultdict(list)  # key: [(OPEN_END - end, index, resource, stamp)], the latest-ending booking on top
+    holder, booked, missing = {}, {}, {}
+
+    def fits(job, resource):
+        return _is_free(timelines.get(resource, ()), job['start'], job['end'])
+
+    def book(job, resource):
+        victim = holder.get(resource)
+        if victim is not None and victim['end'] > job['start']:
+            del booked[victim['index']]
+            missing[victim['index']] = 'taken'
+        stamps[resource] += 1
+        holder[resource] = job
+        booked[job['index']] = resource
+        for key in keys_of(resource):
+            heapq.heappush(waiting[key], (job['end'], resource, stamps[resource]))
+            heapq.heappush(busy[key], (OPEN_END - job['end'], job['index'], resource, stamps[resource]))
+
+    def first_ready(job, key):
+        heap, queue = ready.get(key, []), waiting[key]
+        while queue and queue[0][0] <= job['start']:
+            _, resource, stamp = heapq.heappop(queue)
+            if stamp == stamps[resource]:
+                heapq.heappush(heap, (rank(key, resource), resource, stamp))
+        skipped, found = [], None
+        while heap:
+            entry = heapq.heappop(heap)
+            if entry[2] != stamps[entry[1]]:
+                continue
+            if fits(job, entry[1]):
+                found = entry[1]
+                break
+            # Held by an existing assignment. If it is held at this start, it is for every later start
+            # until that assignment ends; otherwise a shorter later job may still fit before it
+            until = max((end for start, end in timelines[entry[1]] if start <= job['start'] < end), default=None)
+            if until is not None:
+                heapq.heappush(queue, (until, entry[1], entry[2]))
+            else:
+                skipped.append(entry)
+        for entry in skipped:
+            heapq.heappush(heap, entry)
+        return found
+
+    def latest_booking(key):
+        """(end, resource) of the pool's booking that ends last, or (None, None)."""
+        heap = busy[key]
+        while heap and heap[0][3] != stamps[heap[0][2]]:
+            heapq.heappop(heap)
+        return (OPEN_END - heap[0][0], heap[0][2]) if heap else (None, None)
+
+    for job in jobs:
+        pinned = job[pinned_key]
+        if pinned is not None:
+            current = holder.get(pinned)
+            reason = unfit(job, pinned)
+            if reason is None and not fits(job, pinned):
+                reason = 'booked'
+            elif reason is None and current is not None and current['end'] > job['start']:
+                reason = None if current['end'] > job['end'] else 'taken'
+            if reason is None:
+                book(job, pinned)
+            else:
+                missing[job['index']] = reason
+            continue
+
+        key = pool_key(job)
+        found = first_ready(job, key)
+        if found is None:
+            end, resource = latest_booking(key)
+            if end is not None and end > job['end'] and fits(job, resource):
+                found = resource
+        if found is not None:
+            book(job, found)
+        elif not pools.get(key):
+            missing[job['index']] = 'none'
+        else:
+            end, _ = latest_booking(key)
+            missing[job['index']] = 'taken' if end is not None and end > job['start'] else 'booked'
+    return booked, missing
+
+
+def _truck_pools():
+    """Available trucks in id order: {None: all of them, model: those of that model}, and {id: model}."""
+    pools, models = {None: []}, {}
+    for truck_id, model in db.session.query(Truck.id, Truck.model).filter(Truck.status == 'Available').order_by(Truck.id):
+        pools[None].append(truck_id)
+        pools.setdefault(model, []).append(truck_id)
+        models[truck_id] = model
+    return pools, models
+
+
+def plan(jobs, results):
+    """
+    Picks a truck and a driver for as many jobs as possible without double-booking either,
+    given their existing assignments. Fills `results` with an "unassigned" entry for each
+    job left out and returns [(job, truck_id, driver_id)] for the rest.
+
+    Trucks are booked to jobs by sweep(), then drivers to the jobs that got a truck; jobs
+    that got no driver give their truck back and the trucks are booked again without them.
+    """
+    if not jobs:
+        return []
+    known_trucks = set(fetch_ids_by(Truck.id, {job['truck_id'] for job in jobs if job['truck_id'] is not None}))
+    known_drivers = set(fetch_ids_by(Driver.id, {job['driver_id'] for job in jobs if job['driver_id'] is not None}))
+    pending = []
+    for job in jobs:
+        if job['truck_id'] is not None and job['truck_id'] not in known_trucks:
+            results[job['index']] = {"index": job['index'], "status": "error", "error": "Truck not found."}
+        elif job['driver_id'] is not None and job['driver_id'] not in known_drivers:
+            results[job['index']] = {"index": job['index'], "status": "error", "error": "Driver not found."}
+        else:
+            pending.append(job)
+    if not pending:
+        return []
+
+    truck_timelines, driver_timelines = load_timelines(pending)
+    truck_pools, truck_models = _truck_pools()
+    driver_pools = {None: [driver_id for driver_id, in db.session.query(Driver.id)
+                           .filter(Driver.assigned_truck_id.is_(None)).order_by(Driver.id)]}
+    unpaired = set(driver_pools[None])
+
+    def truck_unfit(job, truck_id):
+        if truck_id not in truck_models:
+            return f"Truck {truck_id} is not Available."
+        if job['truck_model'] not in (None, truck_models[truck_id]):
+            return f"Truck {truck_id} is not a {job['truck_model']}."
+        return None
+
+    def driver_unfit(job, driver_id):
+        return None if driver_id in unpaired else f"Driver {driver_id} is paired with a truck."
+
+    # Jobs free to take any truck or driver leave the ones other jobs ask for by id or model for last
+    pinned_trucks = {job['truck_id'] for job in pending}
+    pinned_drivers = {job['driver_id'] for job in pending}
+    demand = defaultdict(int)
+    for job in pending:
+        demand[job['truck_model']] += 1
+    scarcity = {model: demand[model] / len(pool) for model, pool in truck_pools.items() if model is not None}
+
+    def truck_rank(key, truck_id):
+        return truck_id in pinned_trucks, scarcity[truck_models[truck_id]] if key is None else 0, truck_id
+
+    def driver_rank(key, driver_id):
+        return driver_id in pinned_drivers, driver_id
+
+    active = sorted(pending, key=lambda job: (job['start'], job['end'], job['index']))
+    while True:
+        trucks, no_truck = sweep(active, truck_pools, lambda job: job['truck_model'], 'truck_id', truck_unfit,
+                                 lambda truck_id: (None, truck_models[truck_id]), truck_rank, truck_timelines)
+        with_truck = [job for job in active if job['index'] in trucks]
+        drivers, no_driver = sweep(with_truck, driver_pools, lambda job: None, 'driver_id', driver_unfit,
+                                   lambda driver_id: (None,), driver_rank, driver_timelines)
+        if not no_driver:
+            for job in active:
+                if job['index'] in no_truck:
+                    results[job['index']] = _unassigned(job, 'truck', no_truck[job['index']])
+            return [(job, trucks[job['index']], drivers[job['index']]) for job in with_truck]
+        for job in with_truck:
+            if job['index'] in no_driver:
+                results[job['index']] = _unassigned(job, 'driver', no_driver[job['index']])
+        active = [job for job in active if job['index'] not in no_driver]
+
+
+def _unassigned(job, resource, reason):
+    pinned = job[f'{resource}_id']
+    if pinned is not None:
+        subject = f"{resource.capitalize()} {pinned}"
+        errors = {
+            'booked': f"{subject} already has an assignment in this window.",
+            'taken': f"{subject} is booked by another job of this dispatch in this window.",
+        }
+    else:
+        if resource == 'driver':
+            kind = 'driver not paired with a truck'
+        else:
+            kind = f"Available {job['truck_model']} truck" if job['truck_model'] else 'Available truck'
+        errors = {
+            'none': f"There is no {kind}.",
+            'booked': f"Every {kind} already has an assignment in this window.",
+            'taken': f"Every {kind} is booked in this window, some by other jobs of this dispatch.",
+        }
+    return {"index": job['index'], "status": "unassigned", "error": errors.get(reason, reason)}
+
+
+def dispatch(payload):
+    """
+    Plans the jobs in a dispatch request and, unless it is a dry run, creates all planned
+    assignments in one transaction. Returns one result dict per job, in order.
+
+    The trucks and drivers a plan picks are locked and the jobs are planned again, until a plan
+    only picks locked ones: that plan was made from timelines no other writer can change before
+    this transaction commits. Locks only accumulate, so the loop ends; usually the second plan
+    picks the same trucks and drivers as the first.
+    """
+    jobs, results, dry_run = parse_dispatch(payload)
+    planned = plan(jobs, results)
+    locked_trucks, locked_drivers = set(), set()
+    while not dry_run:
+        trucks = {truck_id for _, truck_id, _ in planned} - locked_trucks
+        drivers = {driver_id for _, _, driver_id in planned} - locked_drivers
+        if not trucks and not drivers:
+            break
+        lock_resources(drivers, trucks)
+        locked_trucks |= trucks
+        locked_drivers |= drivers
+        planned = plan(jobs, results)
+    rows = [{**DEFAULTS[Assignment], "start_date": job['start_date'], "end_date": job['end_date'],
+             "driver_id": driver_id, "truck_id": truck_id} for job, truck_id, driver_id in planned]
+
+    new_ids = [None] * len(rows)
+    if rows and not dry_run:
+        try:
+            statement = insert(Assignment).returning(Assignment.id, sort_by_parameter_order=True)
+            new_ids = [row.id for row in db.session.execute(statement, rows)]
+            # Core writes skip the mapper events, as in bulk.py
+            update_rollup([(None, row) for row in rows], [], {})
+            queue_bulk_changes(Assignment, zip(new_ids, rows), [])
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            raise
+
+    for (job, truck_id, driver_id), row_id in zip(planned, new_ids):
+        result = {"index": job['index'], "status": "planned" if dry_run else "created", "id": row_id,
+                  "driver_id": driver_id, "truck_id": truck_id,
+                  "start_date": job['start_date'].strftime(DATETIME_FORMAT),
+                  "end_date": job['end_date'].strftime(DATETIME_FORMAT) if job['end_date'] else None}
+        if dry_run:
+            del result['id']
+        results[job['index']] = result
+    return results, not dry_run
+
+
+def summarize(results, committed):
+    counts = defaultdict(int)
+    for result in results:
+        counts[result["status"]] += 1
+    return {
+        "committed": committed,
+        "created": counts["created"],
+        "planned": counts["planned"],
+        "unassigned": counts["unassigned"],
+        "errors": counts["error"],
+        "results": results,
+    }
@@ -0,0 +1,27 @@
+from flask import current_app, jsonify
+
+from metrics import timed_serialization
+
+try:
+    import orjson
+except ImportError:  # Optional: falls back to Flask's JSON provider
+    orjson = None
+
+
+def json_response(payload, status=200):
+    """
+    Same bytes as jsonify(payload), encoded with orjson when it is installed.
+    orjson cannot escape non-ASCII or indent, so those cases use Flask's provider.
+    """
+    provider = current_app.json
+    compact = provider.compact if provider.compact is not None else not current_app.debug
+    if orjson is not None and compact and provider.ensure_ascii:
+        option = orjson.OPT_SORT_KEYS if provider.sort_keys else 0
+        with timed_serialization():
+            body = orjson.dumps(payload, option=option | orjson.OPT_APPEND_NEWLINE)
+        if body.isascii():
+            return current_app.response_class(body, status=status, mimetype=provider.mimetype)
+
+    response = jsonify(payload)
+    response.status_code = status
+    return response
@@ -0,0 +1,148 @@
+import sqlite3
+
+from flask import current_app, has_request_context, request
+from flask_sqlalchemy.session import Session
+from sqlalchemy import event, orm
+from sqlalchemy.engine import Engine, make_url
+
+READ_REPLICA = 'replica'
+READ_METHODS = ('GET', 'HEAD')
+
+# PRAGMAs applied to every new SQLite connection; set by configure_engines()
+_sqlite_pragmas = {}
+
+
+def engine_options(url, config):
+    """Pool settings for one database URL. Pre-ping and recycle only matter for server databases."""
+    url = make_url(url)
+    if url.get_backend_name() == 'sqlite' and (url.database in (None, '', ':memory:') or url.query.get('mode') == 'memory'):
+        return {}  # In-memory databases need SQLAlchemy's single shared connection
+
+    options = {
+        "pool_size": config.get('DB_POOL_SIZE', 10),
+        "max_overflow": config.get('DB_MAX_OVERFLOW', 20),
+        "pool_timeout": config.get('DB_POOL_TIMEOUT', 30),
+    }
+    if url.get_backend_name() != 'sqlite':
+        options["pool_recycle"] = config.get('DB_POOL_RECYCLE', 1800)  # Before server-side idle timeouts
+        options["pool_pre_ping"] = config.get('DB_POOL_PRE_PING', True)
+    return options
+
+
+def configure_engines(app):
+    """
+    Fills in SQLALCHEMY_ENGINE_OPTIONS (and a read-replica bind when DATABASE_READ_URL is set)
+    from the app's DB_* / SQLITE_* settings. Call before db.init_app(app).
+    """
+    config = app.config
+    if config.get('SQLALCHEMY_DATABASE_URI'):
+        config['SQLALCHEMY_ENGINE_OPTIONS'] = {
+            **engine_options(config['SQLALCHEMY_DATABASE_URI'], config),
+            **config.get('SQLALCHEMY_ENGINE_OPTIONS', {}),
+        }
+    if config.get('DATABASE_READ_URL'):
+        binds = config.setdefault('SQLALCHEMY_BINDS', {})
+        binds[READ_REPLICA] = {"url": config['DATABASE_READ_URL'],
+                               **engine_options(config['DATABASE_READ_URL'], config)}
+
+    _sqlite_pragmas.clear()
+    _sqlite_pragmas.update({
+        # WAL lets readers run alongside a writer instead of queueing behind its lock
+        "journal_mode": config.get('SQLITE_JOURNAL_MODE', 'WAL'),
+        "synchronous": config.get('SQLITE_SYNCHRONOUS', 'NORMAL'),
+        "cache_size": config.get('SQLITE_CACHE_SIZE', -65536),  # Negative means KiB: 64 MiB per connection
+        "mmap_size": config.get('SQLITE_MMAP_SIZE', 256 * 1024 * 1024),
+        "busy_timeout": config.get('SQLITE_BUSY_TIMEOUT', 5000),
+    })
+
+
+def _is_sqlite(dbapi_connection):
+    # pysqlite connections, or aiosqlite ones wrapped by SQLAlchemy's async adapter
+    return isinstance(dbapi_connection, sqlite3.Connection) or \
+        type(dbapi_connection).__module__ == 'sqlalchemy.dialects.sqlite.aiosqlite'
+
+
+@event.listens_for(Engine, 'connect')
+def _set_sqlite_pragmas(dbapi_connection, connection_record):
+    if not _sqlite_pragmas or not _is_sqlite(dbapi_connection):
+        return
+    cursor = dbapi_connection.cursor()
+    try:
+        for name, value in _sqlite_pragmas.items():
+            try:
+                cursor.execute(f'PRAGMA {name} = {value}')
+            except sqlite3.OperationalError:
+                pass  # e.g. journal_mode on a read-only replica connection
+    finally:
+        cursor.close()
+
+
+ASYNC_DRIVERS = {'sqlite': 'aiosqlite', 'postgresql': 'asyncpg', 'mysql': 'aiomysql'}
+
+
+def async_url(url):
+    """The same database with its asyncio driver, e.g. sqlite:///fleet.db -> sqlite+aiosqlite:///fleet.db."""
+    url = make_url(url)
+    driver = ASYNC_DRIVERS.get(url.get_backend_name())
+    if driver is None or url.get_driver_name() == driver:
+        return url
+    return url.set(drivername=f'{url.get_backend_name()}+{driver}')
+
+
+def reads_from_replica():
+    """True while serving a read-only (GET/HEAD) request and a replica bind is configured."""
+    return (
+        has_request_context()
+        and request.method in READ_METHODS
+        and current_app.config.get('DATABASE_READ_URL') is not None
+    )
+
+
+DEFER_COMMIT = 'defer_commit'
+# Set while rendering a response for the response cache: a cached response outlives replica lag
+READ_PRIMARY = 'read_primary'
+
+
+class DeferredCommitMixin:
+    """
+    While info[DEFER_COMMIT] is set (an atomic /batch, or a request sent with an Idempotency-Key),
+    commit() only flushes, so the caller commits everything once at the end. rollback() and close()
+    do nothing then: handlers use them to release a snapshot or a connection, which would end the
+    caller's transaction. A handler whose own work failed fails the caller, which rolls back instead.
+    """
+
+    def commit(self):
+        if self.info.get(DEFER_COMMIT):
+            self.flush()
+            return
+        super().commit()
+
+    def rollback(self):
+        if self.info.get(DEFER_COMMIT):
+            return
+        super().rollback()
+
+    def close(self):
+        if self.info.get(DEFER_COMMIT):
+            return
+        super().close()
+
+
+class DeferrableSession(DeferredCommitMixin, orm.Session):
+    """Plain session honouring DEFER_COMMIT; the sync side of the ASGI app's AsyncSession."""
+
+
+class RoutingSession(DeferredCommitMixin, Session):
+    """
+    Sends reads made while serving GET/HEAD requests to the read-replica bind; everything else to the primary.
+    Reads stay on the primary while info[DEFER_COMMIT] is set, so a deferred transaction sees its own
+    writes, and while info[READ_PRIMARY] is set.
+    """
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if bind is None and not self._flushing and not getattr(clause, 'is_dml', False) \
+                and not self.info.get(DEFER_COMMIT) and not self.info.get(READ_PRIMARY) and reads_from_replica():
+            engine = self._db.engines.get(READ_REPLICA)
+            if engine is not None:
+                return engine
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
@@ -0,0 +1,100 @@
+import csv
+import heapq
+import io
+import json
+
+from flask import Response, stream_with_context
+
+from database import db
+from models import Assignment
+from pagination import DATETIME_FORMAT, QueryParamError, apply_filters, model_class, parse_int
+
+DEFAULT_CHUNK_SIZE = 1000
+MAX_CHUNK_SIZE = 10000
+
+# Exported columns, in the same order and shape as Assignment.to_dict()
+EXPORT_COLUMNS = {
+    Assignment: ['id', 'start_date', 'end_date', 'status', 'driver_id', 'truck_id', 'version'],
+}
+
+CONTENT_TYPES = {
+    'ndjson': 'application/x-ndjson',
+    'csv': 'text/csv',
+}
+
+
+def iter_rows(model, args, chunk_size):
+    """
+    Yields filtered rows as dicts, reading the table in id-ordered keyset chunks
+    of plain column tuples so memory is bounded by chunk size, not table size.
+    """
+    names = EXPORT_COLUMNS[model_class(model)]
+    columns = [getattr(model, name) for name in names]
+    last_id = 0
+
+    while True:
+        query = apply_filters(db.session.query(*columns), model, args)
+        chunk = query.filter(model.id > last_id).order_by(model.id).limit(chunk_size).all()
+        if not chunk:
+            return
+
+        for row in chunk:
+            yield {
+                name: value.strftime(DATETIME_FORMAT) if hasattr(value, 'strftime') else value
+                for name, value in zip(names, row)
+            }
+
+        last_id = chunk[-1][0]
+        db.session.rollback()  # Release the read transaction between chunks
+
+
+def ndjson_lines(rows):
+    for row in rows:
+        yield json.dumps(row) + '\n'
+
+
+def csv_lines(rows, fieldnames):
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=fieldnames)
+    writer.writeheader()
+    for row in rows:
+        writer.writerow(row)
+        if buffer.tell() >= 64 * 1024:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue()
+
+
+def export_response(model, args, filename, sources=()):
+    """
+    Builds a streaming NDJSON or CSV response for the filtered model table. Rows of the
+    extra `sources` (tables with the same columns, such as assignment history) are merged
+    in by id.
+    """
+    fmt = args.get('format', 'ndjson')
+    if fmt not in CONTENT_TYPES:
+        raise QueryParamError(f"Unsupported export format '{fmt}'. Use ndjson or csv.")
+
+    chunk_size = parse_int(args.get('chunk_size', DEFAULT_CHUNK_SIZE), 'chunk_size')
+    if chunk_size < 1:
+        raise QueryParamError("'chunk_size' must be a positive integer.")
+    chunk_size = min(chunk_size, MAX_CHUNK_SIZE)
+
+    # Parse filters up front so bad parameters fail with a 400 before streaming starts
+    apply_filters(db.session.query(model.id), model, args)
+
+    rows = iter_rows(model, args, chunk_size)
+    if sources:
+        streams = [iter_rows(source, args, chunk_size) for source in sources]
+        rows = heapq.merge(rows, *streams, key=lambda row: row['id'])
+    if fmt == 'csv':
+        body = csv_lines(rows, EXPORT_COLUMNS[model])
+    else:
+        body = ndjson_lines(rows)
+
+    return Response(
+        stream_with_context(body),
+        mimetype=CONTENT_TYPES[fmt],
+        headers={"Content-Disposition": f"attachment; filename={filename}.{fmt}"}
+    )
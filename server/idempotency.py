@@ -0,0 +1,246 @@
+import hashlib
+import threading
+from collections import OrderedDict, namedtuple
+from datetime import datetime, timedelta
+from functools import wraps
+
+from flask import current_app, make_response, request, session
+from sqlalchemy import delete, insert, select, update
+from sqlalchemy.exc import IntegrityError
+
+from database import db
+from engine_profile import DEFER_COMMIT
+from models import IdempotencyKey
+
+IDEMPOTENCY_HEADER = 'Idempotency-Key'
+REPLAYED_HEADER = 'Idempotent-Replayed'
+MAX_KEY_LENGTH = 255
+IN_PROGRESS_MESSAGE = "A request with this Idempotency-Key is still in progress; retry shortly."
+MISMATCH_MESSAGE = "This Idempotency-Key was already used for a different request."
+
+# A key this request holds until its response is stored, and a stored response
+Claim = namedtuple('Claim', 'key request_hash expires_at')
+Outcome = namedtuple('Outcome', 'request_hash status_code content_type body expires_at')
+
+
+class IdempotencyError(Exception):
+    """Raised when an Idempotency-Key can't be used: malformed, in use, or reused for another request."""
+
+    def __init__(self, message, status):
+        self.status = status
+        super().__init__(message)
+
+    def to_dict(self):
+        return {"error": str(self)}
+
+
+class OutcomeCache:
+    """
+    Bounded LRU of stored outcomes in front of the idempotency_keys table. Outcomes never
+    change once stored, so every process can cache them until they expire.
+    """
+
+    def __init__(self, max_entries=10000):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.replays = 0
+
+    def configure(self, max_entries):
+        with self._lock:
+            self.max_entries = max_entries
+            self._entries.clear()
+
+    def get(self, key, now=None):
+        with self._lock:
+            outcome = self._entries.get(key)
+            if outcome is not None and outcome.expires_at <= (now or datetime.now()):
+                del self._entries[key]
+                outcome = None
+            if outcome is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return outcome
+
+    def put(self, key, outcome):
+        if not self.max_entries:
+            return
+        with self._lock:
+            self._entries[key] = outcome
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def record_replay(self):
+        with self._lock:
+            self.replays += 1
+
+    def stats(self):
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "replays": self.replays,
+            }
+
+
+outcome_cache = OutcomeCache()
+
+
+def init_idempotency(app):
+    outcome_cache.configure(app.config.get('IDEMPOTENCY_CACHE_SIZE', 10000))
+
+
+def identify(header, user_id, method, path, query_string, body):
+    """
+    (key, request hash) for a request carrying an Idempotency-Key. Keys are scoped to the user,
+    method and path; the hash covers the query string and body, so a key can't be reused for
+    a different request.
+    """
+    header = header.strip()
+    if not header or len(header) > MAX_KEY_LENGTH:
+        raise IdempotencyError(f"Idempotency-Key must be 1 to {MAX_KEY_LENGTH} characters.", 400)
+    key = hashlib.sha256(f"{user_id}|{method}|{path}|{header}".encode()).hexdigest()
+    request_hash = hashlib.sha256(query_string + b'?' + body).hexdigest()
+    return key, request_hash
+
+
+def begin(db_session, key, request_hash, ttl, claim_timeout, now=None):
+    """
+    Returns the stored Outcome for `key`, or claims the key for this request and returns a Claim
+    (the caller commits it). A claim left behind by a request that never finished can be taken
+    over after `claim_timeout` seconds; expired keys are reused.
+    Raises IdempotencyError while another request holds the key, or if it was used for another request.
+    """
+    now = now or datetime.now()
+    table = IdempotencyKey.__table__
+    row = db_session.execute(select(table).where(table.c.key == key)).first()
+    if row is not None and row.expires_at > now:
+        if row.request_hash != request_hash:
+            raise IdempotencyError(MISMATCH_MESSAGE, 422)
+        if row.status_code is not None:
+            return Outcome(row.request_hash, row.status_code, row.content_type, row.body, row.expires_at)
+        if row.created_at > now - timedelta(seconds=claim_timeout):
+            raise IdempotencyError(IN_PROGRESS_MESSAGE, 409)
+
+    claim = Claim(key, request_hash, now + timedelta(seconds=ttl))
+    values = dict(request_hash=request_hash, status_code=None, content_type=None, body=None,
+                  created_at=now, expires_at=claim.expires_at)
+    try:
+        if row is None:
+            db_session.execute(insert(table).values(key=key, **values))
+            claimed = True
+        else:
+            # Unless another request took it over first
+            statement = update(table).where(table.c.key == key, table.c.created_at == row.created_at).values(**values)
+            claimed = db_session.execute(statement).rowcount == 1
+    except IntegrityError:
+        claimed = False
+    if not claimed:
+        db_session.rollback()
+        raise IdempotencyError(IN_PROGRESS_MESSAGE, 409)
+    return claim
+
+
+def finish(db_session, claim, status_code, content_type, body):
+    """
+    Stores the handler's response under the claimed key and returns its Outcome. The caller commits,
+    so a successful handler's writes and its stored response are kept together or not at all. A
+    failed request keeps none of its writes, and server errors aren't stored: the key is released
+    so a retry runs the handler again.
+    """
+    if status_code >= 400:
+        db_session.rollback()
+    if status_code >= 500:
+        release(db_session, claim.key)
+        return None
+    table = IdempotencyKey.__table__
+    db_session.execute(
+        update(table).where(table.c.key == claim.key)
+        .values(status_code=status_code, content_type=content_type, body=body)
+    )
+    return Outcome(claim.request_hash, status_code, content_type, body, claim.expires_at)
+
+
+def release(db_session, key):
+    """Deletes a claim whose handler failed (the caller commits)."""
+    db_session.rollback()
+    table = IdempotencyKey.__table__
+    db_session.execute(delete(table).where(table.c.key == key))
+
+
+def replay(outcome, request_hash):
+    """The stored response as a (body, status, headers) tuple."""
+    if outcome.request_hash != request_hash:
+        raise IdempotencyError(MISMATCH_MESSAGE, 422)
+    outcome_cache.record_replay()
+    return outcome.body, outcome.status_code, {'Content-Type': outcome.content_type, REPLAYED_HEADER: 'true'}
+
+
+def idempotent(f):
+    """
+    Idempotency-Key support for POST handlers. The first request with a key runs the handler and
+    stores its response; retries with the same key get that response replayed without running the
+    handler again. Requests without the header run as usual.
+    Place below the auth decorators and above @invalidates.
+    """
+    @wraps(f)
+    def decorated(*args, **kwargs):
+        header = request.headers.get(IDEMPOTENCY_HEADER)
+        if header is None:
+            return f(*args, **kwargs)
+
+        key, request_hash = identify(header, session.get('user_id'), request.method, request.path,
+                                     request.query_string, request.get_data())
+        stored = outcome_cache.get(key) or begin(
+            db.session, key, request_hash,
+            current_app.config['IDEMPOTENCY_KEY_TTL_SECONDS'], current_app.config['IDEMPOTENCY_CLAIM_TIMEOUT_SECONDS'],
+        )
+        if isinstance(stored, Outcome):
+            outcome_cache.put(key, stored)
+            return replay(stored, request_hash)
+        db.session.commit()  # Retries see the key as in progress from here on
+
+        # The handler's commits only flush, so its writes commit with the stored response below.
+        # A crash before that commit keeps neither, and a retry after the claim timeout runs again.
+        try:
+            db.session.info[DEFER_COMMIT] = True
+            try:
+                response = make_response(f(*args, **kwargs))
+            finally:
+                db.session.info.pop(DEFER_COMMIT, None)
+            outcome = finish(db.session, stored, response.status_code, response.content_type, response.get_data())
+            db.session.commit()
+        except Exception:
+            release(db.session, key)
+            db.session.commit()
+            raise
+        if outcome is not None:
+            outcome_cache.put(key, outcome)
+        return response
+    return decorated
+
+
+def purge_expired(chunk_size=5000, now=None):
+    """Deletes expired idempotency keys, one chunk per transaction. Returns the number deleted."""
+    now = now or datetime.now()
+    table = IdempotencyKey.__table__
+    purged = 0
+    while True:
+        keys = db.session.execute(
+            select(table.c.key).where(table.c.expires_at <= now).limit(chunk_size)
+        ).scalars().all()
+        if not keys:
+            break
+        db.session.execute(delete(table).where(table.c.key.in_(keys)))
+        db.session.commit()
+        purged += len(keys)
+    return purged
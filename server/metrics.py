@@ -0,0 +1,232 @@
+import hmac
+import logging
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+
+from flask import current_app, g, has_request_context, request
+from flask.json.provider import DefaultJSONProvider
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from sqlalchemy.engine.interfaces import ExecuteStyle
+
+from auth import principal_cache
+from passwords import password_hasher
+from response_cache import response_cache
+from idempotency import outcome_cache
+
+logger = logging.getLogger(__name__)
+
+# Seconds; roughly Prometheus' defaults, extended down for per-statement SQL timings
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+class Histogram:
+    """Prometheus-style histogram: cumulative bucket counts, sum and count per label set."""
+
+    def __init__(self, name, help, buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.help = help
+        self.buckets = buckets
+        self._series = {}
+
+    def observe(self, labels, value):
+        series = self._series.get(labels)
+        if series is None:
+            series = self._series[labels] = [[0] * len(self.buckets), 0.0, 0]
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                series[0][i] += 1
+                break
+        series[1] += value
+        series[2] += 1
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        for labels, (counts, total, count) in sorted(self._series.items()):
+            cumulative = 0
+            for bound, n in zip(self.buckets, counts):
+                cumulative += n
+                lines.append(f'{self.name}_bucket{_labels(labels, le=repr(bound))} {cumulative}')
+            lines.append(f'{self.name}_bucket{_labels(labels, le="+Inf")} {count}')
+            lines.append(f'{self.name}_sum{_labels(labels)} {total:.6f}')
+            lines.append(f'{self.name}_count{_labels(labels)} {count}')
+        return lines
+
+
+class CounterMetric:
+    def __init__(self, name, help):
+        self.name = name
+        self.help = help
+        self._series = Counter()
+
+    def inc(self, labels, value=1):
+        self._series[labels] += value
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        for labels, value in sorted(self._series.items()):
+            lines.append(f'{self.name}{_labels(labels)} {value:g}')
+        return lines
+
+
+def _labels(labels, **extra):
+    pairs = list(labels) + list(extra.items())
+    if not pairs:
+        return ''
+    escaped = (f'{k}="{str(v).replace(chr(92), chr(92) * 2).replace(chr(34), chr(92) + chr(34))}"' for k, v in pairs)
+    return '{' + ','.join(escaped) + '}'
+
+
+class Metrics:
+    """In-process request and SQL metrics, labelled by method and route pattern (never the raw path)."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.requests = CounterMetric('fleet_http_requests_total', 'Requests handled, by route and status code.')
+        self.latency = Histogram('fleet_http_request_duration_seconds', 'Request latency, by route.')
+        self.sql_time = Histogram('fleet_sql_duration_seconds', 'Total SQL time per request, by route.')
+        self.serialize_time = Histogram('fleet_serialization_duration_seconds', 'JSON encoding time per request, by route.')
+        self.statements = CounterMetric('fleet_sql_statements_total', 'SQL statements executed, by route.')
+        self.slow_queries = CounterMetric('fleet_sql_slow_queries_total', 'Statements slower than SLOW_QUERY_MS, by route.')
+        self.n_plus_one = CounterMetric('fleet_n_plus_one_total',
+                                        'Requests that repeated one statement N_PLUS_ONE_THRESHOLD times or more, by route.')
+
+    def record(self, labels, status, seconds, stats):
+        with self._lock:
+            self.requests.inc(labels + (('status', str(status)),))
+            self.latency.observe(labels, seconds)
+            self.sql_time.observe(labels, stats['sql_seconds'])
+            self.serialize_time.observe(labels, stats['serialize_seconds'])
+            self.statements.inc(labels, stats['statements'])
+            if stats['slow_queries']:
+                self.slow_queries.inc(labels, stats['slow_queries'])
+            if stats['n_plus_one']:
+                self.n_plus_one.inc(labels)
+
+    def render(self):
+        with self._lock:
+            lines = []
+            for metric in (self.requests, self.latency, self.sql_time, self.serialize_time,
+                           self.statements, self.slow_queries, self.n_plus_one):
+                lines.extend(metric.render())
+
+        # Cache counters the app already keeps
+        for prefix, stats in (('fleet_principal_cache', principal_cache.stats()),
+                              ('fleet_response_cache', response_cache.stats()),
+                              ('fleet_idempotency_cache', outcome_cache.stats())):
+            for key in ('hits', 'misses', 'evictions', 'invalidations', 'not_modified', 'replays'):
+                if key in stats:
+                    lines += [f"# TYPE {prefix}_{key}_total counter", f"{prefix}_{key}_total {stats[key]}"]
+            size = stats.get('size', stats.get('entries'))
+            lines += [f"# TYPE {prefix}_entries gauge", f"{prefix}_entries {size}"]
+
+        hasher = password_hasher.stats()
+        for key in ('hashes', 'verifications', 'rehashes', 'rejected'):
+            lines += [f"# TYPE fleet_password_{key}_total counter", f"fleet_password_{key}_total {hasher[key]}"]
+        return '\n'.join(lines) + '\n'
+
+
+metrics = Metrics()
+
+
+def _request_stats():
+    if 'request_stats' not in g:
+        g.request_stats = {
+            "statements": 0, "sql_seconds": 0.0, "serialize_seconds": 0.0,
+            "slow_queries": 0, "n_plus_one": False, "seen": Counter(),
+        }
+    return g.request_stats
+
+
+@contextmanager
+def timed_serialization():
+    """Adds the enclosed block's duration to the request's serialization time."""
+    began = time.perf_counter()
+    try:
+        yield
+    finally:
+        if has_request_context():
+            _request_stats()['serialize_seconds'] += time.perf_counter() - began
+
+
+class TimedJSONProvider(DefaultJSONProvider):
+    """Flask's JSON provider, with jsonify's encoding time counted as serialization."""
+
+    def response(self, *args, **kwargs):
+        with timed_serialization():
+            return super().response(*args, **kwargs)
+
+
+# SQL: listen on every Engine so read replicas or extra binds are covered too
+
+@event.listens_for(Engine, 'before_cursor_execute')
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault('query_started', []).append(time.perf_counter())
+
+@event.listens_for(Engine, 'after_cursor_execute')
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    started = conn.info.get('query_started')
+    if not started:
+        return
+    elapsed = time.perf_counter() - started.pop()
+    if not has_request_context():
+        return
+
+    stats = _request_stats()
+    stats['statements'] += 1
+    stats['sql_seconds'] += elapsed
+    if getattr(context, 'execute_style', None) is not ExecuteStyle.INSERTMANYVALUES:
+        stats['seen'][statement] += 1  # Batches of one executemany() aren't an N+1
+
+    config = current_app.config
+    if elapsed * 1000 >= config.get('SLOW_QUERY_MS', 200):
+        stats['slow_queries'] += 1
+        logger.warning("Slow query (%.1f ms) in %s %s: %s", elapsed * 1000, request.method, _route(),
+                       ' '.join(statement.split()))
+
+    threshold = config.get('N_PLUS_ONE_THRESHOLD', 10)
+    if stats['seen'][statement] == threshold:
+        stats['n_plus_one'] = True
+        logger.warning("Possible N+1 in %s %s: statement repeated %d times: %s", request.method, _route(),
+                       threshold, ' '.join(statement.split()))
+
+
+def _route():
+    return request.url_rule.rule if request.url_rule is not None else '<unmatched>'
+
+
+def init_metrics(app):
+    app.json = TimedJSONProvider(app)
+
+    @app.before_request
+    def start_timer():
+        g.request_started = time.perf_counter()
+
+    @app.after_request
+    def record_request(response):
+        if 'request_started' not in g:
+            return response
+        elapsed = time.perf_counter() - g.request_started
+        stats = _request_stats()
+        metrics.record((('method', request.method), ('route', _route())), response.status_code, elapsed, stats)
+
+        if app.config.get('SERVER_TIMING'):
+            sql_ms, serialize_ms = stats['sql_seconds'] * 1000, stats['serialize_seconds'] * 1000
+            response.headers['Server-Timing'] = ', '.join([
+                f'db;dur={sql_ms:.2f};desc="{stats["statements"]} queries"',
+                f'serialize;dur={serialize_ms:.2f}',
+                f'app;dur={max(0.0, elapsed * 1000 - sql_ms - serialize_ms):.2f}',
+                f'total;dur={elapsed * 1000:.2f}',
+            ])
+        return response
+
+
+def metrics_authorized():
+    """/metrics is open unless METRICS_TOKEN is set, in which case it needs `Authorization: Bearer <token>`."""
+    token = current_app.config.get('METRICS_TOKEN')
+    if not token:
+        return True
+    supplied = request.headers.get('Authorization', '')
+    return hmac.compare_digest(supplied.encode(), f'Bearer {token}'.encode())
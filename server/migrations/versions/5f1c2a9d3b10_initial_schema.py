@@ -0,0 +1,75 @@
+"""initial schema
+
+Revision ID: 5f1c2a9d3b10
+Revises: 
+Create Date: 2025-03-23 10:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '5f1c2a9d3b10'
+down_revision = None
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('users',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('username', sa.String(length=50), nullable=False),
+    sa.Column('email', sa.String(length=100), nullable=False),
+    sa.Column('password_hash', sa.String(length=128), nullable=False),
+    sa.Column('role', sa.String(length=50), nullable=False),
+    sa.Column('created_at', sa.DateTime(), server_default=sa.text('(CURRENT_TIMESTAMP)'), nullable=True),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('email'),
+    sa.UniqueConstraint('username')
+    )
+    op.create_table('drivers',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('name', sa.String(length=100), nullable=False),
+    sa.Column('license_number', sa.String(length=50), nullable=False),
+    sa.Column('contact_info', sa.String(length=100), nullable=False),
+    sa.Column('assigned_truck_id', sa.Integer(), nullable=True),
+    sa.Column('created_at', sa.DateTime(), server_default=sa.text('(CURRENT_TIMESTAMP)'), nullable=True),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('license_number')
+    )
+    op.create_table('trucks',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('plate_number', sa.String(length=50), nullable=False),
+    sa.Column('model', sa.String(length=100), nullable=False),
+    sa.Column('status', sa.String(length=50), nullable=False),
+    sa.Column('current_driver_id', sa.Integer(), nullable=True),
+    sa.Column('created_at', sa.DateTime(), server_default=sa.text('(CURRENT_TIMESTAMP)'), nullable=True),
+    sa.ForeignKeyConstraint(['current_driver_id'], ['drivers.id'], ),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('plate_number')
+    )
+    # drivers <-> trucks reference each other, so this key is added once both tables exist
+    with op.batch_alter_table('drivers') as batch_op:
+        batch_op.create_foreign_key('fk_drivers_assigned_truck_id_trucks', 'trucks', ['assigned_truck_id'], ['id'])
+
+    op.create_table('assignments',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('start_date', sa.DateTime(), nullable=False),
+    sa.Column('end_date', sa.DateTime(), nullable=True),
+    sa.Column('status', sa.String(length=50), nullable=False),
+    sa.Column('driver_id', sa.Integer(), nullable=False),
+    sa.Column('truck_id', sa.Integer(), nullable=False),
+    sa.ForeignKeyConstraint(['driver_id'], ['drivers.id'], ),
+    sa.ForeignKeyConstraint(['truck_id'], ['trucks.id'], ),
+    sa.PrimaryKeyConstraint('id')
+    )
+
+
+def downgrade():
+    op.drop_table('assignments')
+    with op.batch_alter_table('drivers') as batch_op:
+        batch_op.drop_constraint('fk_drivers_assigned_truck_id_trucks', type_='foreignkey')
+    op.drop_table('trucks')
+    op.drop_table('drivers')
+    op.drop_table('users')
@@ -0,0 +1,42 @@
+"""add indexes on foreign keys and status columns
+
+Revision ID: a3e7c41d9b22
+Revises: 5f1c2a9d3b10
+Create Date: 2026-10-18 09:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'a3e7c41d9b22'
+down_revision = '5f1c2a9d3b10'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Foreign keys: cascades from Driver.assignments / Truck.assignments and
+    # driver_id/truck_id filters paged in id order.
+    op.create_index('ix_assignments_driver_id', 'assignments', ['driver_id'], unique=False)
+    op.create_index('ix_assignments_truck_id', 'assignments', ['truck_id'], unique=False)
+    # Per-resource periods: overlap checks, availability anti-joins and date-ranged filters
+    op.create_index('ix_assignments_truck_period', 'assignments', ['truck_id', 'start_date', 'end_date'], unique=False)
+    op.create_index('ix_assignments_driver_period', 'assignments', ['driver_id', 'start_date', 'end_date'], unique=False)
+    # Status filters ordered by start date (e.g. Active assignments, newest first)
+    op.create_index('ix_assignments_status_start', 'assignments', ['status', 'start_date'], unique=False)
+    op.create_index('ix_trucks_status', 'trucks', ['status'], unique=False)
+    op.create_index('ix_trucks_current_driver_id', 'trucks', ['current_driver_id'], unique=False)
+    op.create_index('ix_drivers_assigned_truck_id', 'drivers', ['assigned_truck_id'], unique=False)
+
+
+def downgrade():
+    op.drop_index('ix_drivers_assigned_truck_id', table_name='drivers')
+    op.drop_index('ix_trucks_current_driver_id', table_name='trucks')
+    op.drop_index('ix_trucks_status', table_name='trucks')
+    op.drop_index('ix_assignments_status_start', table_name='assignments')
+    op.drop_index('ix_assignments_driver_period', table_name='assignments')
+    op.drop_index('ix_assignments_truck_period', table_name='assignments')
+    op.drop_index('ix_assignments_truck_id', table_name='assignments')
+    op.drop_index('ix_assignments_driver_id', table_name='assignments')
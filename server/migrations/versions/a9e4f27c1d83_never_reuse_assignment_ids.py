@@ -0,0 +1,42 @@
+"""never reuse assignment ids on sqlite
+
+Revision ID: a9e4f27c1d83
+Revises: f3c8a1d6b27e
+Create Date: 2026-10-19 09:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'a9e4f27c1d83'
+down_revision = 'f3c8a1d6b27e'
+branch_labels = None
+depends_on = None
+
+
+def _history_tables():
+    return [name for name, in op.get_bind().execute(sa.text('SELECT table_name FROM assignment_history_partitions'))]
+
+
+def upgrade():
+    # Server databases draw ids from sequences, which never hand one out twice
+    if op.get_bind().dialect.name != 'sqlite':
+        return
+    with op.batch_alter_table('assignments', recreate='always', table_kwargs={'sqlite_autoincrement': True}):
+        pass
+
+    # Start after every id in use, archived ones included
+    bind = op.get_bind()
+    highest = max([bind.execute(sa.text(f'SELECT max(id) FROM "{name}"')).scalar() or 0
+                   for name in ['assignments'] + _history_tables()])
+    bind.execute(sa.text("DELETE FROM sqlite_sequence WHERE name = 'assignments'"))
+    bind.execute(sa.text("INSERT INTO sqlite_sequence (name, seq) VALUES ('assignments', :seq)"), {"seq": highest})
+
+
+def downgrade():
+    if op.get_bind().dialect.name != 'sqlite':
+        return
+    with op.batch_alter_table('assignments', recreate='always', table_kwargs={'sqlite_autoincrement': False}):
+        pass
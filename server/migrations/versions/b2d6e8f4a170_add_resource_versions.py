@@ -0,0 +1,29 @@
+"""add resource versions
+
+Revision ID: b2d6e8f4a170
+Revises: a9e4f27c1d83
+Create Date: 2026-10-20 09:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b2d6e8f4a170'
+down_revision = 'a9e4f27c1d83'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    table = op.create_table('resource_versions',
+    sa.Column('resource', sa.String(length=20), nullable=False),
+    sa.Column('version', sa.Integer(), nullable=False),
+    sa.PrimaryKeyConstraint('resource')
+    )
+    op.bulk_insert(table, [{'resource': r, 'version': 0} for r in ('drivers', 'trucks', 'assignments')])
+
+
+def downgrade():
+    op.drop_table('resource_versions')
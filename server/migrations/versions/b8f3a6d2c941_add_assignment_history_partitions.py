@@ -0,0 +1,32 @@
+"""add assignment history partitions registry
+
+Revision ID: b8f3a6d2c941
+Revises: e4b9d2a7c315
+Create Date: 2026-10-18 16:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b8f3a6d2c941'
+down_revision = 'e4b9d2a7c315'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('assignment_history_partitions',
+    sa.Column('table_name', sa.String(length=64), nullable=False),
+    sa.Column('period_start', sa.DateTime(), nullable=False),
+    sa.Column('period_end', sa.DateTime(), nullable=False),
+    sa.Column('max_end_date', sa.DateTime(), nullable=True),
+    sa.Column('row_count', sa.Integer(), nullable=False),
+    sa.PrimaryKeyConstraint('table_name')
+    )
+    # The assignments_history_* tables themselves are created on demand by flask archive-assignments
+
+
+def downgrade():
+    op.drop_table('assignment_history_partitions')
@@ -0,0 +1,41 @@
+"""add truck status periods
+
+Revision ID: c4e1f7a9d362
+Revises: b2d6e8f4a170
+Create Date: 2026-10-21 09:00:00.000000
+
+"""
+from datetime import datetime
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c4e1f7a9d362'
+down_revision = 'b2d6e8f4a170'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    table = op.create_table('truck_status_periods',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('truck_id', sa.Integer(), nullable=False),
+    sa.Column('status', sa.String(length=50), nullable=False),
+    sa.Column('start_date', sa.DateTime(), nullable=False),
+    sa.Column('end_date', sa.DateTime(), nullable=True),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('ix_truck_status_periods_truck_end', 'truck_status_periods', ['truck_id', 'end_date'], unique=False)
+    op.create_index('ix_truck_status_periods_status_start', 'truck_status_periods', ['status', 'start_date'], unique=False)
+    # Earlier status changes weren't recorded, so each truck's history starts with its current status, now
+    now = datetime.now().replace(microsecond=0)
+    trucks = op.get_bind().execute(sa.text('SELECT id, status FROM trucks')).all()
+    op.bulk_insert(table, [{'truck_id': row.id, 'status': row.status, 'start_date': now} for row in trucks])
+
+
+def downgrade():
+    op.drop_index('ix_truck_status_periods_status_start', table_name='truck_status_periods')
+    op.drop_index('ix_truck_status_periods_truck_end', table_name='truck_status_periods')
+    op.drop_table('truck_status_periods')
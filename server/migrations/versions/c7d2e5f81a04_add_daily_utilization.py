@@ -0,0 +1,35 @@
+"""add daily utilization rollup
+
+Revision ID: c7d2e5f81a04
+Revises: a3e7c41d9b22
+Create Date: 2026-10-18 11:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c7d2e5f81a04'
+down_revision = 'a3e7c41d9b22'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('daily_utilization',
+    sa.Column('day', sa.Date(), nullable=False),
+    sa.Column('truck_id', sa.Integer(), nullable=False),
+    sa.Column('driver_id', sa.Integer(), nullable=False),
+    sa.Column('assigned_seconds', sa.Integer(), nullable=False),
+    sa.PrimaryKeyConstraint('day', 'truck_id', 'driver_id')
+    )
+    op.create_index('ix_daily_utilization_truck_day', 'daily_utilization', ['truck_id', 'day', 'assigned_seconds'], unique=False)
+    op.create_index('ix_daily_utilization_driver_day', 'daily_utilization', ['driver_id', 'day', 'assigned_seconds'], unique=False)
+    # Backfill existing data afterwards with: flask rebuild-utilization
+
+
+def downgrade():
+    op.drop_index('ix_daily_utilization_driver_day', table_name='daily_utilization')
+    op.drop_index('ix_daily_utilization_truck_day', table_name='daily_utilization')
+    op.drop_table('daily_utilization')
@@ -0,0 +1,32 @@
+"""add row versions for optimistic concurrency
+
+Revision ID: d1a7c3e9f052
+Revises: b8f3a6d2c941
+Create Date: 2026-10-18 18:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'd1a7c3e9f052'
+down_revision = 'b8f3a6d2c941'
+branch_labels = None
+depends_on = None
+
+
+def _history_tables():
+    """Archived assignment tables created so far; they keep the same columns as assignments."""
+    return [name for name, in op.get_bind().execute(sa.text('SELECT table_name FROM assignment_history_partitions'))]
+
+
+def upgrade():
+    for table in ['drivers', 'trucks', 'assignments'] + _history_tables():
+        op.add_column(table, sa.Column('version', sa.Integer(), server_default='1', nullable=False))
+
+
+def downgrade():
+    for table in ['drivers', 'trucks', 'assignments'] + _history_tables():
+        with op.batch_alter_table(table) as batch_op:
+            batch_op.drop_column('version')
@@ -0,0 +1,34 @@
+"""add search terms index
+
+Revision ID: e4b9d2a7c315
+Revises: c7d2e5f81a04
+Create Date: 2026-10-18 13:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e4b9d2a7c315'
+down_revision = 'c7d2e5f81a04'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('search_terms',
+    sa.Column('resource', sa.String(length=20), nullable=False),
+    sa.Column('ref_id', sa.Integer(), nullable=False),
+    sa.Column('term', sa.String(length=100), nullable=False),
+    sa.Column('weight', sa.Integer(), nullable=False),
+    sa.PrimaryKeyConstraint('resource', 'ref_id', 'term')
+    )
+    op.create_index('ix_search_terms_lookup', 'search_terms', ['resource', 'term', 'ref_id', 'weight'], unique=False,
+                    postgresql_ops={'term': 'text_pattern_ops'})
+    # Backfill existing data afterwards with: flask rebuild-search-index
+
+
+def downgrade():
+    op.drop_index('ix_search_terms_lookup', table_name='search_terms')
+    op.drop_table('search_terms')
@@ -2,4 +2,9 @@
 from .drivers import Driver
 from .trucks import Truck
 from .assignments import Assignment
-from .users import User
\ No newline at end of file
+from .users import User
+from .utilization import DailyUtilization, TruckStatusPeriod
+from .search import SearchTerm
+from .archive import AssignmentHistoryPartition
+from .idempotency import IdempotencyKey
+from .versions import ResourceVersion
\ No newline at end of file
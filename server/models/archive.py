@@ -0,0 +1,30 @@
+from sqlalchemy_serializer import SerializerMixin
+from database import db
+
+class AssignmentHistoryPartition(db.Model, SerializerMixin):
+    """
+    AssignmentHistoryPartition Model: Registry of the history tables archived assignments move to.
+    - One row per history table (`assignments_history_<period>`), covering assignments that
+      started within [period_start, period_end).
+    - History tables are created by `flask archive-assignments`, not by migrations.
+    """
+    __tablename__ = 'assignment_history_partitions'
+
+    table_name = db.Column(db.String(64), primary_key=True)  # Name of the history table
+    period_start = db.Column(db.DateTime, nullable=False)  # First start_date the table covers
+    period_end = db.Column(db.DateTime, nullable=False)  # start_date the next period begins at
+    max_end_date = db.Column(db.DateTime, nullable=True)  # Latest end_date archived into the table
+    row_count = db.Column(db.Integer, nullable=False, default=0)  # Assignments archived into the table
+
+    def to_dict(self):
+        return {
+            "table_name": self.table_name,
+            "period_start": self.period_start.strftime('%Y-%m-%d %H:%M:%S'),
+            "period_end": self.period_end.strftime('%Y-%m-%d %H:%M:%S'),
+            "max_end_date": self.max_end_date.strftime('%Y-%m-%d %H:%M:%S') if self.max_end_date else None,
+            "row_count": self.row_count
+        }
+
+    def __repr__(self):
+        """Returns a readable string representation of an AssignmentHistoryPartition object."""
+        return f"<AssignmentHistoryPartition {self.table_name} Rows: {self.row_count}>"
@@ -14,8 +14,12 @@ class Driver(db.Model, SerializerMixin):
     name = db.Column(db.String(100), nullable=False)  # Driver's full name
     license_number = db.Column(db.String(50), unique=True, nullable=False)  # Unique license number
     contact_info = db.Column(db.String(100), nullable=False)  # Contact details
-    assigned_truck_id = db.Column(db.Integer, db.ForeignKey('trucks.id'), nullable=True)  # Current truck assignment
+    assigned_truck_id = db.Column(db.Integer, db.ForeignKey('trucks.id'), nullable=True, index=True)  # Current truck assignment
     created_at = db.Column(db.DateTime, server_default=func.now())  # Timestamp when driver record was created
+    version = db.Column(db.Integer, nullable=False, default=1, server_default='1')  # Row version, bumped on every update
+
+    # Updates and deletes run as UPDATE/DELETE ... WHERE id = ? AND version = ?; a stale version raises StaleDataError
+    __mapper_args__ = {'version_id_col': version}
 
     # Relationships
     assignments = db.relationship("Assignment", back_populates="driver", cascade="all, delete-orphan")  
@@ -28,7 +32,8 @@ class Driver(db.Model, SerializerMixin):
             "license_number": self.license_number,
             "contact_info": self.contact_info,
             "assigned_truck_id": self.assigned_truck_id,
-            "created_at": self.created_at.strftime('%Y-%m-%d %H:%M:%S')
+            "created_at": self.created_at.strftime('%Y-%m-%d %H:%M:%S'),
+            "version": self.version
         }
 
     def __repr__(self):
@@ -0,0 +1,31 @@
+from sqlalchemy_serializer import SerializerMixin
+from database import db
+
+class IdempotencyKey(db.Model, SerializerMixin):
+    """
+    IdempotencyKey Model: Stored outcome of a POST sent with an Idempotency-Key header.
+    - One row per (user, method, path, key); retries of the request replay the stored response.
+    - status_code is NULL while the first request is still running.
+    - Rows expire after IDEMPOTENCY_KEY_TTL_SECONDS; `flask purge-idempotency-keys` deletes them.
+    """
+    __tablename__ = 'idempotency_keys'
+
+    key = db.Column(db.String(64), primary_key=True)  # SHA-256 of user id, method, path and the client's key
+    request_hash = db.Column(db.String(64), nullable=False)  # SHA-256 of the query string and body
+    status_code = db.Column(db.Integer, nullable=True)  # Status of the stored response; NULL while in progress
+    content_type = db.Column(db.String(100), nullable=True)  # Content-Type of the stored response
+    body = db.Column(db.LargeBinary, nullable=True)  # Body of the stored response
+    created_at = db.Column(db.DateTime, nullable=False)  # When the key was claimed
+    expires_at = db.Column(db.DateTime, nullable=False, index=True)  # When the key may be purged or reused
+
+    def to_dict(self):
+        return {
+            "key": self.key,
+            "status_code": self.status_code,
+            "created_at": self.created_at.strftime('%Y-%m-%d %H:%M:%S'),
+            "expires_at": self.expires_at.strftime('%Y-%m-%d %H:%M:%S')
+        }
+
+    def __repr__(self):
+        """Returns a readable string representation of an IdempotencyKey object."""
+        return f"<IdempotencyKey {self.key[:12]} Status: {self.status_code}>"
@@ -0,0 +1,33 @@
+from sqlalchemy_serializer import SerializerMixin
+from database import db
+
+class SearchTerm(db.Model, SerializerMixin):
+    """
+    SearchTerm Model: Prefix index for driver and truck search.
+    - One row per normalized word of a searchable field (driver name/license, truck plate/model).
+    - Maintained from driver and truck writes; rebuilt with `flask rebuild-search-index`.
+    - `weight` ranks the field a term came from (0 = identifiers, higher = less specific).
+    """
+    __tablename__ = 'search_terms'
+    __table_args__ = (
+        # Prefix lookups are range scans on (resource, term); PostgreSQL needs pattern ops for LIKE 'x%'
+        db.Index('ix_search_terms_lookup', 'resource', 'term', 'ref_id', 'weight',
+                 postgresql_ops={'term': 'text_pattern_ops'}),
+    )
+
+    resource = db.Column(db.String(20), primary_key=True)  # 'drivers' or 'trucks'
+    ref_id = db.Column(db.Integer, primary_key=True)  # Driver or truck id
+    term = db.Column(db.String(100), primary_key=True)  # Lower-cased word
+    weight = db.Column(db.Integer, nullable=False, default=0)  # Field rank; lower sorts first
+
+    def to_dict(self):
+        return {
+            "resource": self.resource,
+            "ref_id": self.ref_id,
+            "term": self.term,
+            "weight": self.weight
+        }
+
+    def __repr__(self):
+        """Returns a readable string representation of a SearchTerm object."""
+        return f"<SearchTerm {self.resource} {self.ref_id}: {self.term}>"
@@ -1,7 +1,7 @@
 from sqlalchemy_serializer import SerializerMixin
 from sqlalchemy.sql import func
 from database import db
-from werkzeug.security import generate_password_hash, check_password_hash
+from passwords import password_hasher
 
 class User(db.Model, SerializerMixin):
     """
@@ -20,12 +20,18 @@ class User(db.Model, SerializerMixin):
 
     # Password hashing
     def set_password(self, password):
-        """Hashes and sets the user's password."""
-        self.password_hash = generate_password_hash(password)
+        """Hashes and sets the user's password (on the password hashing pool)."""
+        self.password_hash = password_hasher.hash(password)
 
     def check_password(self, password):
-        """Verifies the provided password against the stored hash."""
-        return check_password_hash(self.password_hash, password)
+        """
+        Verifies the provided password against the stored hash. A matching password stored with
+        an outdated hash method is rehashed with the current one; the caller commits the change.
+        """
+        matches, new_hash = password_hasher.verify(self.password_hash, password)
+        if new_hash:
+            self.password_hash = new_hash
+        return matches
 
     def __repr__(self):
         """Returns a readable string representation of a User object."""
@@ -0,0 +1,65 @@
+from sqlalchemy_serializer import SerializerMixin
+from database import db
+
+class DailyUtilization(db.Model, SerializerMixin):
+    """
+    DailyUtilization Model: Daily rollup of assigned time per truck and driver.
+    - One row per (day, truck, driver) holding the seconds assigned that day.
+    - Maintained incrementally from assignment writes; rebuilt with `flask rebuild-utilization`.
+    - Open-ended assignments are not rolled up; analytics adds them live.
+    """
+    __tablename__ = 'daily_utilization'
+    __table_args__ = (
+        db.Index('ix_daily_utilization_truck_day', 'truck_id', 'day', 'assigned_seconds'),
+        db.Index('ix_daily_utilization_driver_day', 'driver_id', 'day', 'assigned_seconds'),
+    )
+
+    day = db.Column(db.Date, primary_key=True)  # Calendar day
+    truck_id = db.Column(db.Integer, primary_key=True)  # Truck assigned that day
+    driver_id = db.Column(db.Integer, primary_key=True)  # Driver assigned that day
+    assigned_seconds = db.Column(db.Integer, nullable=False, default=0)  # Seconds of assignment time within the day
+
+    def to_dict(self):
+        return {
+            "day": self.day.strftime('%Y-%m-%d'),
+            "truck_id": self.truck_id,
+            "driver_id": self.driver_id,
+            "assigned_seconds": self.assigned_seconds
+        }
+
+    def __repr__(self):
+        """Returns a readable string representation of a DailyUtilization object."""
+        return f"<DailyUtilization {self.day} Truck ID: {self.truck_id}, Driver ID: {self.driver_id}>"
+
+
+class TruckStatusPeriod(db.Model, SerializerMixin):
+    """
+    TruckStatusPeriod Model: History of truck statuses as [start_date, end_date) periods.
+    - A new period opens whenever a truck's status changes; the previous one is closed at that moment.
+    - end_date is NULL for each truck's current status.
+    - Lets analytics report time in Maintenance alongside assigned time.
+    """
+    __tablename__ = 'truck_status_periods'
+    __table_args__ = (
+        db.Index('ix_truck_status_periods_truck_end', 'truck_id', 'end_date'),
+        db.Index('ix_truck_status_periods_status_start', 'status', 'start_date'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)  # Unique ID for each period
+    truck_id = db.Column(db.Integer, nullable=False)  # Truck whose status this was
+    status = db.Column(db.String(50), nullable=False)  # Status held during the period (Available/In Use/Maintenance)
+    start_date = db.Column(db.DateTime, nullable=False)  # When the truck took this status
+    end_date = db.Column(db.DateTime, nullable=True)  # When it left it (NULL while current)
+
+    def to_dict(self):
+        return {
+            "id": self.id,
+            "truck_id": self.truck_id,
+            "status": self.status,
+            "start_date": self.start_date.strftime('%Y-%m-%d %H:%M:%S'),
+            "end_date": self.end_date.strftime('%Y-%m-%d %H:%M:%S') if self.end_date else None
+        }
+
+    def __repr__(self):
+        """Returns a readable string representation of a TruckStatusPeriod object."""
+        return f"<TruckStatusPeriod Truck ID: {self.truck_id}, Status: {self.status}, From: {self.start_date}>"
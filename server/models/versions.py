@@ -0,0 +1,34 @@
+from sqlalchemy import event, insert
+from sqlalchemy_serializer import SerializerMixin
+from database import db
+
+# Resources whose GET responses are cached and whose list ETags follow these counters
+CACHED_RESOURCES = ('drivers', 'trucks', 'assignments')
+
+class ResourceVersion(db.Model, SerializerMixin):
+    """
+    ResourceVersion Model: Write counter per API resource, behind the response cache and list ETags.
+    - One row per resource ('drivers', 'trucks', 'assignments').
+    - Incremented in the same transaction as every write to the resource, so all worker processes
+      see the new version exactly when they see the write.
+    """
+    __tablename__ = 'resource_versions'
+
+    resource = db.Column(db.String(20), primary_key=True)  # Resource name as used in the API paths
+    version = db.Column(db.Integer, nullable=False, default=0)  # Number of committed write transactions
+
+    def to_dict(self):
+        return {
+            "resource": self.resource,
+            "version": self.version
+        }
+
+    def __repr__(self):
+        """Returns a readable string representation of a ResourceVersion object."""
+        return f"<ResourceVersion {self.resource} Version: {self.version}>"
+
+
+@event.listens_for(ResourceVersion.__table__, 'after_create')
+def _add_rows(table, connection, **kwargs):
+    # Schemas built with create_all() get the rows the migration inserts
+    connection.execute(insert(table), [{"resource": r, "version": 0} for r in CACHED_RESOURCES])
@@ -0,0 +1,212 @@
+import base64
+import binascii
+import json
+import operator
+from datetime import datetime
+from urllib.parse import urlencode
+
+from flask import request
+from sqlalchemy import inspect, tuple_
+
+from models import Driver, Truck, Assignment
+from encoding import json_response
+
+DATETIME_FORMAT = '%Y-%m-%d %H:%M:%S'
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 1000
+
+
+class QueryParamError(ValueError):
+    """Raised when a list endpoint receives an invalid query parameter."""
+
+
+# Parsers
+
+def parse_int(value, name):
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        raise QueryParamError(f"Invalid integer for '{name}': {value}")
+
+def parse_datetime(value, name):
+    for fmt in (DATETIME_FORMAT, '%Y-%m-%d'):
+        try:
+            return datetime.strptime(value, fmt)
+        except (TypeError, ValueError):
+            continue
+    raise QueryParamError(f"Invalid date for '{name}': {value}. Use YYYY-MM-DD or YYYY-MM-DD HH:MM:SS.")
+
+def parse_str(value, name):
+    return value
+
+
+# Filters: query parameter -> (column, comparison, parser)
+
+FILTERS = {
+    Driver: {
+        'assigned_truck_id': (Driver.assigned_truck_id, operator.eq, parse_int),
+    },
+    Truck: {
+        'status': (Truck.status, operator.eq, parse_str),
+        'model': (Truck.model, operator.eq, parse_str),
+        'current_driver_id': (Truck.current_driver_id, operator.eq, parse_int),
+    },
+    Assignment: {
+        'status': (Assignment.status, operator.eq, parse_str),
+        'driver_id': (Assignment.driver_id, operator.eq, parse_int),
+        'truck_id': (Assignment.truck_id, operator.eq, parse_int),
+        'start_from': (Assignment.start_date, operator.ge, parse_datetime),
+        'start_to': (Assignment.start_date, operator.lt, parse_datetime),
+        'end_from': (Assignment.end_date, operator.ge, parse_datetime),
+        'end_to': (Assignment.end_date, operator.lt, parse_datetime),
+    },
+}
+
+# Sortable columns. Only non-null columns are allowed so keyset comparisons stay total.
+SORTS = {
+    Driver: {'id', 'name', 'created_at'},
+    Truck: {'id', 'plate_number', 'status', 'created_at'},
+    Assignment: {'id', 'start_date', 'status'},
+}
+
+
+def model_class(model):
+    """The mapped class behind a model or an aliased model (such as an assignments history table)."""
+    return inspect(model).mapper.class_
+
+
+def apply_filters(query, model, args):
+    """Pushes the model's supported filter parameters down into the query's WHERE clause."""
+    for name, (column, compare, parser) in FILTERS[model_class(model)].items():
+        value = args.get(name)
+        if value is None or value == '':
+            continue
+        query = query.filter(compare(getattr(model, column.key), parser(value, name)))
+    return query
+
+
+def parse_sort(model, args):
+    """Returns (sort_key, descending) from a `sort` parameter such as `-start_date`."""
+    sort = args.get('sort', 'id')
+    descending = sort.startswith('-')
+    key = sort.lstrip('-')
+    sorts = SORTS[model_class(model)]
+    if key not in sorts:
+        allowed = ', '.join(sorted(sorts))
+        raise QueryParamError(f"Cannot sort by '{key}'. Allowed: {allowed}.")
+    return key, descending
+
+
+def parse_ids(args):
+    """`?ids=1,2,3` as a list of ints in request order (duplicates dropped), or None when absent."""
+    value = args.get('ids')
+    if value is None:
+        return None
+    ids = list(dict.fromkeys(parse_int(v, 'ids') for v in value.split(',') if v.strip()))
+    if not ids:
+        raise QueryParamError("'ids' must list at least one id.")
+    if len(ids) > MAX_PAGE_SIZE:
+        raise QueryParamError(f"Too many ids; the limit is {MAX_PAGE_SIZE}.")
+    return ids
+
+
+def parse_limit(args):
+    limit = parse_int(args.get('limit', DEFAULT_PAGE_SIZE), 'limit')
+    if limit < 1:
+        raise QueryParamError("'limit' must be a positive integer.")
+    return min(limit, MAX_PAGE_SIZE)
+
+
+# Cursors
+
+def encode_cursor(sort_key, value, row_id):
+    if isinstance(value, datetime):
+        value = value.isoformat()
+    raw = json.dumps([sort_key, value, row_id], separators=(',', ':')).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+def decode_cursor(cursor, model, sort_key):
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        key, value, row_id = json.loads(base64.urlsafe_b64decode(padded))
+        column = getattr(model, sort_key, None)  # None for computed keys such as a search rank
+        if key == sort_key and column is not None and column.type.python_type is datetime:
+            value = datetime.fromisoformat(value)
+    except (binascii.Error, ValueError, TypeError):
+        raise QueryParamError("Invalid 'after' cursor.")
+
+    if key != sort_key:
+        raise QueryParamError("The 'after' cursor does not match the requested sort order.")
+    return value, row_id
+
+
+# Keyset pagination
+
+def keyset_query(query, model, args):
+    """
+    Applies filters, a stable (sort_key, id) ordering and the `after` cursor.
+    Returns the ordered query and the sort key so callers can build the next cursor.
+    """
+    sort_key, descending = parse_sort(model, args)
+    query = apply_filters(query, model, args)
+
+    if sort_key == 'id':
+        keys = [model.id]
+    else:
+        keys = [getattr(model, sort_key), model.id]
+
+    after = args.get('after')
+    if after:
+        value, row_id = decode_cursor(after, model, sort_key)
+        position = [row_id] if sort_key == 'id' else [value, row_id]
+        compare = operator.lt if descending else operator.gt
+        if len(keys) == 1:
+            query = query.filter(compare(keys[0], position[0]))
+        else:
+            query = query.filter(compare(tuple_(*keys), tuple_(*position)))
+
+    return query.order_by(*[k.desc() if descending else k.asc() for k in keys]), sort_key
+
+
+def paginate(query, model, args, columns=None):
+    """
+    Fetches one page with LIMIT n+1 and returns (rows, next_cursor).
+    With `columns`, rows are plain tuples of those columns instead of ORM objects;
+    the raw sort key and id are appended after them to build the cursor.
+    """
+    limit = parse_limit(args)
+    query, sort_key = keyset_query(query, model, args)
+    if columns is not None:
+        query = query.with_entities(
+            *columns, getattr(model, sort_key).label('_cursor_key'), model.id.label('_cursor_id')
+        )
+    rows = query.limit(limit + 1).all()
+
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        last = rows[-1]
+        if columns is not None:
+            next_cursor = encode_cursor(sort_key, last._cursor_key, last._cursor_id)
+        else:
+            next_cursor = encode_cursor(sort_key, getattr(last, sort_key), last.id)
+    return rows, next_cursor
+
+
+def next_page_headers(args, base_url, next_cursor):
+    """`X-Next-Cursor` and `Link: rel="next"` headers for a page; none on the last page."""
+    if not next_cursor:
+        return {}
+    args = args.to_dict()
+    args['after'] = next_cursor
+    return {
+        'X-Next-Cursor': next_cursor,
+        'Link': f'<{base_url}?{urlencode(args)}>; rel="next"',
+    }
+
+
+def page_response(items, next_cursor):
+    """JSON list response carrying the next cursor in `X-Next-Cursor` and a `Link` header."""
+    response = json_response(items)
+    response.headers.update(next_page_headers(request.args, request.base_url, next_cursor))
+    return response
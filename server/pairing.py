@@ -0,0 +1,133 @@
+from datetime import datetime
+
+from sqlalchemy import select, update
+from sqlalchemy.orm.exc import StaleDataError
+
+from database import db
+from models import Assignment, Driver, Truck
+from analytics import record_statuses
+from changefeed import queue_changes
+from scheduling import check_availability
+
+
+class PairingConflict(Exception):
+    """Raised when an assign or release loses to the current state of the driver or truck."""
+
+    def __init__(self, message, driver_id=None, truck_id=None):
+        self.driver_id = driver_id
+        self.truck_id = truck_id
+        super().__init__(message)
+
+    def to_dict(self):
+        return {"error": str(self), "driver_id": self.driver_id, "truck_id": self.truck_id}
+
+
+def _exists(session, model, row_id):
+    return session.execute(select(model.id).where(model.id == row_id)).first() is not None
+
+
+def _claim(session, statement):
+    """Runs a conditional UPDATE; True if it matched (and so now owns) the row."""
+    return session.execute(statement).rowcount == 1
+
+
+def assign(driver_id, truck_id, end_date=None, now=None, session=None):
+    """
+    Puts a driver on a truck in one transaction: the truck becomes In Use with current_driver_id set,
+    the driver's assigned_truck_id is set, and an Active assignment starting now is created.
+
+    The truck and driver rows are claimed with conditional UPDATEs (truck first, then driver, so
+    concurrent calls always lock in the same order). Whichever concurrent call matches first wins;
+    the others match no row, roll back and raise PairingConflict. Raises LookupError for unknown ids.
+    """
+    session = session or db.session
+    now = now or datetime.now().replace(microsecond=0)
+    if not _exists(session, Driver, driver_id):
+        raise LookupError("Driver not found.")
+    if not _exists(session, Truck, truck_id):
+        raise LookupError("Truck not found.")
+
+    try:
+        if not _claim(session, update(Truck)
+                      .where(Truck.id == truck_id, Truck.status == 'Available', Truck.current_driver_id.is_(None))
+                      .values(status='In Use', current_driver_id=driver_id, version=Truck.version + 1)):
+            raise PairingConflict(f"Truck {truck_id} is not available.", driver_id, truck_id)
+        if not _claim(session, update(Driver)
+                      .where(Driver.id == driver_id, Driver.assigned_truck_id.is_(None))
+                      .values(assigned_truck_id=truck_id, version=Driver.version + 1)):
+            raise PairingConflict(f"Driver {driver_id} is already assigned to a truck.", driver_id, truck_id)
+
+        # Both rows are held now, so no other assign can book either of them until commit
+        check_availability(driver_id, truck_id, now, end_date, session=session, lock=False)
+        assignment = Assignment(start_date=now, end_date=end_date, status='Active',
+                                driver_id=driver_id, truck_id=truck_id)
+        session.add(assignment)
+
+        # Core updates skip mapper events, so record the status and queue their change-feed events explicitly
+        record_statuses(session.connection(), {truck_id: 'In Use'}, now)
+        queue_changes(session, 'trucks', 'updated', [(truck_id, {"status": 'In Use', "current_driver_id": driver_id})])
+        queue_changes(session, 'drivers', 'updated', [(driver_id, {"assigned_truck_id": truck_id})])
+        session.commit()
+    except Exception:
+        session.rollback()
+        raise
+    return assignment
+
+
+def release(driver_id=None, truck_id=None, now=None, session=None):
+    """
+    Ends the current pairing of a driver or a truck in one transaction: the truck goes back to
+    Available, both pointers are cleared and the pair's running assignments are completed now.
+
+    The pair is read first, then cleared with a compare-and-set UPDATE on the truck; if another
+    call changed the truck in between, nothing is written and PairingConflict is raised.
+    Returns (driver_id, truck_id, completed assignments).
+    """
+    session = session or db.session
+    if truck_id is not None:
+        row = session.execute(select(Truck.current_driver_id).where(Truck.id == truck_id)).first()
+        if row is None:
+            raise LookupError("Truck not found.")
+        driver_id = row.current_driver_id
+    else:
+        row = session.execute(select(Driver.assigned_truck_id).where(Driver.id == driver_id)).first()
+        if row is None:
+            raise LookupError("Driver not found.")
+        truck_id = row.assigned_truck_id
+    if driver_id is None or truck_id is None:
+        raise PairingConflict("No driver is assigned to this truck." if driver_id is None
+                              else "This driver is not assigned to a truck.", driver_id, truck_id)
+
+    try:
+        if not _claim(session, update(Truck)
+                      .where(Truck.id == truck_id, Truck.current_driver_id == driver_id)
+                      .values(status='Available', current_driver_id=None, version=Truck.version + 1)):
+            raise PairingConflict(f"Truck {truck_id} was changed by another request; retry.", driver_id, truck_id)
+        # Taken after the claim, so it can't predate the start of the assign being released
+        now = now or datetime.now().replace(microsecond=0)
+        # Also clears a pointer left behind by older, non-atomic writes
+        session.execute(update(Driver)
+                        .where(Driver.id == driver_id, Driver.assigned_truck_id == truck_id)
+                        .values(assigned_truck_id=None, version=Driver.version + 1))
+
+        # ORM writes, so the utilization rollup picks up the newly closed periods
+        running = session.query(Assignment).filter(
+            Assignment.driver_id == driver_id, Assignment.truck_id == truck_id, Assignment.status == 'Active',
+            Assignment.start_date <= now, (Assignment.end_date.is_(None)) | (Assignment.end_date > now),
+        ).all()
+        for assignment in running:
+            assignment.end_date = now
+            assignment.status = 'Completed'
+
+        record_statuses(session.connection(), {truck_id: 'Available'}, now)
+        queue_changes(session, 'trucks', 'updated', [(truck_id, {"status": 'Available', "current_driver_id": None})])
+        queue_changes(session, 'drivers', 'updated', [(driver_id, {"assigned_truck_id": None})])
+        session.commit()
+    except StaleDataError:
+        session.rollback()
+        raise PairingConflict(f"An assignment of truck {truck_id} was changed by another request; retry.",
+                              driver_id, truck_id)
+    except Exception:
+        session.rollback()
+        raise
+    return driver_id, truck_id, running
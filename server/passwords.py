@@ -0,0 +1,157 @@
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from werkzeug.security import check_password_hash, generate_password_hash
+
+DEFAULT_METHOD = 'scrypt:32768:8:1'  # Werkzeug's default work factor
+
+
+class PasswordHasherBusy(Exception):
+    """Raised when the hashing queue stays full for longer than the configured wait."""
+
+
+def _method_of(pwhash):
+    return pwhash.split('$', 1)[0]
+
+
+# Worker-side functions: module level so the process pool can pickle them
+
+def _init_worker(parent_pid, increment):
+    if increment and hasattr(os, 'nice'):
+        os.nice(increment)
+    threading.Thread(target=_exit_with_parent, args=(parent_pid,), daemon=True).start()
+
+
+def _exit_with_parent(parent_pid):
+    # A pool worker blocks on its call queue forever if the server process is killed; leave with it
+    while os.getppid() == parent_pid:
+        time.sleep(1)
+    os._exit(0)
+
+
+def _hash(password, method):
+    return generate_password_hash(password, method=method)
+
+
+def _verify(pwhash, password, method):
+    """(matches, new hash or None); the new hash is computed only when the stored one is outdated."""
+    if not check_password_hash(pwhash, password):
+        return False, None
+    if _method_of(pwhash) == method:
+        return True, None
+    return True, generate_password_hash(password, method=method)
+
+
+class PasswordHasher:
+    """
+    Runs password hashing and verification on a small process pool, so a burst of
+    CPU-bound logins can use at most `workers` cores and request threads just wait
+    on the result. At most `max_pending` calls are queued or running; further calls
+    wait up to `wait_seconds` for a slot and then raise PasswordHasherBusy.
+    Workers run at a lower scheduling priority (`nice`), so hashing yields the CPU to
+    request handling. With workers=0 everything runs inline on the calling thread.
+    """
+
+    def __init__(self, method=DEFAULT_METHOD, workers=1, max_pending=16, wait_seconds=10, nice=10):
+        self._lock = threading.Lock()
+        self._executor = None
+        self.hashes = 0
+        self.verifications = 0
+        self.rehashes = 0
+        self.rejected = 0
+        self.configure(method, workers, max_pending, wait_seconds, nice)
+
+    def configure(self, method, workers, max_pending, wait_seconds, nice=10):
+        self.shutdown()
+        self._method = method
+        self._expanded_method = None
+        self.workers = workers
+        self.wait_seconds = wait_seconds
+        self.nice = nice
+        self._slots = threading.BoundedSemaphore(max(max_pending, 1))
+        self.max_pending = max(max_pending, 1)
+
+    @property
+    def method(self):
+        # Werkzeug fills in defaults ('scrypt' -> 'scrypt:32768:8:1'); use the expanded form so it
+        # compares equal to the method prefix of the hashes it produces
+        if self._expanded_method is None:
+            self._expanded_method = _method_of(generate_password_hash('', method=self._method))
+        return self._expanded_method
+
+    def _pool(self):
+        with self._lock:
+            if self._executor is None:
+                # spawn, not fork: forking a threaded server process can copy held locks
+                self._executor = ProcessPoolExecutor(self.workers, mp_context=multiprocessing.get_context('spawn'),
+                                                     initializer=_init_worker, initargs=(os.getpid(), self.nice))
+            return self._executor
+
+    def _run(self, fn, *args):
+        if not self.workers:
+            return fn(*args)
+        if not self._slots.acquire(timeout=self.wait_seconds):
+            with self._lock:
+                self.rejected += 1
+            raise PasswordHasherBusy("Too many password checks in progress; try again shortly.")
+        try:
+            try:
+                return self._pool().submit(fn, *args).result()
+            except BrokenProcessPool:
+                self._reset()
+                return self._pool().submit(fn, *args).result()
+        finally:
+            self._slots.release()
+
+    def _reset(self):
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+    def shutdown(self):
+        self._reset()
+
+    def hash(self, password):
+        """Hashes a password with the configured method."""
+        with self._lock:
+            self.hashes += 1
+        return self._run(_hash, password, self.method)
+
+    def verify(self, pwhash, password):
+        """
+        Checks a password against a stored hash. Returns (matches, new hash); the new hash
+        is set only when the password matched and the stored hash uses an outdated method.
+        """
+        matches, new_hash = self._run(_verify, pwhash, password, self.method)
+        with self._lock:
+            self.verifications += 1
+            self.rehashes += new_hash is not None
+        return matches, new_hash
+
+    def stats(self):
+        with self._lock:
+            return {
+                "hashes": self.hashes,
+                "verifications": self.verifications,
+                "rehashes": self.rehashes,
+                "rejected": self.rejected,
+                "workers": self.workers,
+            }
+
+
+password_hasher = PasswordHasher(workers=0)
+
+
+def init_passwords(app):
+    password_hasher.configure(
+        method=app.config.get('PASSWORD_HASH_METHOD', DEFAULT_METHOD),
+        workers=app.config.get('PASSWORD_HASH_WORKERS', 1),
+        max_pending=app.config.get('PASSWORD_HASH_MAX_PENDING', 16),
+        wait_seconds=app.config.get('PASSWORD_HASH_WAIT_SECONDS', 10),
+        nice=app.config.get('PASSWORD_HASH_NICE', 10),
+    )
@@ -0,0 +1,255 @@
+import hashlib
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+from functools import wraps
+
+from flask import request, make_response
+from sqlalchemy import event, orm, select, update
+
+from database import db
+from engine_profile import DEFER_COMMIT, READ_PRIMARY
+from models import ResourceVersion
+from versioning import row_etag
+
+# Headers replayed from a cached response
+CACHED_HEADERS = ('Content-Type', 'X-Next-Cursor', 'Link')
+# session.info keys: resources to bump when the transaction commits, and the open @invalidates scopes
+PENDING_BUMPS = 'pending_version_bumps'
+INVALIDATING = 'invalidating'
+
+
+class ResourceVersions:
+    """
+    Per-resource version counters, kept in the resource_versions table. bump() marks resources as
+    changed in a session's current transaction, and the counters are incremented just before that
+    transaction commits, together with its writes. Every worker process therefore sees a write's
+    new version exactly when it sees the write, and a rolled-back write bumps nothing.
+    """
+
+    def get(self, resources, session=None):
+        table = ResourceVersion.__table__
+        rows = dict((session or db.session).execute(
+            select(table.c.resource, table.c.version).where(table.c.resource.in_(resources))
+        ).all())
+        return tuple(rows.get(r, 0) for r in resources)
+
+    def bump(self, resources, session=None):
+        (session or db.session).info.setdefault(PENDING_BUMPS, set()).update(resources)
+
+
+class ResponseCache:
+    """Bounded LRU of serialized GET responses, keyed by path + query string + versions."""
+
+    def __init__(self, max_entries=512, max_bytes=64 * 1024 * 1024):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.not_modified = 0
+
+    def configure(self, max_entries, max_bytes):
+        with self._lock:
+            self.max_entries = max_entries
+            self.max_bytes = max_bytes
+            self._entries.clear()
+            self._size = 0
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry
+
+    def put(self, key, status, body, headers):
+        if len(body) > self.max_bytes // 4:
+            return  # Don't let one huge page flush the whole cache
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._size -= len(old[1])
+            self._entries[key] = (status, body, headers)
+            self._size += len(body)
+            while self._entries and (len(self._entries) > self.max_entries or self._size > self.max_bytes):
+                _, (_, evicted, _) = self._entries.popitem(last=False)
+                self._size -= len(evicted)
+
+    def record_not_modified(self):
+        with self._lock:
+            self.not_modified += 1
+
+    def stats(self):
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "bytes": self._size,
+                "hits": self.hits,
+                "misses": self.misses,
+                "not_modified": self.not_modified,
+            }
+
+
+versions = ResourceVersions()
+response_cache = ResponseCache()
+
+
+def init_response_cache(app):
+    response_cache.configure(
+        max_entries=app.config.get('RESPONSE_CACHE_SIZE', 512),
+        max_bytes=app.config.get('RESPONSE_CACHE_MAX_BYTES', 64 * 1024 * 1024),
+    )
+
+
+def _etag(resources, current):
+    raw = f"{request.full_path}|{','.join(resources)}|{current}"
+    return hashlib.sha1(raw.encode()).hexdigest()[:20]
+
+
+def _row_version(model, row_id):
+    return db.session.execute(select(model.version).where(model.id == row_id)).scalar()
+
+
+def _with_row_etag(response, model, row_id):
+    """Adds the row-version ETag to an uncached single-row response, or answers 304 instead."""
+    if response.status_code != 200:
+        return response
+    # The body carries the version unless ?fields= leaves it out, which saves a query
+    version = (response.get_json(silent=True) or {}).get('version')
+    if version is None:
+        version = _row_version(model, row_id)
+    if version is None:
+        return response
+    etag = row_etag(version, response.get_data() if request.args.get('include') else None)
+    if etag in request.if_none_match:
+        response_cache.record_not_modified()
+        response = make_response('', 304)
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = 'private, no-cache'
+    return response
+
+
+def cached(*resources, depends=None, row=None):
+    """
+    Conditional GET + response cache for handlers whose output depends only on
+    the listed resources, plus `depends(request.args)` for per-request ones.
+    Place below the auth decorators so access is checked first.
+    Versions live in the database, so cached responses and ETags are valid in every worker process.
+    Disabled entirely when RESPONSE_CACHE_SIZE is 0, and inside an atomic /batch.
+
+    With `row`, the model of a single-row handler taking `id`, the ETag is the row's
+    version instead (see versioning.row_etag), so it also works as If-Match for writes
+    to that row. That ETag and its 304s don't depend on the cache and stay on when it is off.
+
+    With the cache on, reads read the primary even with a replica configured: a response is
+    kept until the next write bumps its version, so one rendered from a lagging replica
+    would stay stale long after the replica caught up.
+    """
+    base = resources
+
+    def decorator(f):
+        @wraps(f)
+        def decorated(*args, **kwargs):
+            # Inside a deferred transaction the session sees writes that aren't committed (or bumped) yet
+            if not response_cache.max_entries or db.session.info.get(DEFER_COMMIT):
+                if row is None:
+                    return f(*args, **kwargs)
+                return _with_row_etag(make_response(f(*args, **kwargs)), row, kwargs['id'])
+            previous = db.session.info.get(READ_PRIMARY)
+            db.session.info[READ_PRIMARY] = True
+            try:
+                return render(*args, **kwargs)
+            finally:
+                if previous is None:
+                    db.session.info.pop(READ_PRIMARY, None)
+
+        def render(*args, **kwargs):
+            # None for rows that don't exist (or are archived): those get the resource-level ETag
+            version = _row_version(row, kwargs['id']) if row is not None else None
+            resources = base
+            if depends is not None:
+                resources = tuple(dict.fromkeys(base + tuple(depends(request.args))))
+            # Included related rows can change without the row's version moving; hash the body then
+            by_body = version is not None and bool(request.args.get('include'))
+            # Without include, the row's version alone determines the response
+            current = versions.get(resources) if version is None or by_body else None
+            etag = _etag(resources, current) if version is None else row_etag(version)
+
+            if not by_body and etag in request.if_none_match:
+                response_cache.record_not_modified()
+                response = make_response('', 304)
+            else:
+                key = (request.full_path, current, version)
+                entry = response_cache.get(key)
+                if entry is not None:
+                    status, body, headers = entry
+                    response = make_response(body, status, headers)
+                else:
+                    response = make_response(f(*args, **kwargs))
+                    if response.status_code != 200:
+                        return response
+                    headers = {h: response.headers[h] for h in CACHED_HEADERS if h in response.headers}
+                    response_cache.put(key, response.status_code, response.get_data(), headers)
+                if by_body:
+                    etag = row_etag(version, response.get_data())
+                    if etag in request.if_none_match:
+                        response_cache.record_not_modified()
+                        response = make_response('', 304)
+
+            response.set_etag(etag)
+            response.headers['Cache-Control'] = 'private, no-cache'
+            return response
+        return decorated
+    return decorator
+
+
+@contextmanager
+def invalidating(session, resources):
+    """Bumps `resources` in every transaction `session` commits inside the block."""
+    scopes = session.info.setdefault(INVALIDATING, [])
+    scopes.append(resources)
+    try:
+        yield
+    finally:
+        scopes.pop()
+
+
+def invalidates(*resources):
+    """
+    Bumps the listed resources' versions in each transaction the write handler commits. Inside a
+    deferred transaction (an atomic /batch or an Idempotency-Key request) a successful handler's
+    bump waits for that transaction's commit instead.
+    """
+    def decorator(f):
+        @wraps(f)
+        def decorated(*args, **kwargs):
+            with invalidating(db.session, resources):
+                response = make_response(f(*args, **kwargs))
+            if response.status_code < 400 and db.session.info.get(DEFER_COMMIT):
+                versions.bump(resources)
+            return response
+        return decorated
+    return decorator
+
+
+@event.listens_for(orm.Session, 'before_commit')
+def _bump_versions(session):
+    resources = session.info.pop(PENDING_BUMPS, set())
+    for scope in session.info.get(INVALIDATING, ()):
+        resources.update(scope)
+    if resources:
+        table = ResourceVersion.__table__
+        session.execute(
+            update(table).where(table.c.resource.in_(sorted(resources))).values(version=table.c.version + 1)
+        )
+
+
+@event.listens_for(orm.Session, 'after_rollback')
+def _drop_bumps(session):
+    session.info.pop(PENDING_BUMPS, None)
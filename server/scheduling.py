@@ -0,0 +1,191 @@
+import heapq
+from datetime import datetime
+
+from sqlalchemy import or_, update
+
+from database import db
+from models import Assignment, Driver, Truck
+from archive import history_entities
+from pagination import DATETIME_FORMAT, QueryParamError, parse_datetime
+
+# Open-ended assignments (end_date IS NULL) run forever
+OPEN_END = datetime.max
+
+RESOURCE_COLUMNS = {
+    'truck': Assignment.truck_id,
+    'driver': Assignment.driver_id,
+}
+
+
+class AssignmentConflict(Exception):
+    """Raised when an assignment would double-book a truck or a driver."""
+
+    def __init__(self, resource, resource_id, conflicting_ids):
+        self.resource = resource
+        self.resource_id = resource_id
+        self.conflicting_ids = sorted(conflicting_ids)
+        super().__init__(
+            f"{resource.capitalize()} {resource_id} is already assigned during this period "
+            f"(conflicting assignments: {', '.join(str(i) for i in self.conflicting_ids)})."
+        )
+
+    def to_dict(self):
+        return {
+            "error": str(self),
+            "resource": self.resource,
+            "resource_id": self.resource_id,
+            "conflicts": self.conflicting_ids,
+        }
+
+
+def overlaps(start, end, model=Assignment):
+    """
+    SQL condition for assignments (of `model`, or a history table) overlapping the half-open
+    window [start, end). Matches the (resource_id, start_date, end_date) composite indexes.
+    """
+    condition = or_(model.end_date.is_(None), model.end_date > start)
+    if end is not None:
+        condition = condition & (model.start_date < end)
+    return condition
+
+
+def overlapping_ids(resource, resource_id, start, end, session=None):
+    """Ids of the resource's assignments overlapping [start, end), archived ones included."""
+    session = session or db.session
+    ids = []
+    for model in [Assignment, *history_entities(session, start, end)]:
+        column = getattr(model, RESOURCE_COLUMNS[resource].key)
+        rows = session.query(model.id).filter(column == resource_id, overlaps(start, end, model))
+        ids.extend(row.id for row in rows)
+    return ids
+
+
+def validate_interval(start, end):
+    if end is not None and end <= start:
+        raise ValueError("end_date must be after start_date.")
+
+
+def lock_resources(driver_ids, truck_ids, session=None):
+    """
+    Locks the trucks' and then the drivers' rows, each in id order, until the transaction ends.
+    The no-op UPDATEs take row locks on server databases and the write lock on SQLite, so
+    concurrent writers booking the same truck or driver check and write one after the other.
+    """
+    session = session or db.session
+    for model, ids in ((Truck, truck_ids), (Driver, driver_ids)):
+        ids = sorted({i for i in ids if i is not None})
+        if ids:
+            table = model.__table__
+            session.execute(update(table).where(table.c.id.in_(ids)).values(id=table.c.id))
+
+
+def check_availability(driver_id, truck_id, start, end, exclude_ids=(), session=None, lock=True):
+    """
+    Raises AssignmentConflict if the truck or the driver is already booked in [start, end).
+    Locks both rows first (unless the caller already holds them), so the result still holds
+    when the caller writes the assignment in the same transaction.
+    """
+    validate_interval(start, end)
+    if lock:
+        lock_resources([driver_id], [truck_id], session)
+    for resource, resource_id in (('truck', truck_id), ('driver', driver_id)):
+        conflicts = [i for i in overlapping_ids(resource, resource_id, start, end, session) if i not in exclude_ids]
+        if conflicts:
+            raise AssignmentConflict(resource, resource_id, conflicts)
+
+
+def _sweep(resource, rows):
+    """
+    Sort-and-sweep over rows ordered by (resource_id, start_date). A min-heap of
+    active intervals keyed by end time is pruned as the sweep advances, so each
+    row is compared only with the intervals it actually overlaps.
+    """
+    current = None
+    active = []
+    for row_id, resource_id, start, end in rows:
+        if resource_id != current:
+            current = resource_id
+            active = []
+        while active and active[0][0] <= start:
+            heapq.heappop(active)
+        for other_end, other_id in active:
+            overlap_end = min(other_end, end or OPEN_END)
+            yield {
+                "resource": resource,
+                "resource_id": resource_id,
+                "assignment_ids": [other_id, row_id],
+                "overlap_start": start.strftime(DATETIME_FORMAT),
+                "overlap_end": None if overlap_end == OPEN_END else overlap_end.strftime(DATETIME_FORMAT),
+            }
+        heapq.heappush(active, (end or OPEN_END, row_id))
+
+
+def parse_window(args):
+    """Reads the [start, end) window from query parameters; `end` may be omitted for open-ended."""
+    if not args.get('start'):
+        raise QueryParamError("Missing required parameter: start")
+    start = parse_datetime(args['start'], 'start')
+    end = parse_datetime(args['end'], 'end') if args.get('end') else None
+    if end is not None and end <= start:
+        raise QueryParamError("'end' must be after 'start'.")
+    return start, end
+
+
+def free_trucks_query(start, end):
+    """Available trucks with no assignment overlapping [start, end), as an anti-join per table."""
+    query = Truck.query.filter(Truck.status == 'Available')
+    for model in [Assignment, *history_entities(None, start, end)]:
+        busy = db.session.query(model.id).filter(model.truck_id == Truck.id, overlaps(start, end, model))
+        query = query.filter(~busy.exists())
+    return query
+
+
+def free_drivers_query(start, end):
+    """Unpaired drivers with no assignment overlapping [start, end), as an anti-join per table."""
+    # A driver paired with a truck is taken, as a truck that isn't Available is
+    query = Driver.query.filter(Driver.assigned_truck_id.is_(None))
+    for model in [Assignment, *history_entities(None, start, end)]:
+        busy = db.session.query(model.id).filter(model.driver_id == Driver.id, overlaps(start, end, model))
+        query = query.filter(~busy.exists())
+    return query
+
+
+def find_all_conflicts(batch_size=5000):
+    """
+    Reports every pair of overlapping assignments for the same truck or driver, archived
+    ones included: the ordered streams of the assignments and history tables are merged.
+    """
+    conflicts = []
+    models = [Assignment, *history_entities()]
+    for resource, column in RESOURCE_COLUMNS.items():
+        streams = []
+        for model in models:
+            resource_column = getattr(model, column.key)
+            streams.append(
+                db.session.query(model.id, resource_column, model.start_date, model.end_date)
+                .order_by(resource_column, model.start_date, model.id)
+                .yield_per(batch_size)
+            )
+        rows = heapq.merge(*streams, key=lambda row: (row[1], row[2], row[0]))
+        conflicts.extend(_sweep(resource, rows))
+    return conflicts
+
+
+def find_batch_conflicts(proposals):
+    """
+    In-memory sweep over proposed assignments given as {index: (driver_id, truck_id, start, end)}.
+    Returns {index: error message} for each proposal overlapping an earlier one in the batch.
+    """
+    errors = {}
+    for resource, position in (('truck', 1), ('driver', 0)):
+        rows = sorted(
+            ((index, p[position], p[2], p[3]) for index, p in proposals.items()),
+            key=lambda row: (row[1], row[2], row[0]),
+        )
+        for pair in _sweep(resource, rows):
+            first, second = sorted(pair["assignment_ids"])
+            errors.setdefault(
+                second,
+                f"{resource.capitalize()} {pair['resource_id']} overlaps record {first} in this request."
+            )
+    return errors
@@ -0,0 +1,185 @@
+import re
+
+from sqlalchemy import event, func, inspect, or_, and_, union_all, select
+
+from database import db
+from models import Driver, Truck, SearchTerm
+from pagination import QueryParamError, parse_limit, encode_cursor, decode_cursor, page_response
+from serialization import load_by_ids
+
+MAX_QUERY_WORDS = 5
+MAX_TERM_LENGTH = 100
+
+# Indexed fields per model and their weight: identifiers outrank names, names outrank models
+SEARCH_FIELDS = {
+    Driver: {'license_number': 0, 'name': 1},
+    Truck: {'plate_number': 0, 'model': 2},
+}
+RESOURCES = {Driver: 'drivers', Truck: 'trucks'}
+
+WORD = re.compile(r'[a-z0-9]+')
+
+
+def terms_for(value):
+    """
+    Normalized words of one field value. Multi-word values also index the words run
+    together, so 'KBX 123A' matches both 'kbx 12' and 'kbx12'.
+    """
+    words = WORD.findall(str(value or '').lower())
+    if len(words) > 1:
+        words.append(''.join(words))
+    return [w[:MAX_TERM_LENGTH] for w in words]
+
+
+def term_rows(model, rows):
+    """search_terms rows for (id, values) pairs; a term found in two fields keeps its best weight."""
+    resource = RESOURCES[model]
+    result = []
+    for row_id, values in rows:
+        weights = {}
+        for field, weight in SEARCH_FIELDS[model].items():
+            for term in terms_for(values.get(field)):
+                weights[term] = min(weight, weights.get(term, weight))
+        result.extend({"resource": resource, "ref_id": row_id, "term": term, "weight": weight}
+                      for term, weight in weights.items())
+    return result
+
+
+def index_rows(connection, model, rows, replace=False):
+    """(Re)indexes (id, values) pairs; values must carry every field in SEARCH_FIELDS[model]."""
+    rows = list(rows)
+    if not rows:
+        return
+    table = SearchTerm.__table__
+    if replace:
+        ids = [row_id for row_id, _ in rows]
+        for i in range(0, len(ids), 500):
+            connection.execute(table.delete().where(table.c.resource == RESOURCES[model],
+                                                    table.c.ref_id.in_(ids[i:i + 500])))
+    terms = term_rows(model, rows)
+    if terms:
+        connection.execute(table.insert(), terms)
+
+
+def _unindex(connection, model, row_id):
+    table = SearchTerm.__table__
+    connection.execute(table.delete().where(table.c.resource == RESOURCES[model], table.c.ref_id == row_id))
+
+
+# ORM writes (create/update/delete handlers) keep the index in step inside the same flush,
+# so it commits or rolls back with them.
+
+def _indexed_values(obj):
+    return {field: getattr(obj, field) for field in SEARCH_FIELDS[type(obj)]}
+
+for _model in SEARCH_FIELDS:
+    @event.listens_for(_model, 'after_insert')
+    def _indexed_inserted(mapper, connection, obj):
+        index_rows(connection, type(obj), [(obj.id, _indexed_values(obj))])
+
+    @event.listens_for(_model, 'after_update')
+    def _indexed_updated(mapper, connection, obj):
+        state = inspect(obj)
+        if any(state.attrs[field].history.has_changes() for field in SEARCH_FIELDS[type(obj)]):
+            index_rows(connection, type(obj), [(obj.id, _indexed_values(obj))], replace=True)
+
+    @event.listens_for(_model, 'after_delete')
+    def _indexed_deleted(mapper, connection, obj):
+        _unindex(connection, type(obj), obj.id)
+
+
+def rebuild_search_index(chunk_size=10000):
+    """Recomputes the whole search index from drivers and trucks in id-ordered chunks. Returns rows indexed."""
+    db.session.query(SearchTerm).delete()
+    connection = db.session.connection()
+    indexed = 0
+
+    for model, fields in SEARCH_FIELDS.items():
+        last_id = 0
+        while True:
+            rows = (
+                db.session.query(model.id, *(getattr(model, f) for f in fields))
+                .filter(model.id > last_id)
+                .order_by(model.id)
+                .limit(chunk_size)
+                .all()
+            )
+            if not rows:
+                break
+            index_rows(connection, model, [(row.id, row._asdict()) for row in rows])
+            last_id = rows[-1].id
+            indexed += len(rows)
+
+    db.session.commit()
+    return indexed
+
+
+# Querying
+
+def parse_query(args):
+    words = list(dict.fromkeys(WORD.findall(args.get('q', '').lower())))
+    if not words:
+        raise QueryParamError("Missing required parameter: q")
+    if len(words) > MAX_QUERY_WORDS:
+        raise QueryParamError(f"Too many search words; the limit is {MAX_QUERY_WORDS}.")
+    return [w[:MAX_TERM_LENGTH] for w in words]
+
+
+def _prefix_match(column, word, dialect):
+    """Prefix condition the term index can serve as a range scan."""
+    if dialect == 'postgresql':
+        return column.startswith(word, autoescape=True)  # LIKE 'w%' on the text_pattern_ops index
+    # Terms are [a-z0-9] only, so bumping the last character bounds every extension of the word
+    return and_(column >= word, column < word[:-1] + chr(ord(word[-1]) + 1))
+
+
+def ranked_ids_query(model, words, dialect):
+    """
+    SELECT ref_id, rank for rows where every word prefixes one of the row's terms.
+    Each word is an index range scan on (resource, term). A word scores its best match:
+    fewer unmatched characters first (so exact matches lead), then the field's weight.
+    rank sums the scores, lower is better.
+    """
+    terms = SearchTerm.__table__.c
+    per_word = []
+    for word in words:
+        score = (func.length(terms.term) - len(word)) * 4 + terms.weight
+        per_word.append(
+            select(terms.ref_id, func.min(score).label('score'))
+            .where(terms.resource == RESOURCES[model], _prefix_match(terms.term, word, dialect))
+            .group_by(terms.ref_id)
+        )
+    matches = (per_word[0] if len(per_word) == 1 else union_all(*per_word)).subquery()
+    rank = func.sum(matches.c.score)
+    return (
+        select(matches.c.ref_id, rank.label('rank'))
+        .group_by(matches.c.ref_id)
+        .having(func.count() == len(words)),
+        matches.c.ref_id,
+        rank,
+    )
+
+
+def search(model, args, session=None):
+    """One ranked page of search results as include-aware dicts, plus the next cursor."""
+    session = session or db.session
+    words = parse_query(args)
+    limit = parse_limit(args)
+    query, ref_id, rank = ranked_ids_query(model, words, session.get_bind().dialect.name)
+
+    after = args.get('after')
+    if after:
+        after_rank, after_id = decode_cursor(after, model, 'rank')
+        query = query.having(or_(rank > after_rank, and_(rank == after_rank, ref_id > after_id)))
+
+    ranked = session.execute(query.order_by(rank, ref_id).limit(limit + 1)).all()
+    next_cursor = None
+    if len(ranked) > limit:
+        ranked = ranked[:limit]
+        next_cursor = encode_cursor('rank', ranked[-1].rank, ranked[-1].ref_id)
+    return load_by_ids(model, [row.ref_id for row in ranked], args, session), next_cursor
+
+
+def search_response(model, args):
+    """One ranked page of search results as a JSON list response with the usual cursor headers."""
+    return page_response(*search(model, args))
@@ -1,89 +1,291 @@
 #!/usr/bin/env python3
+"""
+Seeds the database with synthetic drivers, trucks, assignments and users.
 
-from app import app
-from models import Driver, Truck, Assignment, User
-from database import db
-from faker import Faker
+Rows are generated in parallel worker processes and loaded in chunked
+executemany batches. Output is reproducible: the same --seed and --end-date
+always produce the same rows, whatever the number of workers.
+
+    python seed.py                                         # small demo dataset
+    python seed.py --drivers 50000 --trucks 20000 --assignments 5000000
+"""
+import argparse
+import os
 import random as rc
-from werkzeug.security import generate_password_hash
-
-fake = Faker()
-
-with app.app_context():
-    # Clear existing data
-    Assignment.query.delete()
-    Truck.query.delete()
-    Driver.query.delete()
-    User.query.delete()
-
-    # Seed Drivers
-    drivers = []
-    for i in range(5):
-        driver = Driver(
-            name=fake.name(),
-            license_number=fake.unique.bothify(text='??#####'),
-            contact_info=fake.phone_number()
-        )
-        drivers.append(driver)
-
-    db.session.add_all(drivers)
-    db.session.commit()
-
-    # Seed Trucks
-    trucks = []
-    for i in range(5):
-        truck = Truck(
-            plate_number=fake.unique.bothify(text='K?? ####?'),
-            model=fake.word().capitalize() + " " + rc.choice(["FH16", "R500", "XF", "Actros"]),
-            status=rc.choice(["Available", "In Use", "Maintenance"])
-        )
-        trucks.append(truck)
-
-    db.session.add_all(trucks)
-    db.session.commit()
-
-    # Seed Assignments
-    assignments = []
-    for i in range(5):
-        start_date = fake.date_time_between(start_date='-30d', end_date='-5d')
-        end_date = rc.choice([None, fake.date_time_between(start_date=start_date, end_date='now')])
-        status = "Completed" if end_date else "Active"
-
-        assignment = Assignment(
-            start_date=start_date,
-            end_date=end_date,
-            status=status,
-            driver_id=rc.choice(drivers).id,
-            truck_id=rc.choice(trucks).id
-        )
-        assignments.append(assignment)
-
-    db.session.add_all(assignments)
-    db.session.commit()
-
-    # Seed Users (Manual Real-Life Data)
-    users = [
-        User(
-            username="admin_john",
-            email="john.doe@example.com",
-            password_hash=generate_password_hash("securepass123"),
-            role="Admin"
-        ),
-        User(
-            username="admin_lisa",
-            email="lisa.morgan@example.com",
-            password_hash=generate_password_hash("securepass123"),
-            role="Admin"
-        ),
-        User(
-            username="fleet_michael",
-            email="michael.smith@example.com",
-            password_hash=generate_password_hash("securepass123"),
-            role="Fleet Manager"
-        )
+from collections import defaultdict, deque
+from datetime import datetime, date, timedelta, time
+from multiprocessing import Pool
+from string import ascii_uppercase as LETTERS
+
+from faker import Faker
+
+from analytics import add_contribution
+
+TRUCK_MAKES = ["FH16", "R500", "XF", "Actros"]
+ACTIVE_SHARE = 0.3  # Share of timelines whose latest assignment is still running
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--drivers', type=int, default=50)
+    parser.add_argument('--trucks', type=int, default=25)
+    parser.add_argument('--assignments', type=int, default=500)
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--end-date', type=date.fromisoformat, default=date.today(),
+                        help='Timelines end at midnight of this day (YYYY-MM-DD, default today)')
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1)
+    parser.add_argument('--chunk-size', type=int, default=20000, help='Rows per generated and inserted batch')
+    return parser.parse_args()
+
+
+# Generation (runs in worker processes; every chunk has its own seeded RNG)
+
+def _rng(options, kind, offset):
+    rng = rc.Random(f"{options['seed']}-{kind}-{offset}")
+    fake = Faker()
+    fake.seed_instance(rng.getrandbits(32))
+    return rng, fake
+
+
+def _plate(index):
+    """Kenyan-style plate derived from the index, so plates are unique without coordination."""
+    index, suffix = divmod(index, 26)
+    index, number = divmod(index, 10000)
+    index, second = divmod(index, 26)
+    return f"K{LETTERS[index % 26]}{LETTERS[second]} {number:04d}{LETTERS[suffix]}"
+
+
+def generate_drivers(options, offset, count):
+    rng, fake = _rng(options, 'drivers', offset)
+    return [{
+        "id": i + 1,
+        "name": fake.name(),
+        "license_number": f"{rng.choice(LETTERS)}{rng.choice(LETTERS)}{i:07d}",
+        "contact_info": fake.phone_number(),
+    } for i in range(offset, offset + count)]
+
+
+def generate_trucks(options, offset, count):
+    rng, fake = _rng(options, 'trucks', offset)
+    return [{
+        "id": i + 1,
+        "plate_number": _plate(i),
+        "model": f"{fake.word().capitalize()} {rng.choice(TRUCK_MAKES)}",
+        "status": "Maintenance" if rng.random() < 0.15 else "Available",
+    } for i in range(offset, offset + count)]
+
+
+def generate_timelines(options, offset, count):
+    """
+    Assignments for lanes [offset, offset + count). Lane k owns the trucks and
+    drivers whose zero-based index is k modulo the lane count and runs one
+    sequential timeline over them, so no truck or driver is ever double-booked.
+    Because lanes share no trucks or drivers, each chunk's rollup rows are final.
+    """
+    rng, _ = _rng(options, 'timelines', offset)
+    lanes, total = options['lanes'], options['assignments']
+    anchor = datetime.combine(options['end_date'], time.min)
+    assignments, active = [], []
+    deltas = defaultdict(int)
+
+    for lane in range(offset, offset + count):
+        trucks = range(lane + 1, options['trucks'] + 1, lanes)
+        drivers = range(lane + 1, options['drivers'] + 1, lanes)
+        length = total // lanes + (lane < total % lanes)
+
+        # Walk backwards from the anchor so every assignment starts in the past
+        cursor = anchor - timedelta(minutes=rng.randint(0, 48 * 60))
+        running = rng.random() < ACTIVE_SHARE
+        for n in range(length):
+            start = cursor - timedelta(minutes=rng.randint(4 * 60, 96 * 60))
+            end = None if (n == 0 and running) else cursor
+            truck_id, driver_id = rng.choice(trucks), rng.choice(drivers)
+            assignments.append({
+                "start_date": start,
+                "end_date": end,
+                "status": "Active" if end is None else "Completed",
+                "driver_id": driver_id,
+                "truck_id": truck_id,
+            })
+            if end is None:
+                active.append((driver_id, truck_id))
+            else:
+                add_contribution(deltas, start, end, truck_id, driver_id)
+            cursor = start - timedelta(minutes=rng.randint(60, 72 * 60))
+
+    rollup = [
+        {"day": day, "truck_id": truck_id, "driver_id": driver_id, "assigned_seconds": seconds}
+        for (day, truck_id, driver_id), seconds in deltas.items()
     ]
+    return assignments, active, rollup
+
+
+GENERATORS = {
+    'drivers': generate_drivers,
+    'trucks': generate_trucks,
+    'timelines': generate_timelines,
+}
+
+
+def _generate(task):
+    kind, options, offset, count = task
+    return GENERATORS[kind](options, offset, count)
+
+
+def generate(pool, tasks, window):
+    """Yields task results in order, keeping at most `window` chunks in flight."""
+    if pool is None:
+        yield from map(_generate, tasks)
+        return
+    pending = deque()
+    for task in tasks:
+        pending.append(pool.apply_async(_generate, (task,)))
+        if len(pending) >= window:
+            yield pending.popleft().get()
+    while pending:
+        yield pending.popleft().get()
+
+
+def chunks(kind, options, total, size):
+    return [(kind, options, offset, min(size, total - offset)) for offset in range(0, total, size)]
+
+
+# Loading
+
+def tune_for_loading(connection):
+    """Bulk-load PRAGMAs: no fsyncs and an in-memory journal. Per connection, so the app is unaffected."""
+    if connection.dialect.name == 'sqlite':
+        for pragma in ('journal_mode = MEMORY', 'synchronous = OFF', 'cache_size = -262144', 'temp_store = MEMORY'):
+            connection.exec_driver_sql(f'PRAGMA {pragma}')
+
+
+def load(connection, table, rows):
+    if rows:
+        connection.execute(table.insert(), rows)
+
+
+def main():
+    options = parse_args()
+    from sqlalchemy import bindparam, literal, select
+
+    from app import app
+    from models import (
+        Driver, Truck, Assignment, User, DailyUtilization, SearchTerm, AssignmentHistoryPartition, IdempotencyKey,
+        ResourceVersion, TruckStatusPeriod
+    )
+    from archive import history_table
+    from search import index_rows
+    from database import db
+    from werkzeug.security import generate_password_hash
+
+    lanes = max(1, min(options.drivers, options.trucks))
+    settings = {
+        "seed": options.seed,
+        "end_date": options.end_date,
+        "drivers": options.drivers,
+        "trucks": options.trucks,
+        "assignments": options.assignments if options.drivers and options.trucks else 0,
+        "lanes": lanes,
+    }
+    lanes_per_chunk = max(1, options.chunk_size * lanes // max(1, settings['assignments']))
+
+    tasks = (
+        chunks('drivers', settings, options.drivers, options.chunk_size)
+        + chunks('trucks', settings, options.trucks, options.chunk_size)
+        + (chunks('timelines', settings, lanes, lanes_per_chunk) if settings['assignments'] else [])
+    )
+    started = datetime.now()
+
+    with app.app_context(), db.engine.connect() as connection:
+        tune_for_loading(connection)
+
+        # Clear existing data, archived assignments included
+        registry = AssignmentHistoryPartition.__table__
+        for name, in connection.execute(registry.select().with_only_columns(registry.c.table_name)).all():
+            history_table(name).drop(connection, checkfirst=True)
+        for model in (AssignmentHistoryPartition, IdempotencyKey, SearchTerm, DailyUtilization, TruckStatusPeriod,
+                      Assignment, Truck, Driver, User):
+            connection.execute(model.__table__.delete())
+        if connection.dialect.name == 'sqlite':
+            # No archived ids left to stay clear of
+            connection.exec_driver_sql("DELETE FROM sqlite_sequence WHERE name = 'assignments'")
+        # Cached responses and list ETags from before the reseed must not match the new data
+        versions = ResourceVersion.__table__
+        connection.execute(versions.update().values(version=versions.c.version + 1))
+        connection.commit()
+
+        pool = Pool(options.workers) if options.workers > 1 else None
+        active = []
+        counts = defaultdict(int)
+        try:
+            for task, result in zip(tasks, generate(pool, tasks, 2 * options.workers)):
+                kind = task[0]
+                if kind == 'timelines':
+                    assignments, running, rollup = result
+                    load(connection, Assignment.__table__, assignments)
+                    load(connection, DailyUtilization.__table__, rollup)
+                    active.extend(running)
+                    counts['assignments'] += len(assignments)
+                else:
+                    model = Driver if kind == 'drivers' else Truck
+                    load(connection, model.__table__, result)
+                    index_rows(connection, model, [(row['id'], row) for row in result])
+                    counts[kind] += len(result)
+                connection.commit()
+                label = 'assignments' if kind == 'timelines' else kind
+                print(f"  {label}: {counts[label]:,} rows ({(datetime.now() - started).total_seconds():.1f}s)", end='\r')
+        finally:
+            if pool is not None:
+                pool.close()
+                pool.join()
+        print()
+
+        # Running assignments put their driver and truck in use
+        drivers, trucks = Driver.__table__, Truck.__table__
+        for i in range(0, len(active), options.chunk_size):
+            batch = active[i:i + options.chunk_size]
+            connection.execute(
+                trucks.update().where(trucks.c.id == bindparam('b_truck'))
+                .values(status='In Use', current_driver_id=bindparam('b_driver')),
+                [{"b_truck": truck_id, "b_driver": driver_id} for driver_id, truck_id in batch],
+            )
+            connection.execute(
+                drivers.update().where(drivers.c.id == bindparam('b_driver'))
+                .values(assigned_truck_id=bindparam('b_truck')),
+                [{"b_truck": truck_id, "b_driver": driver_id} for driver_id, truck_id in batch],
+            )
+
+        # Status history starts with each truck's seeded status
+        periods = TruckStatusPeriod.__table__
+        connection.execute(periods.insert().from_select(
+            ['truck_id', 'status', 'start_date'],
+            select(trucks.c.id, trucks.c.status, literal(started.replace(microsecond=0), periods.c.start_date.type)),
+        ))
+
+        # Seed Users (Manual Real-Life Data)
+        load(connection, User.__table__, [
+            {"username": "admin_john", "email": "john.doe@example.com",
+             "password_hash": generate_password_hash("securepass123"), "role": "Admin"},
+            {"username": "admin_lisa", "email": "lisa.morgan@example.com",
+             "password_hash": generate_password_hash("securepass123"), "role": "Admin"},
+            {"username": "fleet_michael", "email": "michael.smith@example.com",
+             "password_hash": generate_password_hash("securepass123"), "role": "Fleet Manager"},
+        ])
+
+        # Explicit ids leave server-side sequences behind
+        if connection.dialect.name == 'postgresql':
+            for table in ('drivers', 'trucks'):
+                connection.exec_driver_sql(
+                    f"SELECT setval(pg_get_serial_sequence('{table}', 'id'), COALESCE(MAX(id), 1)) FROM {table}"
+                )
+        connection.commit()
+        connection.exec_driver_sql('ANALYZE')
+        connection.commit()
+
+    elapsed = (datetime.now() - started).total_seconds()
+    print(f"Database seeded successfully: {counts['drivers']:,} drivers, {counts['trucks']:,} trucks, "
+          f"{counts['assignments']:,} assignments ({len(active):,} active) in {elapsed:.1f}s.")
 
-    db.session.add_all(users)
-    db.session.commit()
 
-    print("Database seeded successfully.")
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,249 @@
+from datetime import datetime
+
+from sqlalchemy import DateTime, func
+
+from database import db
+from models import Driver, Truck, Assignment
+from pagination import (
+    DATETIME_FORMAT, QueryParamError, apply_filters, encode_cursor, model_class, paginate, parse_ids, parse_limit,
+    parse_sort, page_response,
+)
+
+MAX_INCLUDE_DEPTH = 2
+IN_CLAUSE_CHUNK = 500
+
+# Serialized fields per model, in the same order and shape as Model.to_dict()
+FIELDS = {
+    Driver: ['id', 'name', 'license_number', 'contact_info', 'assigned_truck_id', 'created_at', 'version'],
+    Truck: ['id', 'plate_number', 'model', 'status', 'current_driver_id', 'created_at', 'version'],
+    Assignment: ['id', 'start_date', 'end_date', 'status', 'driver_id', 'truck_id', 'version'],
+}
+
+# Embeddable relations: name -> (target model, local key, target key, to-many)
+RELATIONS = {
+    Driver: {
+        'truck': (Truck, 'assigned_truck_id', 'id', False),
+        'assignments': (Assignment, 'id', 'driver_id', True),
+    },
+    Truck: {
+        'driver': (Driver, 'current_driver_id', 'id', False),
+        'assignments': (Assignment, 'id', 'truck_id', True),
+    },
+    Assignment: {
+        'driver': (Driver, 'driver_id', 'id', False),
+        'truck': (Truck, 'truck_id', 'id', False),
+    },
+}
+
+
+def parse_fields(model, args):
+    """Sparse fieldset from `?fields=id,plate_number,status`; all fields by default."""
+    model = model_class(model)
+    fields = args.get('fields')
+    if not fields:
+        return FIELDS[model]
+
+    requested = [f.strip() for f in fields.split(',') if f.strip()]
+    unknown = [f for f in requested if f not in FIELDS[model]]
+    if unknown or not requested:
+        allowed = ', '.join(FIELDS[model])
+        raise QueryParamError(f"Unknown field '{unknown[0] if unknown else fields}'. Allowed: {allowed}.")
+    return [f for f in FIELDS[model] if f in requested]
+
+
+def _column(model, name, dialect):
+    """Labeled column; datetimes are formatted by the database so rows need no per-value strftime."""
+    column = getattr(model, name)
+    if isinstance(column.type, DateTime):
+        if dialect == 'sqlite':
+            return func.strftime(DATETIME_FORMAT, column).label(name)
+        if dialect == 'postgresql':
+            return func.to_char(column, 'YYYY-MM-DD HH24:MI:SS').label(name)
+    return column.label(name)
+
+
+def select_columns(model, fields, session=None):
+    dialect = (session or db.session).get_bind().dialect.name
+    return [_column(model, name, dialect) for name in fields]
+
+
+def rows_to_dicts(rows, fields):
+    """Builds to_dict()-shaped dicts from column tuples. Extra trailing columns are ignored."""
+    items = [dict(zip(fields, row)) for row in rows]
+    # Dialects without SQL-side formatting hand back datetime objects
+    for name in fields:
+        if any(isinstance(item[name], datetime) for item in items):
+            for item in items:
+                if item[name] is not None:
+                    item[name] = item[name].strftime(DATETIME_FORMAT)
+    return items
+
+
+def parse_includes(model, args):
+    """
+    Parses `?include=driver,assignments.truck` into a tree {'driver': {}, 'assignments': {'truck': {}}},
+    validating every relation name and bounding the nesting depth.
+    """
+    tree = {}
+    for path in filter(None, (p.strip() for p in args.get('include', '').split(','))):
+        names = path.split('.')
+        if len(names) > MAX_INCLUDE_DEPTH:
+            raise QueryParamError(f"Include '{path}' is nested too deeply (max depth {MAX_INCLUDE_DEPTH}).")
+        current_model, node = model_class(model), tree
+        for name in names:
+            if name not in RELATIONS[current_model]:
+                allowed = ', '.join(RELATIONS[current_model])
+                raise QueryParamError(f"Cannot include '{name}' on {current_model.__tablename__}. Allowed: {allowed}.")
+            node = node.setdefault(name, {})
+            current_model = RELATIONS[current_model][name][0]
+    return tree
+
+
+def include_resources(model):
+    """For @cached: the extra resources a request's `include` makes the response depend on."""
+    def resources(args):
+        names = set()
+        def walk(current_model, tree):
+            for name, subtree in tree.items():
+                target = RELATIONS[current_model][name][0]
+                names.add(target.__tablename__)
+                walk(target, subtree)
+        try:
+            walk(model, parse_includes(model, args))
+        except QueryParamError:
+            pass  # The handler itself answers 400
+        return sorted(names)
+    return resources
+
+
+def embed_includes(model, items, tree, session=None):
+    """
+    Embeds related rows into `items` in place. Each relation level costs one
+    batched IN query (selectin-style), however many parent rows there are.
+    """
+    session = session or db.session
+    for name, subtree in tree.items():
+        target, local_key, target_key, many = RELATIONS[model][name]
+        keys = sorted({item[local_key] for item in items if item[local_key] is not None})
+        fields = FIELDS[target]
+        columns = select_columns(target, fields, session)
+        target_column = getattr(target, target_key)
+
+        children = []
+        for i in range(0, len(keys), IN_CLAUSE_CHUNK):
+            chunk = keys[i:i + IN_CLAUSE_CHUNK]
+            rows = session.query(*columns).filter(target_column.in_(chunk)).order_by(target.id).all()
+            children.extend(rows_to_dicts(rows, fields))
+        embed_includes(target, children, subtree, session)
+
+        if many:
+            grouped = {}
+            for child in children:
+                grouped.setdefault(child[target_key], []).append(child)
+            for item in items:
+                item[name] = grouped.get(item[local_key], [])
+        else:
+            by_key = {child[target_key]: child for child in children}
+            for item in items:
+                item[name] = by_key.get(item[local_key])
+    return items
+
+
+def _selected_fields(model, fields, tree):
+    """Requested fields plus any local keys the includes need to join on."""
+    model = model_class(model)
+    keys = {RELATIONS[model][name][1] for name in tree}
+    return fields + [f for f in FIELDS[model] if f in keys and f not in fields]
+
+
+def _serialize(model, rows, fields, selected, tree, session=None):
+    items = embed_includes(model_class(model), rows_to_dicts(rows, selected), tree, session)
+    for extra in selected[len(fields):]:
+        for item in items:
+            del item[extra]
+    return items
+
+
+def fetch_one(model, id, args, session=None):
+    """Single row as a dict (or None) without hydrating an ORM object."""
+    session = session or db.session
+    fields = parse_fields(model, args)
+    tree = parse_includes(model, args)
+    selected = _selected_fields(model, fields, tree)
+    row = session.query(*select_columns(model, selected, session)).filter(model.id == id).first()
+    return _serialize(model, [row], fields, selected, tree, session)[0] if row is not None else None
+
+
+def load_by_ids(model, ids, args, session=None, query=None):
+    """
+    Rows of `query` (default: the whole table) with the given ids, as sparse, include-aware
+    dicts in the order of `ids`, from one IN query. Ids with no matching row are skipped.
+    """
+    session = session or db.session
+    fields = parse_fields(model, args)
+    tree = parse_includes(model, args)
+    selected = _selected_fields(model, fields, tree)
+    columns = select_columns(model, selected, session) + [model.id.label('_row_id')]
+    query = session.query(*columns) if query is None else query.with_entities(*columns)
+    by_id = {row._row_id: row for row in query.filter(model.id.in_(ids))}
+    rows = [by_id[row_id] for row_id in ids if row_id in by_id]
+    return _serialize(model, rows, fields, selected, tree, session)
+
+
+def load_page(query, model, args, session=None):
+    """
+    One keyset page of `query` as sparse, include-aware dicts, plus the next cursor.
+    With `?ids=`, returns just those rows (filters still apply) and no cursor.
+    """
+    ids = parse_ids(args)
+    if ids is not None:
+        return load_by_ids(model, ids, args, session, query=apply_filters(query, model, args)), None
+    fields = parse_fields(model, args)
+    tree = parse_includes(model, args)
+    selected = _selected_fields(model, fields, tree)
+    rows, next_cursor = paginate(query, model, args, columns=select_columns(model, selected, session))
+    return _serialize(model, rows, fields, selected, tree, session), next_cursor
+
+
+def load_merged_page(models, args, session=None):
+    """
+    Like load_page, over several tables with the same columns (such as assignments and its
+    history tables): pages each table, then merges the pages in (sort_key, id) order.
+    """
+    session = session or db.session
+    ids = parse_ids(args)
+    if ids is not None:
+        # Find which table holds each id, then load each table's share in one IN query
+        owners = {}
+        for model in models:
+            query = apply_filters(session.query(model.id), model, args).filter(model.id.in_(ids))
+            owners.update((row_id, model) for row_id, in query)
+        loaded = {
+            model: iter(load_by_ids(model, [i for i in ids if owners.get(i) is model], args, session))
+            for model in set(owners.values())
+        }
+        return [next(loaded[owners[i]]) for i in ids if i in owners], None
+
+    fields = parse_fields(models[0], args)
+    tree = parse_includes(models[0], args)
+    selected = _selected_fields(models[0], fields, tree)
+    sort_key, descending = parse_sort(models[0], args)
+    limit = parse_limit(args)
+
+    rows, more = [], False
+    for model in models:
+        page, next_cursor = paginate(session.query(model), model, args, columns=select_columns(model, selected, session))
+        rows.extend(page)
+        more = more or next_cursor is not None
+    rows.sort(key=lambda row: (row._cursor_key, row._cursor_id), reverse=descending)
+
+    next_cursor = None
+    if more or len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor(sort_key, rows[-1]._cursor_key, rows[-1]._cursor_id)
+    return _serialize(models[0], rows, fields, selected, tree, session), next_cursor
+
+
+def list_response(query, model, args):
+    """One keyset page of `query` as a sparse, include-aware JSON list response."""
+    return page_response(*load_page(query, model, args))
@@ -0,0 +1,135 @@
+#!/usr/bin/env python3
+"""
+Stress check for double-booking under concurrent writers.
+
+Creates a handful of drivers and trucks, then has many threads book random
+hour-long slots on a short calendar (so bookings collide constantly) through
+POST /assignments, PATCH /assignments/<id>, POST /assignments/bulk and
+POST /assignments/dispatch, each thread logged in with its own client.
+Afterwards it checks that no truck or driver is double-booked, and exits
+non-zero otherwise.
+
+    python stress_bookings.py --threads 16 --operations 100
+    python stress_bookings.py --database-url postgresql://fleet@localhost/fleet_stress
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter
+from datetime import datetime, timedelta
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+USERNAME, PASSWORD = 'stress_admin', 'stress-password'
+DATETIME_FORMAT = '%Y-%m-%d %H:%M:%S'
+START = datetime(2030, 1, 1)
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--drivers', type=int, default=4)
+    parser.add_argument('--trucks', type=int, default=4)
+    parser.add_argument('--slots', type=int, default=12, help='Hour-long start slots bookings are drawn from')
+    parser.add_argument('--threads', type=int, default=16)
+    parser.add_argument('--operations', type=int, default=60, help='Calls per thread')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--database-url', help='Empty database to use (default: a temporary SQLite file)')
+    return parser.parse_args()
+
+
+def prepare(app, db, options):
+    from flask_migrate import upgrade
+    from models import User, Driver, Truck
+
+    with app.app_context():
+        upgrade(directory=os.path.join(HERE, 'migrations'))
+        user = User(username=USERNAME, email='stress@example.com', role='Admin')
+        user.set_password(PASSWORD)
+        db.session.add(user)
+        db.session.add_all(Driver(name=f"Stress Driver {i}", license_number=f"STRESS{i:05d}",
+                                  contact_info="+254700000000") for i in range(options.drivers))
+        db.session.add_all(Truck(plate_number=f"STR {i:04d}", model="FH16", status="Available")
+                           for i in range(options.trucks))
+        db.session.commit()
+
+
+def random_booking(rng, options):
+    start = START + timedelta(hours=rng.randrange(options.slots))
+    return {
+        "driver_id": rng.randint(1, options.drivers), "truck_id": rng.randint(1, options.trucks),
+        "start_date": start.strftime(DATETIME_FORMAT),
+        "end_date": (start + timedelta(hours=rng.randint(1, 3))).strftime(DATETIME_FORMAT),
+    }
+
+
+def worker(app, options, index, outcomes, lock):
+    rng = random.Random(f"{options.seed}-{index}")
+    client = app.test_client()
+    client.post('/login', json={"username": USERNAME, "password": PASSWORD})
+    local = Counter()
+    created = []
+    for _ in range(options.operations):
+        operation = rng.choice(['create', 'patch', 'bulk', 'dispatch'])
+        if operation == 'patch' and created:
+            booking = random_booking(rng, options)
+            response = client.patch(f'/assignments/{rng.choice(created)}', json=booking)
+        elif operation == 'bulk':
+            response = client.post('/assignments/bulk', json=[random_booking(rng, options) for _ in range(3)])
+        elif operation == 'dispatch':
+            jobs = [{key: value for key, value in random_booking(rng, options).items()
+                     if key in ('start_date', 'end_date')} for _ in range(3)]
+            response = client.post('/assignments/dispatch', json={"jobs": jobs})
+        else:
+            operation = 'create'
+            response = client.post('/assignments', json=random_booking(rng, options))
+            if response.status_code == 201:
+                created.append(response.get_json()['id'])
+        local[(operation, response.status_code)] += 1
+    with lock:
+        outcomes.update(local)
+
+
+def main():
+    options = parse_args()
+    if options.database_url:
+        os.environ['DATABASE_URL'] = options.database_url
+    else:
+        path = os.path.join(tempfile.mkdtemp(prefix='stress-bookings-'), 'fleet.db')
+        os.environ['DATABASE_URL'] = f'sqlite:///{path}'
+    os.environ.setdefault('SECRET_KEY', 'stress-bookings')
+    os.environ.setdefault('PASSWORD_HASH_WORKERS', '0')
+    sys.path.insert(0, HERE)
+
+    from app import app
+    from database import db
+    from scheduling import find_all_conflicts
+
+    prepare(app, db, options)
+    outcomes, lock = Counter(), threading.Lock()
+    threads = [threading.Thread(target=worker, args=(app, options, i, outcomes, lock)) for i in range(options.threads)]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+
+    total = sum(outcomes.values())
+    print(f"{total} calls from {options.threads} threads in {elapsed:.1f}s ({total / elapsed:.0f}/s)")
+    for (operation, status), count in sorted(outcomes.items()):
+        print(f"  {operation:<10}{status}  {count}")
+
+    with app.app_context():
+        conflicts = find_all_conflicts()
+    for conflict in conflicts:
+        print(f"  DOUBLE BOOKING: {conflict['resource']} {conflict['resource_id']} by "
+              f"assignments {conflict['assignment_ids']}")
+    print(f"\n{len(conflicts)} double booking{'' if len(conflicts) == 1 else 's'}.")
+    return 1 if conflicts else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
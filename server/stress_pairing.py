@@ -0,0 +1,152 @@
+#!/usr/bin/env python3
+"""
+Stress check for the atomic assign/release operations.
+
+Creates a small pool of drivers and trucks (so threads collide constantly),
+then has many threads fire random POST /assignments/assign and
+POST /assignments/release calls through the app, each thread logged in with
+its own client. Afterwards it checks that the driver and truck pointers,
+Truck.status and the running assignments all agree, and exits non-zero if
+any invariant is broken.
+
+    python stress_pairing.py --threads 16 --operations 300
+    python stress_pairing.py --database-url postgresql://fleet@localhost/fleet_stress
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+USERNAME, PASSWORD = 'stress_admin', 'stress-password'
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--drivers', type=int, default=12)
+    parser.add_argument('--trucks', type=int, default=8)
+    parser.add_argument('--threads', type=int, default=16)
+    parser.add_argument('--operations', type=int, default=200, help='Calls per thread')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--database-url', help='Empty database to use (default: a temporary SQLite file)')
+    return parser.parse_args()
+
+
+def prepare(app, db, options):
+    from flask_migrate import upgrade
+    from models import User, Driver, Truck
+
+    with app.app_context():
+        upgrade(directory=os.path.join(HERE, 'migrations'))
+        user = User(username=USERNAME, email='stress@example.com', role='Admin')
+        user.set_password(PASSWORD)
+        db.session.add(user)
+        db.session.add_all(Driver(name=f"Stress Driver {i}", license_number=f"STRESS{i:05d}",
+                                  contact_info="+254700000000") for i in range(options.drivers))
+        db.session.add_all(Truck(plate_number=f"STR {i:04d}", model="FH16", status="Available")
+                           for i in range(options.trucks))
+        db.session.commit()
+
+
+def worker(app, options, index, outcomes, lock):
+    rng = random.Random(f"{options.seed}-{index}")
+    client = app.test_client()
+    client.post('/login', json={"username": USERNAME, "password": PASSWORD})
+    local = Counter()
+    for _ in range(options.operations):
+        if rng.random() < 0.5:
+            response = client.post('/assignments/assign', json={
+                "driver_id": rng.randint(1, options.drivers), "truck_id": rng.randint(1, options.trucks),
+            })
+            local[('assign', response.status_code)] += 1
+        else:
+            key = rng.choice(['driver_id', 'truck_id'])
+            upper = options.drivers if key == 'driver_id' else options.trucks
+            response = client.post('/assignments/release', json={key: rng.randint(1, upper)})
+            local[('release', response.status_code)] += 1
+    with lock:
+        outcomes.update(local)
+
+
+def check_invariants(db):
+    """Returns a list of human-readable invariant violations (empty when consistent)."""
+    from models import Driver, Truck, Assignment
+    from scheduling import find_all_conflicts
+
+    problems = []
+    drivers = {d.id: d.assigned_truck_id for d in db.session.query(Driver.id, Driver.assigned_truck_id)}
+    trucks = {t.id: (t.status, t.current_driver_id) for t in db.session.query(Truck.id, Truck.status, Truck.current_driver_id)}
+    running = Counter(
+        (a.driver_id, a.truck_id) for a in
+        db.session.query(Assignment.driver_id, Assignment.truck_id)
+        .filter(Assignment.status == 'Active', Assignment.end_date.is_(None))
+    )
+
+    for truck_id, (status, driver_id) in trucks.items():
+        if driver_id is None:
+            if status == 'In Use':
+                problems.append(f"truck {truck_id} is In Use with no driver")
+            continue
+        if status != 'In Use':
+            problems.append(f"truck {truck_id} has driver {driver_id} but status {status}")
+        if drivers.get(driver_id) != truck_id:
+            problems.append(f"truck {truck_id} points at driver {driver_id}, who points at truck {drivers.get(driver_id)}")
+        if running[(driver_id, truck_id)] != 1:
+            problems.append(f"pair driver {driver_id} / truck {truck_id} has {running[(driver_id, truck_id)]} running assignments")
+
+    for driver_id, truck_id in drivers.items():
+        if truck_id is not None and trucks[truck_id][1] != driver_id:
+            problems.append(f"driver {driver_id} points at truck {truck_id}, which points at driver {trucks[truck_id][1]}")
+
+    for (driver_id, truck_id), count in running.items():
+        if trucks[truck_id][1] != driver_id:
+            problems.append(f"running assignment for driver {driver_id} / truck {truck_id} but the pair isn't set")
+
+    for conflict in find_all_conflicts():
+        problems.append(f"{conflict['resource']} {conflict['resource_id']} double-booked by "
+                        f"assignments {conflict['assignment_ids']}")
+    return problems
+
+
+def main():
+    options = parse_args()
+    if options.database_url:
+        os.environ['DATABASE_URL'] = options.database_url
+    else:
+        path = os.path.join(tempfile.mkdtemp(prefix='stress-pairing-'), 'fleet.db')
+        os.environ['DATABASE_URL'] = f'sqlite:///{path}'
+    os.environ.setdefault('SECRET_KEY', 'stress-pairing')
+    sys.path.insert(0, HERE)
+
+    from app import app
+    from database import db
+
+    prepare(app, db, options)
+    outcomes, lock = Counter(), threading.Lock()
+    threads = [threading.Thread(target=worker, args=(app, options, i, outcomes, lock)) for i in range(options.threads)]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+
+    total = sum(outcomes.values())
+    print(f"{total} calls from {options.threads} threads in {elapsed:.1f}s ({total / elapsed:.0f}/s)")
+    for (operation, status), count in sorted(outcomes.items()):
+        print(f"  {operation:<8}{status}  {count}")
+
+    with app.app_context():
+        problems = check_invariants(db)
+    for problem in problems:
+        print(f"  VIOLATION: {problem}")
+    print(f"\n{len(problems)} invariant violation{'' if len(problems) == 1 else 's'}.")
+    return 1 if problems else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
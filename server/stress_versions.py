@@ -0,0 +1,145 @@
+#!/usr/bin/env python3
+"""
+Concurrent-writer check for optimistic concurrency on PUT/PATCH.
+
+Creates one driver, one truck and one assignment, then has many threads run
+read-modify-write loops against them through the app, each thread logged in
+with its own client: GET the row, increment a counter held in one of its
+fields, and write it back with If-Match set to the version it read. Writers
+that lose the race get 412 and retry. Afterwards it checks that every
+counter equals the number of successful writes (no lost updates) and that
+each row's version moved once per write, and exits non-zero otherwise.
+
+    python stress_versions.py --threads 16 --increments 50
+    python stress_versions.py --no-if-match    # Blind writes, to see updates get lost
+"""
+import argparse
+import os
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter
+from datetime import datetime, timedelta
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+USERNAME, PASSWORD = 'stress_admin', 'stress-password'
+DATETIME_FORMAT = '%Y-%m-%d %H:%M:%S'
+START = datetime(2030, 1, 1)
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--threads', type=int, default=16)
+    parser.add_argument('--increments', type=int, default=30, help='Successful writes each thread makes')
+    parser.add_argument('--no-if-match', action='store_true', help='Write without If-Match (read, then blind write)')
+    parser.add_argument('--database-url', help='Empty database to use (default: a temporary SQLite file)')
+    return parser.parse_args()
+
+
+def prepare(app, db):
+    from flask_migrate import upgrade
+    from models import User, Driver, Truck, Assignment
+
+    with app.app_context():
+        upgrade(directory=os.path.join(HERE, 'migrations'))
+        user = User(username=USERNAME, email='stress@example.com', role='Admin')
+        user.set_password(PASSWORD)
+        db.session.add(user)
+        driver = Driver(name="Stress Driver", license_number="STRESS00001", contact_info="0")
+        truck = Truck(plate_number="STR 0001", model="0", status="Available")
+        db.session.add_all([driver, truck])
+        db.session.flush()
+        db.session.add(Assignment(driver_id=driver.id, truck_id=truck.id, start_date=START,
+                                  end_date=START + timedelta(hours=1), status='Active'))
+        db.session.commit()
+
+
+# Each resource keeps a counter in one field: (path, method, read counter, body for counter n)
+RESOURCES = {
+    'driver': ('/drivers/1', 'PUT', lambda row: int(row['contact_info']),
+               lambda n: {"contact_info": str(n)}),
+    'truck': ('/trucks/1', 'PUT', lambda row: int(row['model']),
+              lambda n: {"model": str(n)}),
+    # end_date = start + (n + 1) hours
+    'assignment': ('/assignments/1', 'PATCH',
+                   lambda row: int((datetime.strptime(row['end_date'], DATETIME_FORMAT) - START).total_seconds()
+                                   // 3600) - 1,
+                   lambda n: {"end_date": (START + timedelta(hours=n + 1)).strftime(DATETIME_FORMAT)}),
+}
+
+
+def worker(app, options, index, outcomes, lock):
+    client = app.test_client()
+    client.post('/login', json={"username": USERNAME, "password": PASSWORD})
+    local = Counter()
+    names = list(RESOURCES)
+    for i in range(options.increments):
+        name = names[(index + i) % len(names)]
+        path, method, read, body = RESOURCES[name]
+        while True:
+            row = client.get(path).get_json()
+            headers = {} if options.no_if_match else {"If-Match": f'"{row["version"]}"'}
+            response = client.open(path, method=method, json=body(read(row) + 1), headers=headers)
+            local[(name, response.status_code)] += 1
+            if response.status_code != 412:
+                break
+    with lock:
+        outcomes.update(local)
+
+
+def check_counters(app, outcomes):
+    """Returns a list of human-readable lost-update problems (empty when consistent)."""
+    client = app.test_client()
+    client.post('/login', json={"username": USERNAME, "password": PASSWORD})
+    problems = []
+    for name, (path, _, read, _) in RESOURCES.items():
+        row = client.get(path).get_json()
+        written = outcomes[(name, 200)]
+        if read(row) != written:
+            problems.append(f"{name}: counter is {read(row)} after {written} successful increments "
+                            f"({written - read(row)} lost)")
+        if row['version'] != 1 + written:
+            problems.append(f"{name}: version is {row['version']} after {written} writes (expected {1 + written})")
+    return problems
+
+
+def main():
+    options = parse_args()
+    if options.database_url:
+        os.environ['DATABASE_URL'] = options.database_url
+    else:
+        path = os.path.join(tempfile.mkdtemp(prefix='stress-versions-'), 'fleet.db')
+        os.environ['DATABASE_URL'] = f'sqlite:///{path}'
+    os.environ.setdefault('SECRET_KEY', 'stress-versions')
+    os.environ.setdefault('PASSWORD_HASH_WORKERS', '0')
+    sys.path.insert(0, HERE)
+
+    from app import app
+    from database import db
+
+    prepare(app, db)
+    outcomes, lock = Counter(), threading.Lock()
+    threads = [threading.Thread(target=worker, args=(app, options, i, outcomes, lock)) for i in range(options.threads)]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+
+    total = sum(outcomes.values())
+    print(f"{total} writes from {options.threads} threads in {elapsed:.1f}s "
+          f"({'without' if options.no_if_match else 'with'} If-Match)")
+    for (name, status), count in sorted(outcomes.items()):
+        print(f"  {name:<12}{status}  {count}")
+
+    problems = check_counters(app, outcomes)
+    for problem in problems:
+        print(f"  LOST UPDATE: {problem}")
+    print(f"\n{len(problems)} problem{'' if len(problems) == 1 else 's'}.")
+    return 1 if problems else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
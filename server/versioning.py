@@ -0,0 +1,57 @@
+import hashlib
+import re
+
+# Row versions travel as strong entity tags: ETag: "3". A bare 3 is accepted in If-Match too.
+# GETs that include related rows append a hash of the body ("3-9f2c..."); If-Match reads the version.
+ENTITY_TAG = re.compile(r'^"?(\d+)(?:-[0-9a-f]+)?"?$')
+
+STALE_MESSAGE = "This record was changed by another request; reload it and retry."
+
+
+class PreconditionFailed(Exception):
+    """Raised when a write's If-Match header does not name the row's current version."""
+
+    def __init__(self, current_version):
+        self.current_version = current_version
+        super().__init__(STALE_MESSAGE)
+
+    def to_dict(self):
+        return {"error": str(self), "version": self.current_version}
+
+
+def parse_if_match(value):
+    """If-Match as a set of versions, '*' for any version, or None when the header is absent."""
+    if value is None:
+        return None
+    if value.strip() == '*':
+        return '*'
+    # Weak tags (W/"3") and tags that aren't ours never match
+    return {int(match.group(1)) for match in map(ENTITY_TAG.match, (t.strip() for t in value.split(','))) if match}
+
+
+def check_if_match(instance, header):
+    """
+    Raises PreconditionFailed unless If-Match, when sent, names the loaded row's version.
+    The flush then writes with UPDATE/DELETE ... WHERE id = ? AND version = <that version>,
+    so a writer that commits in between makes this one fail with StaleDataError.
+    """
+    expected = parse_if_match(header)
+    if expected is None or expected == '*':
+        return
+    if instance.version not in expected:
+        raise PreconditionFailed(instance.version)
+
+
+def row_etag(version, body=None):
+    """
+    Entity tag (unquoted) of a single row: its version, or with `body`, its version and a
+    hash of the body, for responses that also carry related rows.
+    """
+    if body is None:
+        return str(version)
+    return f"{version}-{hashlib.sha1(body).hexdigest()[:16]}"
+
+
+def version_headers(instance):
+    """ETag header carrying the row's version, for write responses."""
+    return {'ETag': f'"{row_etag(instance.version)}"'}